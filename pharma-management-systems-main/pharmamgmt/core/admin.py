@@ -4,11 +4,18 @@ from .models import (
     Web_User, Pharmacy_Details, ProductMaster, SupplierMaster, CustomerMaster,
     InvoiceMaster, InvoicePaid, PurchaseMaster, SalesInvoiceMaster, SalesMaster,
     SalesInvoicePaid, ProductRateMaster, ReturnInvoiceMaster, PurchaseReturnInvoicePaid,
-    ReturnPurchaseMaster, ReturnSalesInvoiceMaster, ReturnSalesInvoicePaid, ReturnSalesMaster
+    ReturnPurchaseMaster, ReturnSalesInvoiceMaster, ReturnSalesInvoicePaid, ReturnSalesMaster,
+    ProductClassification
 )
+from .pagination import CachedCountPaginator
 
 # Define custom admin classes
 
+class CachedCountAdmin(admin.ModelAdmin):
+    """Change lists over large tables: cached result counts, no extra full-table COUNT(*)"""
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+
 class Web_UserAdmin(UserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'user_type', 'is_staff')
     fieldsets = UserAdmin.fieldsets + (
@@ -35,29 +42,34 @@ class CustomerMasterAdmin(admin.ModelAdmin):
     search_fields = ('customer_name', 'customer_mobile', 'customer_emailid')
     list_filter = ('customer_type',)
 
-class InvoiceMasterAdmin(admin.ModelAdmin):
+class InvoiceMasterAdmin(CachedCountAdmin):
     list_display = ('invoiceid', 'invoice_no', 'invoice_date', 'supplierid', 'invoice_total', 'invoice_paid')
     list_filter = ('invoice_date',)
     search_fields = ('invoice_no', 'supplierid__supplier_name')
 
-class PurchaseMasterAdmin(admin.ModelAdmin):
+class PurchaseMasterAdmin(CachedCountAdmin):
     list_display = ('purchaseid', 'product_name', 'product_company', 'product_batch_no', 
                     'product_quantity', 'product_expiry', 'total_amount')
     list_filter = ('purchase_entry_date', 'product_company')
     search_fields = ('product_name', 'product_batch_no', 'product_company')
 
-class SalesInvoiceMasterAdmin(admin.ModelAdmin):
+class SalesInvoiceMasterAdmin(CachedCountAdmin):
     list_display = ('sales_invoice_no', 'sales_invoice_date', 'customerid', 
                     'sales_invoice_total', 'sales_invoice_paid')
     list_filter = ('sales_invoice_date',)
     search_fields = ('sales_invoice_no', 'customerid__customer_name')
 
-class SalesMasterAdmin(admin.ModelAdmin):
+class SalesMasterAdmin(CachedCountAdmin):
     list_display = ('id', 'sales_invoice_no', 'product_name', 'product_batch_no', 
                    'sale_quantity', 'sale_rate', 'sale_total_amount')
     list_filter = ('sale_entry_date',)
     search_fields = ('product_name', 'product_batch_no', 'sales_invoice_no__sales_invoice_no')
 
+class ProductClassificationAdmin(admin.ModelAdmin):
+    list_display = ('productid', 'abc_class', 'xyz_class', 'revenue', 'revenue_share', 'demand_cv', 'classified_at')
+    list_filter = ('abc_class', 'xyz_class')
+    search_fields = ('productid__product_name',)
+
 # Register models with admin site
 admin.site.register(Web_User, Web_UserAdmin)
 admin.site.register(Pharmacy_Details, PharmacyDetailsAdmin)
@@ -77,3 +89,4 @@ admin.site.register(ReturnPurchaseMaster)
 admin.site.register(ReturnSalesInvoiceMaster)
 admin.site.register(ReturnSalesInvoicePaid)
 admin.site.register(ReturnSalesMaster)
+admin.site.register(ProductClassification, ProductClassificationAdmin)
@@ -1,6 +1,34 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate, post_save, post_delete
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from .product_search import ensure_product_search_index
+        post_migrate.connect(ensure_product_search_index, sender=self)
+
+        from .models import ProductMaster
+        from .trigram_index import update_trigram_index, remove_from_trigram_index
+        post_save.connect(update_trigram_index, sender=ProductMaster)
+        post_delete.connect(remove_from_trigram_index, sender=ProductMaster)
+
+        from .data_version import bump_products_version
+        post_save.connect(bump_products_version, sender=ProductMaster)
+        post_delete.connect(bump_products_version, sender=ProductMaster)
+
+        from .salt_index import update_salt_index
+        post_save.connect(update_salt_index, sender=ProductMaster)
+
+        from .models import PurchaseMaster, ReturnPurchaseMaster, SalesMaster, ReturnSalesMaster, SaleRateMaster
+        from .data_version import bump_purchases_version, bump_sale_rates_version, bump_sales_version
+        for model in (PurchaseMaster, ReturnPurchaseMaster):
+            post_save.connect(bump_purchases_version, sender=model)
+            post_delete.connect(bump_purchases_version, sender=model)
+        post_save.connect(bump_sale_rates_version, sender=SaleRateMaster)
+        post_delete.connect(bump_sale_rates_version, sender=SaleRateMaster)
+        for model in (SalesMaster, ReturnSalesMaster):
+            post_save.connect(bump_sales_version, sender=model)
+            post_delete.connect(bump_sales_version, sender=model)
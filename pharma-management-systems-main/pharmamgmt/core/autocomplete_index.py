@@ -0,0 +1,176 @@
+"""
+In-memory prefix index for product autocomplete
+Normalized product names, name words, companies and barcodes are kept in sorted
+lists and searched with bisect, so a keystroke lookup never touches the database.
+Each worker loads the index lazily and reloads it when the 'products' data
+version changes
+"""
+
+import gc
+import logging
+import re
+import threading
+from bisect import bisect_left
+
+from django.db import connection
+
+from .data_version import PRODUCTS, get_version
+from .models import ProductMaster
+
+logger = logging.getLogger(__name__)
+
+# Lookup tiers, scanned in order: name starts with the query, a later word of
+# the name (or the barcode) does, the company does
+TIER_NAME = 0
+TIER_WORD = 1
+TIER_COMPANY = 2
+
+# Upper bound on sorted entries inspected for one lookup
+MAX_SCAN = 5000
+
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Lowercase and reduce to space-separated alphanumeric words"""
+    return ' '.join(WORD_RE.findall((text or '').lower()))
+
+
+class _Snapshot:
+    """Immutable index contents; replaced as a whole on reload"""
+
+    def __init__(self, version, products):
+        self.version = version
+        self.products = {}
+        entries = ([], [], [])
+        for productid, name, company, packing, barcode in products:
+            name_key = normalize(name)
+            company_key = normalize(company)
+            barcode_key = normalize(barcode)
+            words = name_key.split()
+            self.products[productid] = (
+                name, company, packing, frozenset(words + company_key.split() + barcode_key.split())
+            )
+            if name_key:
+                entries[TIER_NAME].append((name_key, productid))
+            # Every later word onwards, so "500" finds "paracetamol 500mg"
+            for i in range(1, len(words)):
+                entries[TIER_WORD].append((' '.join(words[i:]), productid))
+            if barcode_key:
+                entries[TIER_WORD].append((barcode_key, productid))
+            if company_key:
+                entries[TIER_COMPANY].append((company_key, productid))
+
+        self.keys = []
+        self.ids = []
+        for tier_entries in entries:
+            tier_entries.sort()
+            self.keys.append([key for key, _ in tier_entries])
+            self.ids.append([productid for _, productid in tier_entries])
+
+    def lookup(self, query, limit):
+        words = normalize(query).split()
+        if not words:
+            return []
+        # Whole query as a prefix first; for several words also the first word
+        # with the remaining ones matched against any word of the product
+        passes = [(' '.join(words), ())]
+        if len(words) > 1:
+            passes.append((words[0], words[1:]))
+
+        results = []
+        seen = set()
+        for keys, ids in zip(self.keys, self.ids):
+            for scan_prefix, filter_words in passes:
+                i = bisect_left(keys, scan_prefix)
+                end = min(len(keys), i + MAX_SCAN)
+                while i < end and keys[i].startswith(scan_prefix):
+                    productid = ids[i]
+                    i += 1
+                    if productid in seen:
+                        continue
+                    if filter_words and not self._has_word_prefixes(productid, filter_words):
+                        continue
+                    seen.add(productid)
+                    results.append(productid)
+                    if len(results) >= limit:
+                        return results
+        return results
+
+    def _has_word_prefixes(self, productid, filter_words):
+        product_words = self.products[productid][3]
+        return all(any(word.startswith(w) for word in product_words) for w in filter_words)
+
+
+class ProductAutocompleteIndex:
+    """Lazily loaded, version-checked prefix index over ProductMaster"""
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._reloading = False
+
+    @property
+    def version(self):
+        return self._snapshot.version if self._snapshot else None
+
+    def __len__(self):
+        return len(self._snapshot.products) if self._snapshot else 0
+
+    def load(self):
+        """Read the catalog and swap in a new snapshot"""
+        version = get_version(PRODUCTS, max_age=0)
+        products = ProductMaster.objects.values_list(
+            'productid', 'product_name', 'product_company', 'product_packing', 'product_barcode'
+        )
+        # Building allocates hundreds of thousands of small tuples; pausing the
+        # cyclic GC keeps it from rescanning them over and over
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._snapshot = _Snapshot(version, products)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        return self._snapshot
+
+    def snapshot(self):
+        """
+        Current snapshot. The first call loads it; once loaded, a version change
+        triggers a background reload and lookups keep using the old snapshot
+        until the new one is ready.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                # Another thread may have loaded it while we waited
+                if self._snapshot is None:
+                    self.load()
+            return self._snapshot
+        if snapshot.version != get_version(PRODUCTS) and not self._reloading:
+            with self._lock:
+                if not self._reloading:
+                    self._reloading = True
+                    threading.Thread(target=self._reload, daemon=True).start()
+        return snapshot
+
+    def _reload(self):
+        try:
+            self.load()
+        except Exception:
+            logger.exception("Autocomplete index reload failed")
+        finally:
+            self._reloading = False
+            connection.close()
+
+    def lookup(self, query, limit=10):
+        """Return up to `limit` product dicts whose name/company/barcode start with `query`"""
+        snapshot = self.snapshot()
+        results = []
+        for productid in snapshot.lookup(query, limit):
+            name, company, packing, _ = snapshot.products[productid]
+            results.append({'id': productid, 'name': name, 'company': company, 'packing': packing})
+        return results
+
+
+product_autocomplete_index = ProductAutocompleteIndex()
@@ -0,0 +1,141 @@
+"""
+Barcode resolution cache for the POS scanner path
+Maps barcode -> product and its batches with expiry, MRP, rates and purchased
+stock in a bounded per-process LRU. Entries are stamped with the products/
+purchases/sale_rates data versions and dropped as soon as any of them moves on
+(in every worker); entries also expire after MAX_AGE seconds.
+Sales change stock on every scan, so they are not cached: each lookup takes
+the quantities sold per batch from one grouped query and picks the FEFO batch
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from .data_version import PRODUCTS, PURCHASES, SALE_RATES, get_version
+from .models import ProductMaster, SaleRateMaster
+from .stock_manager import StockManager
+
+MAX_ENTRIES = 2048
+MAX_AGE = 60.0
+
+VERSION_KEYS = (PRODUCTS, PURCHASES, SALE_RATES)
+
+
+def load_barcode(barcode):
+    """
+    The cacheable part of a barcode lookup: None for an unknown barcode,
+    otherwise the product with its batches in FEFO order, each with stock
+    from purchases and purchase returns only
+    """
+    product = ProductMaster.objects.filter(product_barcode=barcode).values(
+        'productid', 'product_name', 'product_company', 'product_packing'
+    ).first()
+    if product is None:
+        return None
+
+    batches = StockManager.get_purchased_batches(product['productid'])
+    sale_rates = {
+        row['product_batch_no']: row
+        for row in SaleRateMaster.objects.filter(
+            productid=product['productid'], product_batch_no__in=list(batches)
+        ).values('product_batch_no', 'rate_A', 'rate_B', 'rate_C')
+    } if batches else {}
+    for batch_no, batch in batches.items():
+        sale_rate = sale_rates.get(batch_no)
+        if sale_rate:
+            batch.update({
+                'rate_a': float(sale_rate['rate_A'] or 0),
+                'rate_b': float(sale_rate['rate_B'] or 0),
+                'rate_c': float(sale_rate['rate_C'] or 0),
+            })
+        else:
+            batch.update({'rate_a': batch['mrp'], 'rate_b': batch['mrp'], 'rate_c': batch['mrp']})
+
+    return {
+        'product_id': product['productid'],
+        'product_name': product['product_name'],
+        'product_company': product['product_company'],
+        'product_packing': product['product_packing'],
+        'batches': StockManager.fefo_order(batches.values()),
+    }
+
+
+def pick_batch(loaded):
+    """
+    Resolve a load_barcode() result against current sales: a dict with the
+    product and its first-expiring in-stock batch (the first purchased batch
+    when none is in stock; batch is None when the product was never purchased)
+    """
+    if loaded is None:
+        return None
+    result = {key: value for key, value in loaded.items() if key != 'batches'}
+    result['batch'] = None
+    if not loaded['batches']:
+        return result
+
+    sold = StockManager.get_sold_quantities(loaded['product_id'])
+    batches = [
+        {**batch, 'stock': batch['stock'] - sold.get(batch['batch_no'], 0)}
+        for batch in loaded['batches']
+    ]
+    result['batch'] = next((batch for batch in batches if batch['stock'] > 0), batches[0])
+    return result
+
+
+def resolve_barcode(barcode):
+    """Look up a barcode without the cache (see pick_batch for the result)"""
+    return pick_batch(load_barcode(barcode))
+
+
+class BarcodeCache:
+    """Thread-safe LRU of load_barcode() results; get() adds current stock"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_age=MAX_AGE):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # barcode -> (versions, stored_at, result)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _versions(self):
+        return tuple(get_version(key) for key in VERSION_KEYS)
+
+    def get(self, barcode):
+        if not self.enabled:
+            return resolve_barcode(barcode)
+        return pick_batch(self._load(barcode))
+
+    def _load(self, barcode):
+        versions = self._versions()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(barcode)
+            if entry is not None and entry[0] == versions and now - entry[1] < self.max_age:
+                self._entries.move_to_end(barcode)
+                self.hits += 1
+                return entry[2]
+
+        self.misses += 1
+        result = load_barcode(barcode)
+        with self._lock:
+            self._entries[barcode] = (versions, now, result)
+            self._entries.move_to_end(barcode)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+barcode_cache = BarcodeCache()
+
@@ -0,0 +1,138 @@
+"""
+Batch invoice printing
+Prints every sales invoice of a day or date range (or a given list) as one
+PDF. Lines and payments for the whole batch are read in bulk, invoices with a
+cached PDF are reused, the rest are drawn in a process pool, and the pages are
+joined with pypdf. Without pypdf the batch is drawn as a single ReportLab
+document in this process instead.
+"""
+
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from io import BytesIO
+
+from django.contrib.auth.decorators import login_required
+from django.db import connections
+from django.http import FileResponse, JsonResponse
+from django.utils import timezone
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    PDF_MERGE_SUPPORT = True
+except ImportError:
+    PDF_MERGE_SUPPORT = False
+
+from .export_worker import init_worker, render_sales_pdf
+from .invoice_pdf import (
+    content_hash, read_cached_pdf, render_sales_invoice, render_sales_invoices, sales_invoices_content,
+    store_cached_pdf
+)
+from .models import SalesInvoiceMaster
+
+# Larger batches should be printed with `manage.py batch_print_sales`
+MAX_BATCH_INVOICES = 1000
+# Fewer invoices to draw than this are not worth starting a pool for
+POOL_MIN_INVOICES = 8
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def batch_invoice_numbers(start_date=None, end_date=None, invoice_nos=None):
+    """Sales invoice numbers to print: the given list (in its order) and/or a date range, by date"""
+    invoices = SalesInvoiceMaster.objects.all()
+    if invoice_nos:
+        invoices = invoices.filter(sales_invoice_no__in=invoice_nos)
+    if start_date:
+        invoices = invoices.filter(sales_invoice_date__gte=start_date)
+    if end_date:
+        invoices = invoices.filter(sales_invoice_date__lte=end_date)
+    numbers = list(invoices.order_by('sales_invoice_date', 'sales_invoice_no').values_list(
+        'sales_invoice_no', flat=True
+    ))
+    if invoice_nos:
+        found = set(numbers)
+        numbers = [number for number in dict.fromkeys(invoice_nos) if number in found]
+    return numbers
+
+
+def write_sales_batch(invoice_nos, target, workers=DEFAULT_WORKERS):
+    """Write the invoices, in order, into the binary file `target` as one PDF; returns how many were printed"""
+    contents = sales_invoices_content(invoice_nos)
+    ordered = [(number, contents[number]) for number in invoice_nos if number in contents]
+
+    if not PDF_MERGE_SUPPORT:
+        target.write(render_sales_invoices([content for _, content in ordered]))
+        return len(ordered)
+
+    pdfs = {}
+    missing = []
+    for number, content in ordered:
+        digest = content_hash(content)
+        pdf = read_cached_pdf('sales', number, digest)
+        if pdf is None:
+            missing.append((number, digest, content))
+        else:
+            pdfs[number] = pdf
+
+    if missing:
+        missing_contents = [content for _, _, content in missing]
+        if workers > 1 and len(missing) >= POOL_MIN_INVOICES:
+            workers = min(workers, len(missing))
+            # Pool processes open their own connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+                rendered = list(pool.map(render_sales_pdf, missing_contents,
+                                         chunksize=max(1, len(missing) // (workers * 4))))
+        else:
+            rendered = [render_sales_invoice(content) for content in missing_contents]
+        for (number, digest, _), pdf in zip(missing, rendered):
+            store_cached_pdf('sales', number, digest, pdf)
+            pdfs[number] = pdf
+
+    writer = PdfWriter()
+    for number, _ in ordered:
+        writer.append(PdfReader(BytesIO(pdfs[number])))
+    writer.write(target)
+    return len(ordered)
+
+
+@login_required
+def batch_print_sales(request):
+    """
+    Sales invoices as one PDF: ?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+    and/or ?invoices=<no>,<no>,... (today's invoices when neither is given)
+    """
+    invoice_nos = [
+        number.strip() for value in request.GET.getlist('invoices') for number in value.split(',') if number.strip()
+    ]
+    try:
+        start_date = request.GET.get('start_date')
+        end_date = request.GET.get('end_date')
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Dates must be in YYYY-MM-DD format'}, status=400)
+    if not (invoice_nos or start_date or end_date):
+        start_date = end_date = timezone.localdate()
+
+    numbers = batch_invoice_numbers(start_date, end_date, invoice_nos)
+    if not numbers:
+        return JsonResponse({'success': False, 'error': 'No sales invoices found to print'}, status=404)
+    if len(numbers) > MAX_BATCH_INVOICES:
+        return JsonResponse({
+            'success': False,
+            'error': f'{len(numbers)} invoices selected; print at most {MAX_BATCH_INVOICES} at a time '
+                     f'or use manage.py batch_print_sales'
+        }, status=400)
+
+    target = tempfile.TemporaryFile()
+    write_sales_batch(numbers, target)
+    target.seek(0)
+
+    if start_date and end_date and not invoice_nos:
+        filename = f"sales_invoices_{start_date}_{end_date}.pdf"
+    else:
+        filename = f"sales_invoices_{timezone.localdate()}.pdf"
+    return FileResponse(target, as_attachment=request.GET.get('download') == '1', filename=filename,
+                        content_type='application/pdf')
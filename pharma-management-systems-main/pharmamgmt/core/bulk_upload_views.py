@@ -3,15 +3,34 @@ import io
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, HttpResponseRedirect
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
 from .models import ProductMaster
-from django.core.paginator import Paginator
+from .data_version import PRODUCTS, bump_version
+from .import_jobs import BACKGROUND_IMPORT_BYTES, enqueue_import, import_job_response
+from .salt_index import rebuild_salt_index, salt_keys
+from .trigram_index import product_trigram_index
 try:
     from openpyxl import Workbook, load_workbook
     EXCEL_SUPPORT = True
 except ImportError:
     EXCEL_SUPPORT = False
 
+# Products inserted per bulk_create, each chunk in its own transaction
+IMPORT_CHUNK_SIZE = 2000
+# Error rows listed on the result page
+MAX_REPORTED_ERRORS = 500
+
+PRODUCT_COLUMNS = ['product_name', 'product_company', 'product_packing', 'product_category', 'product_barcode']
+REQUIRED_COLUMNS = ['product_name', 'product_company', 'product_packing', 'product_category']
+# Optional columns and the values used when a file leaves them out
+OPTIONAL_COLUMNS = {'product_salt': 'N/A', 'product_hsn': 'N/A', 'product_hsn_percent': '0'}
+MAX_LENGTHS = {
+    field: ProductMaster._meta.get_field(field).max_length
+    for field in PRODUCT_COLUMNS + list(OPTIONAL_COLUMNS)
+}
+
+
 @login_required
 def bulk_upload_products(request):
     if request.method == 'POST':
@@ -21,95 +40,225 @@ def bulk_upload_products(request):
             messages.error(request, 'Please select a file to upload')
             return redirect('bulk_upload_products')
         
+        if not file.name.endswith(('.csv', '.xlsx', '.xls')):
+            messages.error(request, 'Invalid file format. Please upload CSV or Excel file')
+            return redirect('bulk_upload_products')
+        
+        if request.POST.get('background') or file.size > BACKGROUND_IMPORT_BYTES:
+            job = enqueue_import('products', file, user=request.user)
+            return import_job_response(request, job)
+        
         try:
-            if file.name.endswith('.csv'):
-                products = process_csv_file(file)
-            elif file.name.endswith(('.xlsx', '.xls')):
-                products = process_excel_file(file)
-            else:
-                messages.error(request, 'Invalid file format. Please upload CSV or Excel file')
-                return redirect('bulk_upload_products')
-            
-            success_count = 0
-            error_count = 0
-            errors = []
-            
-            for idx, product_data in enumerate(products, start=2):
-                try:
-                    ProductMaster.objects.create(
-                        product_name=product_data['product_name'],
-                        product_company=product_data['product_company'],
-                        product_packing=product_data['product_packing'],
-                        product_category=product_data['product_category'],
-                        product_salt='N/A',
-                        product_hsn='N/A',
-                        product_hsn_percent='0',
-                        product_barcode=product_data.get('product_barcode', '') or None
-                    )
-                    success_count += 1
-                except Exception as e:
-                    error_count += 1
-                    errors.append(f"Row {idx}: {str(e)[:100]}")
-            
-            if success_count > 0:
-                messages.success(request, f'Successfully uploaded {success_count} products')
-            
-            if error_count > 0:
-                error_msg = f'{error_count} products failed. ' + '; '.join(errors[:5])
-                messages.warning(request, error_msg)
-            
-            # Redirect to last page with ID sorting to show newly added products
-            all_products = ProductMaster.objects.all().order_by('productid')
-            paginator = Paginator(all_products, 50)
-            last_page = paginator.num_pages
-            
-            from django.http import HttpResponseRedirect
-            return HttpResponseRedirect(f'/products/?sort=productid&page={last_page}')
-            
+            result = import_products(iter_file_rows(file, file.name))
         except Exception as e:
             messages.error(request, f'Error processing file: {str(e)}')
             return redirect('bulk_upload_products')
+        
+        if request.GET.get('format') == 'json':
+            return JsonResponse({'success': True, **result})
+        
+        if result['created']:
+            messages.success(request, f"Successfully uploaded {result['created']} products")
+        if result['errors']:
+            messages.warning(request, f"{result['error_count']} rows were not imported; see the report below")
+        return render(request, 'products/bulk_upload_products.html', {'result': result})
     
     return render(request, 'products/bulk_upload_products.html')
 
-def process_csv_file(file):
-    decoded_file = file.read().decode('utf-8').splitlines()
-    reader = csv.DictReader(decoded_file)
-    products = []
-    
-    for row in reader:
-        if row.get('product_name') and row.get('product_name').strip():  # Skip empty rows
-            products.append({
-                'product_name': row['product_name'].strip(),
-                'product_company': row['product_company'].strip(),
-                'product_packing': row['product_packing'].strip(),
-                'product_category': row['product_category'].strip(),
-                'product_barcode': row.get('product_barcode', '').strip()
-            })
-    
-    return products
 
-def process_excel_file(file):
+def _cell_text(value):
+    """Spreadsheet cell as stripped text; whole-number floats (barcodes from Excel) lose their '.0'"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def iter_csv_rows(file):
+    """(row number, {column: text}) for each CSV data row, read as the file streams in"""
+    reader = csv.DictReader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    for row_number, row in enumerate(reader, start=2):
+        yield row_number, {
+            (key or '').strip().lower(): _cell_text(value) for key, value in row.items() if not isinstance(value, list)
+        }
+
+
+def iter_excel_rows(file, columns=PRODUCT_COLUMNS):
+    """
+    (row number, {column: text}) for each row of the first sheet, read in
+    read-only mode. Columns are matched by header name; a sheet without any
+    of the template headers is read in template (`columns`) order.
+    """
     if not EXCEL_SUPPORT:
         raise Exception('Excel support not available. Please install openpyxl: pip install openpyxl')
     
-    wb = load_workbook(file)
-    ws = wb.active
-    products = []
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [_cell_text(value).lower() for value in next(rows, ())]
+        if not set(header) & set(columns):
+            header = columns
+        for row_number, row in enumerate(rows, start=2):
+            yield row_number, {column: _cell_text(value) for column, value in zip(header, row) if column}
+    finally:
+        wb.close()
+
+
+def iter_file_rows(file, name, columns=PRODUCT_COLUMNS):
+    """(row number, {column: text}) rows of a CSV or Excel file, picked by its name"""
+    if name.endswith('.csv'):
+        return iter_csv_rows(file)
+    if name.endswith(('.xlsx', '.xls')):
+        return iter_excel_rows(file, columns)
+    raise ValueError('Invalid file format. Please upload CSV or Excel file')
+
+
+def iter_stored_rows(field_file, name, columns=PRODUCT_COLUMNS):
+    """Rows of a file kept in storage (an ImportJob upload); the file is closed when they run out"""
+    with field_file.open('rb') as file:
+        yield from iter_file_rows(file, name, columns)
+
+
+def _product_key(name, company, packing):
+    return (name.casefold(), company.casefold(), packing.casefold())
+
+
+def validate_product_row(row, barcodes, keys):
+    """
+    (ProductMaster, None) for a valid new product or (None, error). `barcodes`
+    and `keys` hold what already exists and grow with every accepted row, so
+    duplicates within the file are caught too.
+    """
+    values = {column: row.get(column, '') for column in PRODUCT_COLUMNS}
+    for column, default in OPTIONAL_COLUMNS.items():
+        values[column] = row.get(column) or default
+
+    missing = [column for column in REQUIRED_COLUMNS if not values[column]]
+    if missing:
+        return None, f"Missing {', '.join(missing)}"
+    for column, max_length in MAX_LENGTHS.items():
+        if len(values[column]) > max_length:
+            return None, f"{column} is longer than {max_length} characters"
+
+    key = _product_key(values['product_name'], values['product_company'], values['product_packing'])
+    if key in keys:
+        return None, 'Product with this name, company and packing already exists'
+    barcode = values['product_barcode'] or None
+    if barcode is not None and barcode in barcodes:
+        return None, f"Barcode {barcode} is already used by another product"
+
+    keys.add(key)
+    if barcode is not None:
+        barcodes.add(barcode)
+    values['product_barcode'] = barcode
+    return ProductMaster(**values), None
+
+
+def _insert_chunk(chunk, result):
+    """bulk_create one chunk in a transaction; on a conflict (e.g. a barcode added meanwhile) insert row by row"""
+    products = [product for _, product in chunk]
+    try:
+        with transaction.atomic():
+            created = ProductMaster.objects.bulk_create(products)
+        result['created'] += len(created)
+        return created
+    except IntegrityError:
+        pass
     
-    headers = [cell.value for cell in ws[1]]
+    created = []
+    for row_number, product in chunk:
+        try:
+            with transaction.atomic():
+                product.save()
+            created.append(product)
+            result['created'] += 1
+        except IntegrityError as e:
+            _report_error(result, row_number, product.product_name, str(e)[:100])
+    return created
+
+
+def _report_error(result, row_number, name, error):
+    result['error_count'] += 1
+    if len(result['errors']) < MAX_REPORTED_ERRORS:
+        result['errors'].append({'row': row_number, 'product_name': name, 'error': error})
+
+
+def _refresh_product_indexes(products):
+    """bulk_create skips the post_save receivers; do what they would have done"""
+    # Index before bumping so this worker's trigram index counts the bump as its own
+    product_trigram_index.update_many([product for product in products if product.pk is not None])
+    bump_version(PRODUCTS)
+    if any(product.pk is None for product in products):
+        # Backends that don't return ids from bulk_create get a full salt index rebuild
+        rebuild_salt_index()
+    else:
+        rebuild_salt_index([product.pk for product in products if salt_keys(product.product_salt)[0]])
+
+
+def _existing_product_keys():
+    """Barcodes and (name, company, packing) keys already in ProductMaster"""
+    barcodes = set(ProductMaster.objects.exclude(product_barcode__isnull=True).values_list(
+        'product_barcode', flat=True
+    ))
+    keys = {
+        _product_key(name or '', company or '', packing or '')
+        for name, company, packing in ProductMaster.objects.values_list(
+            'product_name', 'product_company', 'product_packing'
+        ).iterator(chunk_size=5000)
+    }
+    return barcodes, keys
+
+
+def _import_product_chunk(rows, barcodes, keys, result):
+    """Validate and insert one chunk of non-empty rows; returns the created products"""
+    chunk = []
+    for row_number, row in rows:
+        product, error = validate_product_row(row, barcodes, keys)
+        if error:
+            _report_error(result, row_number, row.get('product_name', ''), error)
+        else:
+            chunk.append((row_number, product))
+    return _insert_chunk(chunk, result) if chunk else []
+
+
+def import_products(rows):
+    """
+    Validate and insert (row number, {column: text}) rows in chunks.
+    Returns {'created', 'error_count', 'errors': [{'row', 'product_name', 'error'}], 'rows'}.
+    """
+    barcodes, keys = _existing_product_keys()
     
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        if row[0]:  # Skip empty rows
-            products.append({
-                'product_name': str(row[0]).strip(),
-                'product_company': str(row[1]).strip(),
-                'product_packing': str(row[2]).strip(),
-                'product_category': str(row[3]).strip(),
-                'product_barcode': str(row[4] if len(row) > 4 and row[4] else '').strip()
-            })
+    result = {'created': 0, 'error_count': 0, 'errors': [], 'rows': 0}
+    created = []
+    chunk = []
+    for row_number, row in rows:
+        if not any(row.values()):  # Skip empty rows
+            continue
+        result['rows'] += 1
+        chunk.append((row_number, row))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            created += _import_product_chunk(chunk, barcodes, keys, result)
+            chunk = []
+    if chunk:
+        created += _import_product_chunk(chunk, barcodes, keys, result)
     
-    return products
+    if created:
+        _refresh_product_indexes(created)
+    return result
+
+
+def product_import_job(job):
+    """ImportJob handler for kind 'products' (see import_jobs.IMPORT_KINDS)"""
+    # Read when the job (re)starts, so rows committed before a crash count as existing
+    barcodes, keys = _existing_product_keys()
+
+    def process(rows, result):
+        created = _import_product_chunk(rows, barcodes, keys, result)
+        if created:
+            _refresh_product_indexes(created)
+
+    return (lambda: iter_stored_rows(job.file, job.filename)), process
 
 @login_required
 def download_product_template(request):
@@ -1,4 +1,5 @@
 import json
+import math
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
@@ -7,6 +8,8 @@ from django.db import transaction
 from django.db.models import Sum, Q
 from .models import ProductMaster, SupplierMaster, PurchaseMaster, SaleRateMaster, InvoiceMaster, SalesMaster
 from .forms import InvoiceForm
+from .picker_views import product_catalog_url
+from .purchase_import import normalize_expiry, save_purchase_invoice
 import logging
 from datetime import datetime, timedelta
 
@@ -14,316 +17,156 @@ from datetime import datetime, timedelta
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Simple file logging for debugging
-import os
-log_file = os.path.join(os.path.dirname(__file__), 'invoice_debug.log')
-file_handler = logging.FileHandler(log_file)
-file_handler.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
+# Numeric fields of a line posted by the combined invoice form
+LINE_NUMERIC_FIELDS = ['mrp', 'purchase_rate', 'quantity', 'scheme', 'discount', 'igst']
+
+def _combined_form_response(request, invoice_form):
+    context = {
+        'invoice_form': invoice_form,
+        'catalog_url': product_catalog_url(),
+        'title': 'Add Invoice with Products'
+    }
+    return render(request, 'purchases/combined_invoice_form.html', context)
+
+
+def _parse_invoice_line(product, product_data):
+    """
+    Validated (batch no, expiry, calculation mode, {numeric field: value},
+    {rate_a/b/c: value or None} or None) for one line of the form, as
+    save_purchase_invoice takes them; raises ValueError with the message shown to the user
+    """
+    name = product.product_name
+    batch_no = str(product_data.get('batch_no', '')).strip()
+    expiry = str(product_data.get('expiry', '')).strip()
+    if not batch_no:
+        raise ValueError(f"Batch number is required for {name}")
+    if not expiry:
+        raise ValueError(f"Expiry date is required for {name}")
+    try:
+        expiry = normalize_expiry(expiry)
+    except ValueError:
+        raise ValueError(f"Invalid expiry date format for {name}. Use MM-YYYY format (e.g., 12-2025).")
+
+    try:
+        values = {field: float(product_data.get(field, 0)) for field in LINE_NUMERIC_FIELDS}
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid numeric values for {name}: {e}")
+    if not all(math.isfinite(value) for value in values.values()):
+        raise ValueError(f"Invalid numeric values for {name}: numbers must be finite")
+    if values['quantity'] <= 0:
+        raise ValueError(f"Quantity must be greater than 0 for {name}")
+    if values['purchase_rate'] <= 0:
+        raise ValueError(f"Purchase rate must be greater than 0 for {name}")
+
+    mode = product_data.get('calculation_mode', 'flat')
+    if mode == 'flat':
+        if values['discount'] > values['purchase_rate'] * values['quantity']:
+            raise ValueError(f"Flat discount cannot exceed total amount for {name}")
+    elif values['discount'] > 100:
+        raise ValueError(f"Percentage discount cannot exceed 100% for {name}")
+
+    try:
+        rates = {
+            field.lower(): float(product_data[field]) if product_data.get(field) else None
+            for field in ('rate_A', 'rate_B', 'rate_C')
+        }
+        if not all(math.isfinite(rate) for rate in rates.values() if rate is not None):
+            raise ValueError("non-finite sale rate")
+    except (ValueError, TypeError):
+        logger.warning(f"Invalid sale rates for {name}, skipping rate setup")
+        rates = None
+    return batch_no, expiry, mode, values, rates
+
 
 @login_required
 def add_invoice_with_products(request):
+    """
+    Create a purchase invoice with all its lines. Products are fetched in one
+    query, every line is validated before anything is written, and
+    save_purchase_invoice writes the invoice, its purchases and batch sale
+    rates in one transaction, so the query count does not grow with lines.
+    """
     if request.method == 'POST':
         try:
-            # Debug: Log the POST data
-            logger.info(f"POST data received: {request.POST}")
-            
-            # Handle form submission
             invoice_form = InvoiceForm(request.POST)
-            
-            # Debug: Check form validation
             if not invoice_form.is_valid():
                 logger.error(f"Invoice form validation errors: {invoice_form.errors}")
                 messages.error(request, f"Invoice form validation failed: {invoice_form.errors}")
-                # Return to form with errors
-                suppliers = SupplierMaster.objects.all().order_by('supplier_name')
-                products = ProductMaster.objects.all().order_by('product_name')
-                context = {
-                    'invoice_form': invoice_form,
-                    'suppliers': suppliers,
-                    'products': products,
-                    'title': 'Add Invoice with Products'
-                }
-                return render(request, 'purchases/combined_invoice_form.html', context)
+                return _combined_form_response(request, invoice_form)
             
             # Process products data from JavaScript
             products_data = request.POST.get('products_data')
-            logger.info(f"Products data received: {products_data}")
-            
             if not products_data:
                 messages.error(request, "No products data provided. Please add at least one product.")
-                suppliers = SupplierMaster.objects.all().order_by('supplier_name')
-                products = ProductMaster.objects.all().order_by('product_name')
-                context = {
-                    'invoice_form': invoice_form,
-                    'suppliers': suppliers,
-                    'products': products,
-                    'title': 'Add Invoice with Products'
-                }
-                return render(request, 'purchases/combined_invoice_form.html', context)
+                return _combined_form_response(request, invoice_form)
             
             try:
                 products = json.loads(products_data)
             except json.JSONDecodeError as e:
                 logger.error(f"JSON decode error: {e}")
                 messages.error(request, "Invalid products data format. Please try again.")
-                suppliers = SupplierMaster.objects.all().order_by('supplier_name')
-                products_list = ProductMaster.objects.all().order_by('product_name')
-                context = {
-                    'invoice_form': invoice_form,
-                    'suppliers': suppliers,
-                    'products': products_list,
-                    'title': 'Add Invoice with Products'
-                }
-                return render(request, 'purchases/combined_invoice_form.html', context)
+                return _combined_form_response(request, invoice_form)
             
             if not products:
                 messages.error(request, "Please add at least one product to the invoice.")
-                suppliers = SupplierMaster.objects.all().order_by('supplier_name')
-                products_list = ProductMaster.objects.all().order_by('product_name')
-                context = {
-                    'invoice_form': invoice_form,
-                    'suppliers': suppliers,
-                    'products': products_list,
-                    'title': 'Add Invoice with Products'
-                }
-                return render(request, 'purchases/combined_invoice_form.html', context)
+                return _combined_form_response(request, invoice_form)
             
-            # Use transaction to ensure data consistency
-            with transaction.atomic():
-                # Create invoice
-                invoice = invoice_form.save(commit=False)
-                invoice.invoice_paid = 0
-                invoice.save()
-                logger.info(f"Invoice created with ID: {invoice.invoiceid}")
-                
-                total_amount = 0
-                products_added = 0
-                errors = []
-                
-                for i, product_data in enumerate(products):
-                    if product_data.get('productid'):
-                        try:
-                            # Get product details
-                            product = ProductMaster.objects.get(productid=product_data['productid'])
-                            
-                            # Validate required fields
-                            batch_no = product_data.get('batch_no', '').strip()
-                            expiry = product_data.get('expiry', '').strip()
-                            
-                            if not batch_no:
-                                errors.append(f"Row {i+1}: Batch number is required for {product.product_name}")
-                                continue
-                            
-                            if not expiry:
-                                errors.append(f"Row {i+1}: Expiry date is required for {product.product_name}")
-                                continue
-                            
-                            # Validate and normalize expiry date to MM-YYYY format
-                            try:
-                                # Handle different input formats and convert to MM-YYYY
-                                if len(expiry) == 4 and expiry.isdigit():
-                                    # MMYY format - convert to MM-YYYY
-                                    month = expiry[:2]
-                                    year = '20' + expiry[2:4]
-                                    expiry = f"{month}-{year}"
-                                elif len(expiry) == 6 and expiry.isdigit():
-                                    # MMYYYY format - convert to MM-YYYY
-                                    month = expiry[:2]
-                                    year = expiry[2:6]
-                                    expiry = f"{month}-{year}"
-                                elif '/' in expiry:
-                                    # MM/YYYY format - convert to MM-YYYY
-                                    expiry = expiry.replace('/', '-')
-                                elif len(expiry) == 7 and expiry.count('-') == 1:
-                                    # Already in MM-YYYY format - validate it
-                                    pass
-                                else:
-                                    raise ValueError("Invalid format")
-                                
-                                # Validate MM-YYYY format
-                                import re
-                                if not re.match(r'^(0[1-9]|1[0-2])-\d{4}$', expiry):
-                                    raise ValueError("Invalid MM-YYYY format")
-                                
-                                month, year = expiry.split('-')
-                                month = int(month)
-                                year = int(year)
-                                
-                                if month < 1 or month > 12:
-                                    raise ValueError("Invalid month")
-                                if year < 2020 or year > 2050:
-                                    raise ValueError("Invalid year")
-                                
-                            except (ValueError, IndexError):
-                                errors.append(f"Row {i+1}: Invalid expiry date format for {product.product_name}. Use MM-YYYY format (e.g., 12-2025).")
-                                continue
-                            
-                            # Convert and validate numeric fields
-                            try:
-                                mrp = float(product_data.get('mrp', 0))
-                                purchase_rate = float(product_data.get('purchase_rate', 0))
-                                quantity = float(product_data.get('quantity', 0))
-                                scheme = float(product_data.get('scheme', 0))
-                                discount = float(product_data.get('discount', 0))
-                                igst = float(product_data.get('igst', 0))
-                            except (ValueError, TypeError) as e:
-                                errors.append(f"Row {i+1}: Invalid numeric values for {product.product_name}: {e}")
-                                continue
-                            
-                            if quantity <= 0:
-                                errors.append(f"Row {i+1}: Quantity must be greater than 0 for {product.product_name}")
-                                continue
-                            
-                            if purchase_rate <= 0:
-                                errors.append(f"Row {i+1}: Purchase rate must be greater than 0 for {product.product_name}")
-                                continue
-                            
-                            # Create purchase entry
-                            purchase = PurchaseMaster()
-                            purchase.product_supplierid = invoice.supplierid
-                            purchase.product_invoiceid = invoice
-                            purchase.product_invoice_no = invoice.invoice_no
-                            purchase.productid = product
-                            purchase.product_name = product.product_name
-                            purchase.product_company = product.product_company
-                            purchase.product_packing = product.product_packing
-                            purchase.product_batch_no = batch_no
-                            purchase.product_expiry = expiry
-                            purchase.product_MRP = mrp
-                            purchase.product_purchase_rate = purchase_rate
-                            purchase.product_quantity = quantity
-                            purchase.product_scheme = scheme
-                            purchase.product_discount_got = discount
-                            purchase.IGST = igst
-                            purchase.purchase_calculation_mode = product_data.get('calculation_mode', 'flat')
-                            
-                            # Calculate actual rate
-                            if purchase.purchase_calculation_mode == 'flat':
-                                if discount > purchase_rate * quantity:
-                                    errors.append(f"Row {i+1}: Flat discount cannot exceed total amount for {product.product_name}")
-                                    continue
-                                purchase.actual_rate_per_qty = purchase_rate - (discount / quantity) if quantity > 0 else purchase_rate
-                            else:
-                                if discount > 100:
-                                    errors.append(f"Row {i+1}: Percentage discount cannot exceed 100% for {product.product_name}")
-                                    continue
-                                purchase.actual_rate_per_qty = purchase_rate * (1 - (discount / 100))
-                            
-                            purchase.product_actual_rate = purchase.actual_rate_per_qty
-                            purchase.total_amount = purchase.product_actual_rate * quantity
-                            purchase.product_transportation_charges = 0  # Will be calculated later
-                            
-                            total_amount += purchase.total_amount
-                            purchase.save()
-                            products_added += 1
-                            logger.info(f"Product {product.product_name} added to invoice")
-                            
-                            # Save sale rates if provided
-                            rate_A = product_data.get('rate_A')
-                            rate_B = product_data.get('rate_B')
-                            rate_C = product_data.get('rate_C')
-                            
-                            if rate_A or rate_B or rate_C:
-                                try:
-                                    SaleRateMaster.objects.update_or_create(
-                                        productid=product,
-                                        product_batch_no=batch_no,
-                                        defaults={
-                                            'rate_A': float(rate_A) if rate_A else 0,
-                                            'rate_B': float(rate_B) if rate_B else 0,
-                                            'rate_C': float(rate_C) if rate_C else 0
-                                        }
-                                    )
-                                except (ValueError, TypeError):
-                                    logger.warning(f"Invalid sale rates for {product.product_name}, skipping rate setup")
-                            
-                        except ProductMaster.DoesNotExist:
-                            errors.append(f"Row {i+1}: Product with ID {product_data['productid']} not found")
-                            continue
-                        except Exception as e:
-                            errors.append(f"Row {i+1}: Error processing product: {str(e)}")
-                            logger.error(f"Error processing product {i+1}: {e}")
-                            continue
-                
-                # Check if any products were added
-                if products_added == 0:
-                    error_msg = "No valid products were added to the invoice."
-                    if errors:
-                        error_msg += " Errors: " + "; ".join(errors[:5])  # Show first 5 errors
-                    messages.error(request, error_msg)
-                    # Delete the invoice since no products were added
-                    invoice.delete()
-                    suppliers = SupplierMaster.objects.all().order_by('supplier_name')
-                    products_list = ProductMaster.objects.all().order_by('product_name')
-                    context = {
-                        'invoice_form': InvoiceForm(),
-                        'suppliers': suppliers,
-                        'products': products_list,
-                        'title': 'Add Invoice with Products'
-                    }
-                    return render(request, 'purchases/combined_invoice_form.html', context)
-                
-                # Distribute transport charges if any
-                if invoice.transport_charges > 0 and products_added > 0:
-                    transport_per_product = invoice.transport_charges / products_added
-                    purchases = PurchaseMaster.objects.filter(product_invoiceid=invoice)
-                    
-                    for purchase in purchases:
-                        purchase.product_transportation_charges = transport_per_product
-                        transport_per_unit = transport_per_product / purchase.product_quantity
-                        purchase.product_actual_rate = purchase.actual_rate_per_qty + transport_per_unit
-                        purchase.total_amount = purchase.product_actual_rate * purchase.product_quantity
-                        purchase.save()
-                    
-                    # Recalculate total with transport charges
-                    total_amount = sum(p.total_amount for p in purchases)
-                
-                # Update invoice total if calculated total differs significantly
-                if abs(total_amount - invoice.invoice_total) > 0.01:
-                    logger.info(f"Updating invoice total from {invoice.invoice_total} to {total_amount}")
-                    invoice.invoice_total = total_amount
-                    invoice.save()
-                
-                # Show any non-critical errors as warnings
+            # One query for every product on the invoice
+            product_ids = set()
+            for product_data in products:
+                try:
+                    product_ids.add(int(product_data.get('productid')))
+                except (TypeError, ValueError):
+                    pass
+            catalog = ProductMaster.objects.only(
+                'productid', 'product_name', 'product_company', 'product_packing'
+            ).in_bulk(product_ids)
+            
+            errors = []
+            lines = []
+            for i, product_data in enumerate(products):
+                if not product_data.get('productid'):
+                    continue
+                try:
+                    product = catalog.get(int(product_data['productid']))
+                except (TypeError, ValueError):
+                    product = None
+                if product is None:
+                    errors.append(f"Row {i+1}: Product with ID {product_data['productid']} not found")
+                    continue
+                try:
+                    lines.append((product,) + _parse_invoice_line(product, product_data))
+                except ValueError as e:
+                    errors.append(f"Row {i+1}: {e}")
+            
+            if not lines:
+                error_msg = "No valid products were added to the invoice."
                 if errors:
-                    for error in errors[:3]:  # Show first 3 errors
-                        messages.warning(request, error)
-                
-                messages.success(request, f"Purchase Invoice #{invoice.invoice_no} with {products_added} products added successfully!")
-                logger.info(f"Invoice {invoice.invoice_no} created successfully with {products_added} products")
-                return redirect('invoice_detail', pk=invoice.invoiceid)
+                    error_msg += " Errors: " + "; ".join(errors[:5])  # Show first 5 errors
+                messages.error(request, error_msg)
+                return _combined_form_response(request, invoice_form)
+            
+            invoice = invoice_form.save(commit=False)
+            purchases = save_purchase_invoice(invoice, lines)
+            
+            # Show any non-critical errors as warnings
+            for error in errors[:3]:  # Show first 3 errors
+                messages.warning(request, error)
+            
+            messages.success(request, f"Purchase Invoice #{invoice.invoice_no} with {len(purchases)} products added successfully!")
+            logger.info(f"Invoice {invoice.invoice_no} created successfully with {len(purchases)} products")
+            return redirect('invoice_detail', pk=invoice.invoiceid)
                 
         except Exception as e:
             logger.error(f"Unexpected error creating invoice: {e}")
             messages.error(request, f"Error creating invoice: {str(e)}")
-            # Return to form
-            suppliers = SupplierMaster.objects.all().order_by('supplier_name')
-            products = ProductMaster.objects.all().order_by('product_name')
-            context = {
-                'invoice_form': InvoiceForm(),
-                'suppliers': suppliers,
-                'products': products,
-                'title': 'Add Invoice with Products'
-            }
-            return render(request, 'purchases/combined_invoice_form.html', context)
+            return _combined_form_response(request, InvoiceForm())
     else:
         # GET request - show the form
         invoice_form = InvoiceForm()
     
-    # Get suppliers and products for dropdowns
-    suppliers = SupplierMaster.objects.all().order_by('supplier_name')
-    products = ProductMaster.objects.all().order_by('product_name')
-    
-    context = {
-        'invoice_form': invoice_form,
-        'suppliers': suppliers,
-        'products': products,
-        'title': 'Add Invoice with Products'
-    }
-    return render(request, 'purchases/combined_invoice_form.html', context)
+    # Products are loaded by the page from the catalog snapshot
+    return _combined_form_response(request, invoice_form)
 
 
 
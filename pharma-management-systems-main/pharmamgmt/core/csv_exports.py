@@ -0,0 +1,200 @@
+"""
+Streaming CSV exports
+Rows are read with values_list().iterator() and written through csv.writer a
+chunk at a time into a StreamingHttpResponse, so memory stays flat whether an
+export has a thousand rows or millions
+"""
+
+import csv
+from datetime import datetime
+
+from django.contrib.auth.decorators import login_required
+from django.db.models import F, FloatField, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .models import (
+    PurchaseMaster, SalesMaster, ReturnPurchaseMaster, ReturnSalesMaster, PaymentMaster
+)
+
+# Rows fetched from the database per round trip
+CHUNK_SIZE = 2000
+# CSV lines joined into one chunk of the response body
+LINES_PER_WRITE = 500
+
+
+class Echo:
+    """File-like object for csv.writer: write() hands the formatted line back"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(filename, header, rows):
+    """StreamingHttpResponse writing `header` and then every row of the `rows` iterable"""
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield writer.writerow(header)
+        buffer = []
+        for row in rows:
+            buffer.append(writer.writerow(row))
+            if len(buffer) >= LINES_PER_WRITE:
+                yield ''.join(buffer)
+                buffer = []
+        if buffer:
+            yield ''.join(buffer)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _date_range(request):
+    """Optional ?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD; raises ValueError on a bad date"""
+    start_date = request.GET.get('start_date')
+    end_date = request.GET.get('end_date')
+    return (
+        datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None,
+        datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None,
+    )
+
+
+def _filter_dates(queryset, date_field, start_date, end_date):
+    if start_date:
+        queryset = queryset.filter(**{f'{date_field}__gte': start_date})
+    if end_date:
+        queryset = queryset.filter(**{f'{date_field}__lte': end_date})
+    return queryset
+
+
+def _bad_dates():
+    return JsonResponse({'success': False, 'error': 'Dates must be in YYYY-MM-DD format'}, status=400)
+
+
+@login_required
+def export_sales_csv(request):
+    """Every sales line, optionally limited to an invoice date range"""
+    try:
+        start_date, end_date = _date_range(request)
+    except ValueError:
+        return _bad_dates()
+
+    sales = _filter_dates(
+        SalesMaster.objects.all(), 'sales_invoice_no__sales_invoice_date', start_date, end_date
+    ).order_by('sales_invoice_no__sales_invoice_date', 'id').values_list(
+        'sales_invoice_no_id', 'sales_invoice_no__sales_invoice_date', 'customerid__customer_name',
+        'product_name', 'product_company', 'product_packing', 'product_batch_no', 'product_expiry',
+        'product_MRP', 'sale_rate', 'sale_quantity', 'sale_scheme', 'sale_discount', 'sale_igst',
+        'sale_total_amount', 'rate_applied'
+    )
+
+    return stream_csv('sales_lines.csv', [
+        'Invoice No', 'Invoice Date', 'Customer', 'Product', 'Company', 'Packing', 'Batch No',
+        'Expiry', 'MRP', 'Rate', 'Quantity', 'Scheme', 'Discount', 'GST %', 'Total', 'Rate Applied'
+    ], sales.iterator(chunk_size=CHUNK_SIZE))
+
+
+@login_required
+def export_purchases_csv(request):
+    """Every purchase line, optionally limited to an invoice date range"""
+    try:
+        start_date, end_date = _date_range(request)
+    except ValueError:
+        return _bad_dates()
+
+    purchases = _filter_dates(
+        PurchaseMaster.objects.all(), 'product_invoiceid__invoice_date', start_date, end_date
+    ).order_by('product_invoiceid__invoice_date', 'purchaseid').values_list(
+        'product_invoice_no', 'product_invoiceid__invoice_date', 'product_supplierid__supplier_name',
+        'product_name', 'product_company', 'product_packing', 'product_batch_no', 'product_expiry',
+        'product_MRP', 'product_purchase_rate', 'product_quantity', 'product_scheme',
+        'product_discount_got', 'IGST', 'product_transportation_charges', 'actual_rate_per_qty',
+        'total_amount'
+    )
+
+    return stream_csv('purchase_lines.csv', [
+        'Invoice No', 'Invoice Date', 'Supplier', 'Product', 'Company', 'Packing', 'Batch No',
+        'Expiry', 'MRP', 'Purchase Rate', 'Quantity', 'Scheme', 'Discount', 'GST %',
+        'Transport Charges', 'Actual Rate', 'Total'
+    ], purchases.iterator(chunk_size=CHUNK_SIZE))
+
+
+def _batch_movement(model, product_field, batch_field, quantity_field):
+    """Total quantity of a stock movement for the outer row's product and batch"""
+    movement = model.objects.filter(**{
+        product_field: OuterRef('productid'),
+        batch_field: OuterRef('product_batch_no'),
+    }).order_by().values(product_field).annotate(total=Sum(quantity_field)).values('total')
+    return Coalesce(Subquery(movement, output_field=FloatField()), Value(0.0))
+
+
+def inventory_batch_rows():
+    """
+    One row per purchased (product, batch), worked out in a single query:
+    stock = purchased - sold - purchase returns + sales returns, with expiry
+    and MRP taken from the batch's first purchase like the inventory pages
+    """
+    first_purchase = PurchaseMaster.objects.filter(
+        productid=OuterRef('productid'), product_batch_no=OuterRef('product_batch_no')
+    ).order_by('purchaseid')
+
+    return PurchaseMaster.objects.values(
+        'productid', 'product_batch_no'
+    ).annotate(
+        purchased=Sum('product_quantity'),
+        first_id=Min('purchaseid'),
+    ).annotate(
+        expiry=Subquery(first_purchase.values('product_expiry')[:1]),
+        mrp=Subquery(first_purchase.values('product_MRP')[:1]),
+        sold=_batch_movement(SalesMaster, 'productid', 'product_batch_no', 'sale_quantity'),
+        purchase_returns=_batch_movement(
+            ReturnPurchaseMaster, 'returnproductid', 'returnproduct_batch_no', 'returnproduct_quantity'
+        ),
+        sales_returns=_batch_movement(
+            ReturnSalesMaster, 'return_productid', 'return_product_batch_no', 'return_sale_quantity'
+        ),
+    ).annotate(
+        stock=F('purchased') - F('sold') - F('purchase_returns') + F('sales_returns'),
+    ).order_by('productid__product_name', 'productid', 'first_id').values_list(
+        'productid', 'productid__product_name', 'productid__product_company',
+        'productid__product_packing', 'product_batch_no', 'expiry', 'mrp', 'purchased', 'sold',
+        'purchase_returns', 'sales_returns', 'stock'
+    )
+
+
+@login_required
+def export_inventory_csv(request):
+    """Stock by batch; ?in_stock=1 leaves out batches with nothing left"""
+    rows = inventory_batch_rows()
+    if request.GET.get('in_stock') == '1':
+        rows = rows.filter(stock__gt=0)
+
+    def with_value(rows):
+        for row in rows:
+            yield row + (round(row[-1] * (row[6] or 0), 2),)
+
+    return stream_csv('inventory_by_batch.csv', [
+        'Product ID', 'Product', 'Company', 'Packing', 'Batch No', 'Expiry', 'MRP', 'Purchased',
+        'Sold', 'Purchase Returns', 'Sales Returns', 'Stock', 'Stock Value (MRP)'
+    ], with_value(rows.iterator(chunk_size=CHUNK_SIZE)))
+
+
+@login_required
+def export_payments_csv(request):
+    """Supplier payments, optionally limited to a payment date range"""
+    try:
+        start_date, end_date = _date_range(request)
+    except ValueError:
+        return _bad_dates()
+
+    payments = _filter_dates(
+        PaymentMaster.objects.all(), 'payment_date', start_date, end_date
+    ).order_by('payment_date', 'payment_id').values_list(
+        'payment_id', 'payment_date', 'payment_amount', 'payment_method', 'payment_reference',
+        'supplier__supplier_name', 'invoice__invoice_no', 'payment_description'
+    )
+
+    return stream_csv('payments.csv', [
+        'Payment ID', 'Date', 'Amount', 'Method', 'Reference', 'Supplier', 'Invoice No', 'Description'
+    ], payments.iterator(chunk_size=CHUNK_SIZE))
@@ -0,0 +1,77 @@
+"""
+Data version stamps
+Every worker keeps its own in-memory indexes/caches; a shared counter per data
+set in the database tells them when another process has changed the data
+"""
+
+import logging
+import time
+import threading
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import DataVersion
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS = 'products'
+PURCHASES = 'purchases'
+SALE_RATES = 'sale_rates'
+SALES = 'sales'
+
+# How often (seconds) a worker re-reads a version from the database
+CHECK_INTERVAL = 2.0
+
+_lock = threading.Lock()
+_cache = {}  # key -> (version, checked_at)
+
+
+def bump_version(key):
+    """
+    Increment the version of `key` once the current transaction commits.
+    Call after bulk_create/bulk_update/queryset.update(), which skip model signals.
+    """
+    def _bump():
+        updated = DataVersion.objects.filter(key=key).update(version=F('version') + 1)
+        if not updated:
+            DataVersion.objects.get_or_create(key=key, defaults={'version': 1})
+        with _lock:
+            _cache.pop(key, None)
+    transaction.on_commit(_bump)
+
+
+def get_version(key, max_age=CHECK_INTERVAL):
+    """Current version of `key`, re-read from the database at most every `max_age` seconds"""
+    now = time.monotonic()
+    cached = _cache.get(key)
+    if cached is not None and now - cached[1] < max_age:
+        return cached[0]
+    try:
+        version = DataVersion.objects.filter(key=key).values_list('version', flat=True).first() or 0
+    except Exception as e:
+        logger.warning("Could not read data version '%s': %s", key, e)
+        return cached[0] if cached else 0
+    with _lock:
+        _cache[key] = (version, now)
+    return version
+
+
+def bump_products_version(sender=None, **kwargs):
+    """post_save/post_delete receiver for ProductMaster"""
+    bump_version(PRODUCTS)
+
+
+def bump_purchases_version(sender=None, **kwargs):
+    """post_save/post_delete receiver for PurchaseMaster and ReturnPurchaseMaster"""
+    bump_version(PURCHASES)
+
+
+def bump_sale_rates_version(sender=None, **kwargs):
+    """post_save/post_delete receiver for SaleRateMaster"""
+    bump_version(SALE_RATES)
+
+
+def bump_sales_version(sender=None, **kwargs):
+    """post_save/post_delete receiver for SalesMaster and ReturnSalesMaster"""
+    bump_version(SALES)
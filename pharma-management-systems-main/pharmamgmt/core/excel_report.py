@@ -0,0 +1,142 @@
+"""
+Write-only Excel reports
+ExcelReport wraps an openpyxl write-only workbook: rows go straight to a
+temporary file as they are appended instead of being kept as Cell objects, and
+every cell points at one of a few named styles registered up front rather than
+carrying its own Font/Fill/Border copies. Feed it rows from
+queryset.values_list().iterator() and memory stays bounded however long the
+report is
+"""
+
+import tempfile
+from copy import copy
+
+from django.http import FileResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CURRENCY_FORMAT = '#,##0.00'
+
+_thin = Side(style='thin')
+THIN_BORDER = Border(left=_thin, right=_thin, top=_thin, bottom=_thin)
+
+
+def solid_fill(color):
+    return PatternFill(start_color=color, end_color=color, fill_type='solid')
+
+
+def named_style(name, font=None, fill=None, alignment=None, border=None, number_format=None):
+    style = NamedStyle(name=name)
+    if font is not None:
+        style.font = font
+    if fill is not None:
+        style.fill = fill
+    if alignment is not None:
+        style.alignment = alignment
+    if border is not None:
+        style.border = border
+    if number_format is not None:
+        style.number_format = number_format
+    return style
+
+
+def default_styles(header_color, total_color):
+    """Styles shared by the tabular reports"""
+    normal = Font(name='Arial', size=10)
+    center = Alignment(horizontal='center', vertical='center')
+    left = Alignment(horizontal='left', vertical='center')
+    right = Alignment(horizontal='right')
+    return [
+        named_style('title', font=Font(name='Arial', size=14, bold=True), alignment=center),
+        named_style('subtitle', font=Font(bold=True), alignment=center),
+        named_style('note', alignment=center),
+        named_style('empty', font=Font(italic=True, color='FF0000'), alignment=center),
+        named_style('header', font=Font(name='Arial', size=12, bold=True, color='FFFFFF'),
+                    fill=solid_fill(header_color), alignment=center, border=THIN_BORDER),
+        named_style('text', font=normal, alignment=left, border=THIN_BORDER),
+        named_style('center', font=normal, alignment=center, border=THIN_BORDER),
+        named_style('currency', font=normal, alignment=left, border=THIN_BORDER,
+                    number_format=CURRENCY_FORMAT),
+        named_style('total_label', font=Font(bold=True, size=12), fill=solid_fill(total_color),
+                    alignment=right, border=THIN_BORDER),
+        named_style('total_value', font=Font(bold=True, size=12), fill=solid_fill(total_color),
+                    border=THIN_BORDER, number_format=CURRENCY_FORMAT),
+        named_style('summary_label', font=Font(bold=True), alignment=right),
+        named_style('summary_value', font=Font(bold=True), alignment=Alignment(horizontal='center')),
+    ]
+
+
+class ExcelReport:
+    """
+    One-sheet report written row by row.
+
+    `widths` sets the column count and widths; `freeze` (e.g. 'A7') must be
+    known up front because a write-only sheet writes its header first.
+    """
+
+    def __init__(self, sheet_title, widths, header_color='366092', total_color='FFFF00', freeze=None):
+        self.workbook = Workbook(write_only=True)
+        for style in default_styles(header_color, total_color):
+            self.workbook.add_named_style(style)
+        self.sheet = self.workbook.create_sheet(sheet_title)
+        for index, width in enumerate(widths, 1):
+            self.sheet.column_dimensions[get_column_letter(index)].width = width
+        if freeze:
+            self.sheet.freeze_panes = freeze
+        self.columns = len(widths)
+        self.rows_written = 0
+        self._style_arrays = {}  # style name -> resolved style of a cell using it
+
+    def add_style(self, name, **attributes):
+        self.workbook.add_named_style(named_style(name, **attributes))
+
+    def cell(self, value, style):
+        cell = WriteOnlyCell(self.sheet, value=value)
+        if style:
+            # Resolve each named style once; later cells copy the result
+            style_array = self._style_arrays.get(style)
+            if style_array is None:
+                cell.style = style
+                self._style_arrays[style] = copy(cell._style)
+            else:
+                cell._style = copy(style_array)
+        return cell
+
+    def row(self, values, styles='text'):
+        """Append a row; `styles` is one style name or one per value"""
+        if isinstance(styles, str) or styles is None:
+            styles = [styles] * len(values)
+        self.sheet.append([self.cell(value, style) for value, style in zip(values, styles)])
+        self.rows_written += 1
+
+    def blank(self):
+        self.sheet.append([])
+        self.rows_written += 1
+
+    def merge(self, first_column, last_column):
+        """Merge columns of the row just written"""
+        row = self.rows_written
+        self.sheet.merged_cells.add(
+            f'{get_column_letter(first_column)}{row}:{get_column_letter(last_column)}{row}'
+        )
+
+    def banner(self, text, style='title', columns=None):
+        """A line of text merged across the report's (or the first `columns`) columns"""
+        self.row([text], style)
+        self.merge(1, columns or self.columns)
+
+    def total(self, label, value, label_style='total_label', value_style='total_value'):
+        """Label merged across all but the last column, value in the last one"""
+        self.row([label] + [None] * (self.columns - 2) + [value],
+                 [label_style] * (self.columns - 1) + [value_style])
+        self.merge(1, self.columns - 1)
+
+    def response(self, filename):
+        """Save to a temporary file and stream it back as a download"""
+        target = tempfile.TemporaryFile()
+        self.workbook.save(target)
+        target.seek(0)
+        return FileResponse(target, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
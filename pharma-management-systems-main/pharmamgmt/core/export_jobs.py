@@ -0,0 +1,264 @@
+"""
+Background export jobs
+Large PDF/Excel/CSV exports are queued as ExportJob rows and rendered by
+`manage.py run_export_worker` in a process pool, so web workers only enqueue,
+poll progress and hand out the finished file. An identical request (same kind
+and parameters) joins the queued or running job; for kinds whose inputs are
+all covered by data versions it also gets the file of one that finished
+recently against the same versions
+"""
+
+import hashlib
+import json
+import logging
+import re
+import tempfile
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.decorators import login_required
+from django.core.files import File
+from django.db.models import Q
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .data_version import PRODUCTS, PURCHASES, SALES, get_version
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+# kind -> (label, export view rendered by the worker)
+EXPORT_KINDS = {
+    'sales_pdf': ('Sales report (PDF)', 'core.views.export_sales_pdf'),
+    'purchases_pdf': ('Purchase report (PDF)', 'core.views.export_purchases_pdf'),
+    'inventory_pdf': ('Inventory report (PDF)', 'core.views.export_inventory_pdf'),
+    'sales_excel': ('Sales report (Excel)', 'core.views.export_sales_excel'),
+    'purchases_excel': ('Purchase report (Excel)', 'core.views.export_purchases_excel'),
+    'financial_excel': ('Financial report (Excel)', 'core.views.export_financial_excel'),
+    'payments_excel': ('Payments (Excel)', 'core.views.export_payments_excel'),
+    'sales_csv': ('Sales lines (CSV)', 'core.csv_exports.export_sales_csv'),
+    'purchases_csv': ('Purchase lines (CSV)', 'core.csv_exports.export_purchases_csv'),
+    'inventory_csv': ('Inventory by batch (CSV)', 'core.csv_exports.export_inventory_csv'),
+    'payments_csv': ('Payments (CSV)', 'core.csv_exports.export_payments_csv'),
+}
+
+# A finished export is handed out again for identical requests within this window
+REUSE_FOR = timedelta(minutes=5)
+# kind -> data versions covering everything the export reads. Only these kinds
+# reuse finished files: payments and invoice/party edits are not versioned
+REUSE_VERSION_KEYS = {
+    'inventory_pdf': (PRODUCTS, PURCHASES, SALES),
+    'inventory_csv': (PRODUCTS, PURCHASES, SALES),
+}
+# Running jobs not updated for this long are assumed lost with their worker
+STALE_AFTER = timedelta(minutes=30)
+# Finished jobs and their files are removed after this long
+KEEP_FOR = timedelta(hours=24)
+
+IGNORED_PARAMS = {'format', 'csrfmiddlewaretoken'}
+
+
+def _data_versions(kind):
+    return ':'.join(str(get_version(key)) for key in REUSE_VERSION_KEYS.get(kind, ()))
+
+
+def normalize_params(params):
+    """Sorted, non-empty query parameters; single values stay plain strings"""
+    normalized = {}
+    for key in sorted(params.keys()):
+        if key in IGNORED_PARAMS:
+            continue
+        values = params.getlist(key) if hasattr(params, 'getlist') else [params[key]]
+        values = [value for value in values if value != '']
+        if values:
+            normalized[key] = values[0] if len(values) == 1 else values
+    return normalized
+
+
+def enqueue_export(kind, params, user=None):
+    """
+    Queue an export, or return the identical job already queued or running, or
+    (kinds in REUSE_VERSION_KEYS) recently finished. Returns (job, created).
+    """
+    if kind not in EXPORT_KINDS:
+        raise ValueError(f"Unknown export kind: {kind}")
+    params = normalize_params(params)
+    dedupe_key = hashlib.sha256(json.dumps([kind, params], sort_keys=True).encode()).hexdigest()
+    versions = _data_versions(kind)
+
+    reusable = Q(status__in=('queued', 'running'))
+    if kind in REUSE_VERSION_KEYS:
+        reusable |= Q(status='done', data_versions=versions, finished_at__gte=timezone.now() - REUSE_FOR)
+    job = ExportJob.objects.filter(dedupe_key=dedupe_key).filter(reusable).order_by('-created_at').first()
+    if job is not None:
+        return job, False
+
+    job = ExportJob.objects.create(
+        kind=kind,
+        params=params,
+        dedupe_key=dedupe_key,
+        data_versions=versions,
+        token=uuid.uuid4().hex,
+        requested_by=user if user is not None and user.is_authenticated else None,
+        message='Waiting for an export worker',
+    )
+    return job, True
+
+
+def claim_next_job():
+    """Mark the oldest queued job running and return its id (None when the queue is empty)"""
+    for job_id in ExportJob.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True)[:10]:
+        # The conditional update lets several workers share the queue
+        if ExportJob.objects.filter(pk=job_id, status='queued').update(
+            status='running', started_at=timezone.now(), updated_at=timezone.now(), progress=0, message='Rendering'
+        ):
+            return job_id
+    return None
+
+
+def requeue_stale_jobs():
+    """Put jobs whose worker died mid-render back in the queue"""
+    return ExportJob.objects.filter(
+        status='running', updated_at__lt=timezone.now() - STALE_AFTER
+    ).update(status='queued', progress=0, message='Requeued after a worker stopped')
+
+
+def purge_expired_jobs():
+    """Delete finished jobs (and their files) older than KEEP_FOR"""
+    expired = ExportJob.objects.filter(
+        status__in=('done', 'failed'), finished_at__lt=timezone.now() - KEEP_FOR
+    )
+    count = 0
+    for job in expired.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        count += 1
+    return count
+
+
+def mark_failed(job_id, error):
+    ExportJob.objects.filter(pk=job_id).update(
+        status='failed', error=str(error)[:5000], message='Export failed', finished_at=timezone.now()
+    )
+
+
+def _response_filename(response, default):
+    match = re.search(r'filename="?([^";]+)"?', response.get('Content-Disposition', ''))
+    return match.group(1) if match else default
+
+
+def process_job(job_id):
+    """Render one claimed job by calling its export view with the saved parameters"""
+    job = ExportJob.objects.select_related('requested_by').get(pk=job_id)
+    label, view_path = EXPORT_KINDS[job.kind]
+    last_progress = [0]
+
+    def report_progress(percent, message=''):
+        # Throttled: one small UPDATE per whole percent
+        percent = max(0, min(int(percent), 99))
+        if percent > last_progress[0]:
+            last_progress[0] = percent
+            ExportJob.objects.filter(pk=job.pk).update(
+                progress=percent, message=message[:200], updated_at=timezone.now()
+            )
+
+    response = None
+    try:
+        if job.requested_by is None:
+            raise RuntimeError("The user who requested this export no longer exists")
+        request = RequestFactory().get('/', job.params)
+        request.user = job.requested_by
+        request.export_progress = report_progress
+
+        response = import_string(view_path)(request)
+        if response.status_code != 200:
+            body = b'' if response.streaming else response.content[:500]
+            raise RuntimeError(f"Export returned HTTP {response.status_code}: {body.decode(errors='replace')}")
+
+        with tempfile.TemporaryFile() as target:
+            chunks = response.streaming_content if response.streaming else [response.content]
+            for chunk in chunks:
+                target.write(chunk)
+            target.seek(0)
+            job.filename = _response_filename(response, f"{job.kind}_{job.pk}")
+            job.content_type = response.get('Content-Type', 'application/octet-stream')
+            job.file.save(job.filename, File(target), save=False)
+
+        job.status = 'done'
+        job.progress = 100
+        job.message = 'Ready to download'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['file', 'filename', 'content_type', 'status', 'progress', 'message', 'finished_at', 'updated_at'])
+    except Exception:
+        logger.exception("Export job %s (%s) failed", job_id, label)
+        mark_failed(job_id, traceback.format_exc())
+    finally:
+        if response is not None:
+            response.close()
+    return job_id
+
+
+def _job_json(job, created=None):
+    data = {
+        'success': job.status != 'failed',
+        'job_id': job.token,
+        'kind': job.kind,
+        'label': EXPORT_KINDS.get(job.kind, (job.kind,))[0],
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'status_url': reverse('export_job_status', args=[job.token]),
+        'download_url': reverse('export_job_download', args=[job.token]) if job.status == 'done' else None,
+    }
+    if created is not None:
+        data['created'] = created
+    if job.status == 'failed':
+        data['error'] = 'Export failed; see the export worker log'
+    return data
+
+
+@login_required
+def start_export(request, kind):
+    """Queue an export: /exports/<kind>/?<the export's usual parameters>"""
+    if kind not in EXPORT_KINDS:
+        raise Http404("Unknown export")
+    params = request.POST if request.method == 'POST' else request.GET
+    job, created = enqueue_export(kind, params, request.user)
+
+    if request.GET.get('format') == 'json' or request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse(_job_json(job, created), status=202 if job.status != 'done' else 200)
+    return redirect('export_job_detail', token=job.token)
+
+
+@login_required
+def export_job_detail(request, token):
+    """Progress page; polls the status endpoint and starts the download when ready"""
+    job = get_object_or_404(ExportJob, token=token)
+    context = {
+        'job': job,
+        'label': EXPORT_KINDS.get(job.kind, (job.kind,))[0],
+        'status_url': reverse('export_job_status', args=[job.token]),
+        'title': 'Export'
+    }
+    return render(request, 'exports/export_job.html', context)
+
+
+@login_required
+def export_job_status(request, token):
+    job = get_object_or_404(ExportJob, token=token)
+    return JsonResponse(_job_json(job))
+
+
+@login_required
+def export_job_download(request, token):
+    job = get_object_or_404(ExportJob, token=token)
+    if job.status != 'done' or not job.file:
+        return JsonResponse({'success': False, 'error': 'Export is not ready', 'status': job.status}, status=409)
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.filename,
+                        content_type=job.content_type or 'application/octet-stream')
@@ -0,0 +1,27 @@
+"""
+Process pool entry points for run_export_worker and batch invoice printing
+Kept free of model imports at module level so a spawned (non-forked) pool
+process can import it before Django is set up
+"""
+
+
+def init_worker():
+    import django
+    django.setup()
+    from django.db import connections
+    # A forked process must not reuse the parent's database connections
+    connections.close_all()
+
+
+def run_job(job_id):
+    from django.db import connections
+    from .export_jobs import process_job
+    try:
+        return process_job(job_id)
+    finally:
+        connections.close_all()
+
+
+def render_sales_pdf(content):
+    from .invoice_pdf import render_sales_invoice
+    return render_sales_invoice(content)
@@ -1,5 +1,8 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
+from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIterator
+from django.urls import reverse
 from .models import (
     Web_User, Pharmacy_Details, ProductMaster, SupplierMaster, CustomerMaster,
     InvoiceMaster, InvoicePaid, PurchaseMaster, SalesInvoiceMaster, SalesMaster,
@@ -24,6 +27,75 @@ class DateInput(forms.TextInput):
             default_attrs.update(attrs)
         super().__init__(attrs=default_attrs)
 
+class RemoteChoiceIterator(ModelChoiceIterator):
+    """Choices for RemoteSelect: only the submitted/initial value(s) are looked up"""
+    
+    def for_values(self, values):
+        choices = [('', self.field.empty_label)] if self.field.empty_label is not None else []
+        keys = [value for value in values if value not in ('', None)]
+        if keys:
+            key = self.field.to_field_name or 'pk'
+            try:
+                instances = list(self.queryset.filter(**{f'{key}__in': keys}))
+            except (ValueError, TypeError, ValidationError):
+                instances = []
+            choices.extend(self.choice(obj) for obj in instances)
+        return choices
+
+class RemoteSelect(forms.Select):
+    """
+    Select that renders just its current option; the rest are fetched on first
+    use from a picker API, or for products from the cached catalog snapshot
+    (see static/js/catalog-picker.js)
+    """
+    
+    def __init__(self, picker_url, catalog=False, attrs=None):
+        super().__init__(attrs)
+        self.picker_url = picker_url
+        self.catalog = catalog
+    
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        widget_attrs = context['widget']['attrs']
+        widget_attrs['data-picker-url'] = reverse(self.picker_url)
+        if self.catalog:
+            from .picker_views import product_catalog_url
+            widget_attrs['data-catalog-url'] = product_catalog_url()
+            widget_attrs['data-product-options'] = True
+        return context
+    
+    def optgroups(self, name, value, attrs=None):
+        choices = self.choices
+        if isinstance(choices, RemoteChoiceIterator):
+            self.choices = choices.for_values(value)
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = choices
+
+class RemoteModelChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField for large tables. Rendering never iterates the queryset and
+    validation looks up the single submitted pk (ModelChoiceField.to_python).
+    """
+    iterator = RemoteChoiceIterator
+    
+    def __init__(self, queryset, picker_url, catalog=False, attrs=None, **kwargs):
+        kwargs.setdefault('widget', RemoteSelect(picker_url, catalog=catalog, attrs=attrs or {'class': 'form-control'}))
+        super().__init__(queryset, **kwargs)
+
+class RemoteSelectMultiple(RemoteSelect, forms.SelectMultiple):
+    """RemoteSelect that keeps several selected options"""
+
+
+class RemoteModelMultipleChoiceField(forms.ModelMultipleChoiceField):
+    """ModelMultipleChoiceField counterpart of RemoteModelChoiceField"""
+    iterator = RemoteChoiceIterator
+    
+    def __init__(self, queryset, picker_url, catalog=False, attrs=None, **kwargs):
+        kwargs.setdefault('widget', RemoteSelectMultiple(picker_url, catalog=catalog, attrs=attrs or {'class': 'form-control'}))
+        super().__init__(queryset, **kwargs)
+
 class LoginForm(AuthenticationForm):
     username = forms.CharField(widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Username'}))
     password = forms.CharField(widget=forms.PasswordInput(attrs={'class': 'form-control', 'placeholder': 'Password'}))
@@ -167,8 +239,9 @@ class CustomerForm(forms.ModelForm):
 class InvoiceForm(forms.ModelForm):
     invoice_no = forms.CharField(widget=forms.TextInput(attrs={'class': 'form-control'}))
     invoice_date = forms.CharField(widget=DateInput())
-    supplierid = forms.ModelChoiceField(queryset=SupplierMaster.objects.all(), widget=forms.Select(attrs={'class': 'form-control'}))
+    supplierid = RemoteModelChoiceField(SupplierMaster.objects.all(), 'supplier_picker_api')
     transport_charges = forms.FloatField(widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}), initial=0)
+    transport_allocation = forms.ChoiceField(choices=InvoiceMaster.TRANSPORT_ALLOCATION_CHOICES, initial='equal', required=False, widget=forms.Select(attrs={'class': 'form-control'}))
     invoice_total = forms.FloatField(widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}))
     
     def clean_invoice_date(self):
@@ -194,9 +267,13 @@ class InvoiceForm(forms.ModelForm):
         
         raise forms.ValidationError("Enter date in DDMMYYYY format")
     
+    def clean_transport_allocation(self):
+        # Posts that predate the field keep the equal split
+        return self.cleaned_data['transport_allocation'] or 'equal'
+    
     class Meta:
         model = InvoiceMaster
-        fields = ['invoice_no', 'invoice_date', 'supplierid', 'transport_charges', 'invoice_total']
+        fields = ['invoice_no', 'invoice_date', 'supplierid', 'transport_charges', 'transport_allocation', 'invoice_total']
 
 class InvoicePaymentForm(forms.ModelForm):
     payment_date = forms.DateField(widget=DateInput(attrs={'class': 'form-control'}))
@@ -225,6 +302,7 @@ class InvoicePaymentForm(forms.ModelForm):
         exclude = ['ip_invoiceid']
 
 class PurchaseForm(forms.ModelForm):
+    productid = RemoteModelChoiceField(ProductMaster.objects.all(), 'product_picker_api', catalog=True)
     product_batch_no = forms.CharField(widget=forms.TextInput(attrs={'class': 'form-control'}))
     product_expiry = forms.CharField(
         max_length=7, 
@@ -289,13 +367,11 @@ class PurchaseForm(forms.ModelForm):
         
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['productid'].queryset = ProductMaster.objects.all()
-        self.fields['productid'].widget.attrs.update({'class': 'form-control'})
         self.fields['productid'].label = 'Product'
 
 class SalesInvoiceForm(forms.ModelForm):
     sales_invoice_date = forms.CharField(widget=DateInput())
-    customerid = forms.ModelChoiceField(queryset=CustomerMaster.objects.all(), widget=forms.Select(attrs={'class': 'form-control'}))
+    customerid = RemoteModelChoiceField(CustomerMaster.objects.all(), 'customer_picker_api')
     sales_transport_charges = forms.FloatField(widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}), initial=0)
     
     def clean_sales_invoice_date(self):
@@ -326,6 +402,7 @@ class SalesInvoiceForm(forms.ModelForm):
         fields = ['sales_invoice_date', 'customerid', 'sales_transport_charges']
 
 class SalesForm(forms.ModelForm):
+    productid = RemoteModelChoiceField(ProductMaster.objects.all(), 'product_picker_api', catalog=True)
     product_batch_no = forms.CharField(widget=forms.TextInput(attrs={
         'class': 'form-control',
         'id': 'batch_no_field'
@@ -366,8 +443,6 @@ class SalesForm(forms.ModelForm):
         
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['productid'].queryset = ProductMaster.objects.all()
-        self.fields['productid'].widget.attrs.update({'class': 'form-control'})
         self.fields['productid'].label = 'Product'
 
 class SalesPaymentForm(forms.ModelForm):
@@ -395,6 +470,7 @@ class SalesPaymentForm(forms.ModelForm):
         exclude = ['sales_ip_invoice_no']
 
 class ProductRateForm(forms.ModelForm):
+    rate_productid = RemoteModelChoiceField(ProductMaster.objects.all(), 'product_picker_api', catalog=True)
     rate_A = forms.FloatField(widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}))
     rate_B = forms.FloatField(widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}))
     rate_C = forms.FloatField(widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}))
@@ -406,14 +482,12 @@ class ProductRateForm(forms.ModelForm):
         
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['rate_productid'].queryset = ProductMaster.objects.all()
-        self.fields['rate_productid'].widget.attrs.update({'class': 'form-control'})
         self.fields['rate_productid'].label = 'Product'
 
 class PurchaseReturnInvoiceForm(forms.ModelForm):
     returninvoiceid = forms.CharField(required=False, widget=forms.HiddenInput())
     returninvoice_date = forms.CharField(widget=DateInput())
-    returnsupplierid = forms.ModelChoiceField(queryset=SupplierMaster.objects.all(), widget=forms.Select(attrs={'class': 'form-control'}))
+    returnsupplierid = RemoteModelChoiceField(SupplierMaster.objects.all(), 'supplier_picker_api')
     return_charges = forms.FloatField(widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}), initial=0.0)
     returninvoice_total = forms.FloatField(widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}), initial=0.0)
     
@@ -432,6 +506,7 @@ class PurchaseReturnInvoiceForm(forms.ModelForm):
         fields = ['returninvoiceid', 'returninvoice_date', 'returnsupplierid', 'return_charges', 'returninvoice_total']
 
 class PurchaseReturnForm(forms.ModelForm):
+    returnproductid = RemoteModelChoiceField(ProductMaster.objects.all(), 'product_picker_api', catalog=True)
     returnproduct_batch_no = forms.CharField(widget=forms.TextInput(attrs={'class': 'form-control'}))
     returnproduct_expiry = forms.CharField(
         max_length=10, 
@@ -482,8 +557,6 @@ class PurchaseReturnForm(forms.ModelForm):
         
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['returnproductid'].queryset = ProductMaster.objects.all()
-        self.fields['returnproductid'].widget.attrs.update({'class': 'form-control'})
         self.fields['returnproductid'].label = 'Product'
 
 class SalesReturnInvoiceForm(forms.ModelForm):
@@ -496,13 +569,13 @@ class SalesReturnInvoiceForm(forms.ModelForm):
         }),
         required=True
     )
-    return_sales_customerid = forms.ModelChoiceField(
-        queryset=CustomerMaster.objects.all().order_by('customer_name'),
-        widget=forms.Select(attrs={
+    return_sales_customerid = RemoteModelChoiceField(
+        CustomerMaster.objects.all(), 'customer_picker_api',
+        attrs={
             'class': 'form-control select2',
             'required': 'required',
             'placeholder': 'Select Customer'
-        }),
+        },
         required=True,
         empty_label="Select Customer"
     )
@@ -542,6 +615,7 @@ class SalesReturnInvoiceForm(forms.ModelForm):
         self.fields['return_sales_invoice_total'].label = 'Total Amount'
 
 class SalesReturnForm(forms.ModelForm):
+    return_productid = RemoteModelChoiceField(ProductMaster.objects.all(), 'product_picker_api', catalog=True)
     return_product_batch_no = forms.CharField(widget=forms.TextInput(attrs={'class': 'form-control'}))
     return_product_expiry = forms.CharField(
         max_length=7, 
@@ -601,8 +675,6 @@ class SalesReturnForm(forms.ModelForm):
         
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['return_productid'].queryset = ProductMaster.objects.all()
-        self.fields['return_productid'].widget.attrs.update({'class': 'form-control'})
         self.fields['return_productid'].label = 'Product'
 
 SalesReturnItemFormSet = forms.formset_factory(SalesReturnForm, extra=1)
@@ -633,9 +705,9 @@ class SalesReturnPaymentForm(forms.ModelForm):
 
         
 class SaleRateForm(forms.ModelForm):
-    productid = forms.ModelChoiceField(
-        queryset=ProductMaster.objects.all().order_by('product_name'),
-        widget=forms.Select(attrs={'class': 'form-control select2'})
+    productid = RemoteModelChoiceField(
+        ProductMaster.objects.all(), 'product_picker_api', catalog=True,
+        attrs={'class': 'form-control select2'}
     )
     product_batch_no = forms.CharField(widget=forms.TextInput(attrs={'class': 'form-control'}))
     rate_A = forms.FloatField(widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}))
@@ -646,6 +718,41 @@ class SaleRateForm(forms.ModelForm):
         model = SaleRateMaster
         fields = ['productid', 'product_batch_no', 'rate_A', 'rate_B', 'rate_C']
 
+class SaleRateRevisionForm(forms.Form):
+    """Which batch rates to revise and how; see rate_revision.py"""
+    MODE_CHOICES = [
+        ('percent', 'Change by percent'),
+        ('amount', 'Change by amount'),
+        ('set', 'Set to amount'),
+    ]
+    RATE_CHOICES = [
+        ('rate_A', 'Rate A'),
+        ('rate_B', 'Rate B'),
+        ('rate_C', 'Rate C'),
+    ]
+    
+    product_company = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Any company'}))
+    product_category = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Any category'}))
+    products = RemoteModelMultipleChoiceField(
+        ProductMaster.objects.all(), 'product_picker_api', catalog=True, required=False,
+        attrs={'class': 'form-control', 'size': 8}
+    )
+    rates = forms.MultipleChoiceField(choices=RATE_CHOICES, initial=['rate_A', 'rate_B', 'rate_C'], widget=forms.CheckboxSelectMultiple)
+    mode = forms.ChoiceField(choices=MODE_CHOICES, widget=forms.Select(attrs={'class': 'form-control'}))
+    value = forms.FloatField(widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}))
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if not (cleaned_data.get('product_company') or cleaned_data.get('product_category') or cleaned_data.get('products')):
+            raise forms.ValidationError("Choose a company, a category or products to revise")
+        value = cleaned_data.get('value')
+        if value is not None:
+            if cleaned_data.get('mode') == 'percent' and value <= -100:
+                raise forms.ValidationError("A percent change must be above -100%")
+            if cleaned_data.get('mode') == 'set' and value < 0:
+                raise forms.ValidationError("Rates cannot be negative")
+        return cleaned_data
+
 class PaymentForm(forms.ModelForm):
     payment_date = forms.DateField(widget=DateInput(attrs={'class': 'form-control'}))
     payment_amount = forms.DecimalField(widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}))
@@ -0,0 +1,231 @@
+"""
+Background import jobs
+A large upload is stored with an ImportJob row and imported by
+`manage.py run_import_worker` instead of inside the request. Rows are
+imported in chunks; each chunk commits in the same transaction as the job's
+checkpoint (last file row done) and running counts, so a job whose worker
+died is resumed after its last committed chunk without importing any row twice
+"""
+
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django.views.decorators.http import require_POST
+
+from .models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+# kind -> (label, job handler, file rows committed per chunk; None imports the whole file in one transaction)
+# A handler takes the job and returns (open_rows, process): open_rows() iterates the
+# stored file as (row number, {column: text}) and process(rows, result) imports one
+# chunk of non-empty rows, adding to result['created'], result['error_count'] and result['errors']
+IMPORT_KINDS = {
+    'products': ('Products', 'core.bulk_upload_views.product_import_job', 2000),
+    'purchase_invoice': ('Purchase invoice lines', 'core.purchase_import.purchase_invoice_import_job', None),
+    'customers': ('Customers', 'core.party_import.customer_import_job', 2000),
+    'suppliers': ('Suppliers', 'core.party_import.supplier_import_job', 2000),
+}
+
+# Uploads larger than this are always imported in the background
+BACKGROUND_IMPORT_BYTES = 2 * 1024 * 1024
+# Running jobs not checkpointed for this long are assumed lost with their worker
+STALE_AFTER = timedelta(minutes=10)
+# Finished jobs and their files are removed after this long
+KEEP_FOR = timedelta(days=7)
+# Row errors returned by the status endpoint
+STATUS_ERRORS = 100
+
+
+def enqueue_import(kind, file, params=None, user=None):
+    """Store the uploaded `file` and queue it for the import worker; returns the job"""
+    if kind not in IMPORT_KINDS:
+        raise ValueError(f"Unknown import kind: {kind}")
+    job = ImportJob(
+        kind=kind,
+        params=params or {},
+        filename=file.name,
+        token=uuid.uuid4().hex,
+        requested_by=user if user is not None and user.is_authenticated else None,
+        message='Waiting for an import worker',
+    )
+    job.file.save(file.name, file, save=False)
+    job.save()
+    return job
+
+
+def claim_next_job():
+    """Mark the oldest queued job running and return its id (None when the queue is empty)"""
+    for job_id in ImportJob.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True)[:10]:
+        # The conditional update lets several workers share the queue
+        if ImportJob.objects.filter(pk=job_id, status='queued').update(
+            status='running', started_at=timezone.now(), updated_at=timezone.now(), message='Importing'
+        ):
+            return job_id
+    return None
+
+
+def requeue_stale_jobs():
+    """Queue jobs whose worker died mid-import again; they resume from their checkpoint"""
+    return ImportJob.objects.filter(
+        status='running', updated_at__lt=timezone.now() - STALE_AFTER
+    ).update(status='queued', message='Resuming after a worker stopped', updated_at=timezone.now())
+
+
+def release_job(job_id):
+    """Put a job back in the queue when its worker stops on purpose"""
+    ImportJob.objects.filter(pk=job_id, status='running').update(
+        status='queued', message='Waiting for an import worker to resume', updated_at=timezone.now()
+    )
+
+
+def resume_job(job):
+    """Queue a failed job again to continue after its last committed chunk; False if it hasn't failed"""
+    return bool(ImportJob.objects.filter(pk=job.pk, status='failed').update(
+        status='queued', error='', finished_at=None, message='Waiting for an import worker to resume',
+        updated_at=timezone.now()
+    ))
+
+
+def purge_expired_jobs():
+    """Delete finished jobs (and their files) older than KEEP_FOR"""
+    expired = ImportJob.objects.filter(
+        status__in=('done', 'failed'), finished_at__lt=timezone.now() - KEEP_FOR
+    )
+    count = 0
+    for job in expired.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        count += 1
+    return count
+
+
+def mark_failed(job_id, error):
+    ImportJob.objects.filter(pk=job_id).update(
+        status='failed', error=str(error)[:5000], finished_at=timezone.now(),
+        message='Import stopped; it can be resumed from the last saved row'
+    )
+
+
+def _commit_chunk(job, process, chunk, result):
+    """Import one chunk and move the checkpoint past it in the same transaction"""
+    with transaction.atomic():
+        process(chunk, result)
+        result['rows'] += len(chunk)
+        progress = min(99, result['rows'] * 100 // job.total_rows) if job.total_rows else 0
+        ImportJob.objects.filter(pk=job.pk).update(
+            checkpoint_row=chunk[-1][0],
+            result=result,
+            progress=progress,
+            message=f"{result['rows']} of {job.total_rows} rows processed",
+            updated_at=timezone.now(),
+        )
+
+
+def process_job(job_id):
+    """Import one claimed job, continuing after its checkpoint"""
+    job = ImportJob.objects.get(pk=job_id)
+    label, handler_path, chunk_size = IMPORT_KINDS[job.kind]
+    try:
+        open_rows, process = import_string(handler_path)(job)
+        if not job.total_rows:
+            job.total_rows = sum(1 for _, row in open_rows() if any(row.values()))
+            ImportJob.objects.filter(pk=job.pk).update(total_rows=job.total_rows, updated_at=timezone.now())
+
+        result = {'created': 0, 'error_count': 0, 'errors': [], 'rows': 0}
+        result.update(job.result)
+        chunk = []
+        for row_number, row in open_rows():
+            if row_number <= job.checkpoint_row or not any(row.values()):
+                continue
+            chunk.append((row_number, row))
+            if chunk_size and len(chunk) >= chunk_size:
+                _commit_chunk(job, process, chunk, result)
+                chunk = []
+        if chunk:
+            _commit_chunk(job, process, chunk, result)
+
+        ImportJob.objects.filter(pk=job.pk).update(
+            status='done',
+            progress=100,
+            message=f"{result['created']} imported, {result['error_count']} rows with errors",
+            finished_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+    except Exception:
+        logger.exception("Import job %s (%s) failed", job_id, label)
+        mark_failed(job_id, traceback.format_exc())
+    return job_id
+
+
+def _job_json(job):
+    result = job.result or {}
+    data = {
+        'success': job.status != 'failed',
+        'job_id': job.token,
+        'kind': job.kind,
+        'label': IMPORT_KINDS.get(job.kind, (job.kind,))[0],
+        'filename': job.filename,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'total_rows': job.total_rows,
+        'processed_rows': result.get('rows', 0),
+        'created': result.get('created', 0),
+        'updated': result.get('updated', 0),
+        'error_count': result.get('error_count', 0),
+        'errors': result.get('errors', [])[:STATUS_ERRORS],
+        'status_url': reverse('import_job_status', args=[job.token]),
+    }
+    if result.get('invoice_id'):
+        data['invoice_url'] = reverse('invoice_detail', args=[result['invoice_id']])
+    if job.status == 'failed':
+        data['error'] = 'Import stopped; see the import worker log'
+        data['resume_url'] = reverse('import_job_resume', args=[job.token])
+    return data
+
+
+def import_job_response(request, job):
+    """Response for a view that just queued `job`: the job as JSON, or its progress page"""
+    if request.GET.get('format') == 'json':
+        return JsonResponse(_job_json(job), status=202)
+    return redirect('import_job_detail', token=job.token)
+
+
+@login_required
+def import_job_detail(request, token):
+    """Progress page; polls the status endpoint and shows the row report when done"""
+    job = get_object_or_404(ImportJob, token=token)
+    context = {
+        'job': job,
+        'label': IMPORT_KINDS.get(job.kind, (job.kind,))[0],
+        'status_url': reverse('import_job_status', args=[job.token]),
+        'title': 'Import'
+    }
+    return render(request, 'imports/import_job.html', context)
+
+
+@login_required
+def import_job_status(request, token):
+    job = get_object_or_404(ImportJob, token=token)
+    return JsonResponse(_job_json(job))
+
+
+@login_required
+@require_POST
+def import_job_resume(request, token):
+    job = get_object_or_404(ImportJob, token=token)
+    if not resume_job(job):
+        return JsonResponse({'success': False, 'error': 'Only a stopped import can be resumed', 'status': job.status}, status=409)
+    job.refresh_from_db()
+    return JsonResponse(_job_json(job))
@@ -0,0 +1,466 @@
+"""
+Invoice PDFs
+Sales and purchase invoices are drawn with ReportLab from plain rows read in a
+few queries. Fonts and paragraph/table styles are set up once per process.
+The finished PDF is stored under a hash of everything printed on it, so
+reprints and resends of an unchanged invoice are served from storage and a
+new PDF is only drawn when its lines, payments or header change.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from xml.sax.saxutils import escape
+
+from django.contrib.auth.decorators import login_required
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.text import get_valid_filename
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .models import (
+    Pharmacy_Details, SalesInvoiceMaster, SalesMaster, SalesInvoicePaid,
+    InvoiceMaster, PurchaseMaster, InvoicePaid
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout changes so cached PDFs are drawn again
+TEMPLATE_VERSION = 1
+CACHE_DIR = 'invoice_pdfs'
+
+# TrueType fonts with the rupee sign; Helvetica (and "Rs.") when none is installed
+FONT_CANDIDATES = [
+    ('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'),
+    ('/usr/share/fonts/dejavu/DejaVuSans.ttf', '/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf'),
+    ('C:/Windows/Fonts/arial.ttf', 'C:/Windows/Fonts/arialbd.ttf'),
+]
+
+TERMS = [
+    'Goods once sold will not be taken back or exchanged.',
+    'All disputes are subject to local jurisdiction only.',
+    'Payment terms: As per agreed terms.',
+]
+
+_resources_lock = threading.Lock()
+_resources = None
+
+
+class _Resources:
+    """Fonts and styles shared by every invoice drawn in this process"""
+
+    def __init__(self):
+        self.font, self.bold, self.currency = 'Helvetica', 'Helvetica-Bold', 'Rs. '
+        for regular, bold in FONT_CANDIDATES:
+            if os.path.exists(regular) and os.path.exists(bold):
+                try:
+                    pdfmetrics.registerFont(TTFont('InvoiceSans', regular))
+                    pdfmetrics.registerFont(TTFont('InvoiceSans-Bold', bold))
+                except Exception as e:
+                    logger.warning("Could not register invoice font %s: %s", regular, e)
+                    continue
+                self.font, self.bold, self.currency = 'InvoiceSans', 'InvoiceSans-Bold', '\u20b9'
+                break
+
+        self.title = ParagraphStyle('InvoiceTitle', fontName=self.bold, fontSize=16, leading=20, alignment=TA_CENTER)
+        self.subtitle = ParagraphStyle('InvoiceSubtitle', fontName=self.font, fontSize=9, leading=12, alignment=TA_CENTER)
+        self.heading = ParagraphStyle('InvoiceHeading', fontName=self.bold, fontSize=12, leading=16,
+                                      alignment=TA_CENTER, spaceBefore=4, spaceAfter=4)
+        self.section = ParagraphStyle('InvoiceSection', fontName=self.bold, fontSize=10, leading=14, spaceBefore=6)
+        self.normal = ParagraphStyle('InvoiceNormal', fontName=self.font, fontSize=8.5, leading=11)
+        self.cell = ParagraphStyle('InvoiceCell', fontName=self.font, fontSize=7.5, leading=9)
+        self.small = ParagraphStyle('InvoiceSmall', fontName=self.font, fontSize=7, leading=9, textColor=colors.grey)
+        self.signature = ParagraphStyle('InvoiceSignature', fontName=self.bold, fontSize=8.5, leading=11, alignment=TA_RIGHT)
+
+        self.items_style = TableStyle([
+            ('FONT', (0, 0), (-1, 0), self.bold, 7.5),
+            ('FONT', (0, 1), (-1, -1), self.font, 7.5),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#366092')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('ALIGN', (4, 1), (-1, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 0.4, colors.grey),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F2F2F2')]),
+        ])
+        self.totals_style = TableStyle([
+            ('FONT', (0, 0), (-1, -1), self.font, 8.5),
+            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+            ('LINEABOVE', (0, 0), (-1, 0), 0.4, colors.grey),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+            ('TOPPADDING', (0, 0), (-1, -1), 2),
+        ])
+        self.info_style = TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('BOX', (0, 0), (-1, -1), 0.4, colors.grey),
+            ('LEFTPADDING', (0, 0), (-1, -1), 6),
+        ])
+
+    def money(self, value):
+        return f"{self.currency}{value or 0:,.2f}"
+
+
+def _get_resources():
+    global _resources
+    if _resources is None:
+        with _resources_lock:
+            if _resources is None:
+                _resources = _Resources()
+    return _resources
+
+
+def sale_line_amounts(rate, quantity, discount, calculation_mode, igst):
+    """(amount after discount, tax) for one sales line, as printed on the bill"""
+    base_price = (rate or 0) * (quantity or 0)
+    if calculation_mode == 'flat':
+        after_discount = base_price - (discount or 0)
+    else:
+        after_discount = base_price - (base_price * (discount or 0) / 100)
+    return after_discount, after_discount * ((igst or 0) / 100)
+
+
+def _pharmacy_rows():
+    return list(Pharmacy_Details.objects.order_by('id').values_list(
+        'pharmaname', 'pharmaweburl', 'proprietorname', 'proprietorcontact', 'proprietoremail'
+    )[:1])
+
+
+def sales_invoices_content(invoice_nos):
+    """
+    {invoice no: everything printed on it, as plain data} for many sales
+    invoices, read with one query each for headers, lines and payments
+    """
+    invoice_nos = list(invoice_nos)
+    pharmacy = _pharmacy_rows()
+    contents = {}
+    for header in SalesInvoiceMaster.objects.filter(sales_invoice_no__in=invoice_nos).values_list(
+        'sales_invoice_no', 'sales_invoice_date', 'sales_transport_charges', 'sales_invoice_paid',
+        'customerid__customer_name', 'customerid__customer_address', 'customerid__customer_mobile',
+        'customerid__customer_gstno', 'customerid__customer_dlno'
+    ):
+        contents[header[0]] = {
+            'template': TEMPLATE_VERSION,
+            'pharmacy': pharmacy,
+            'invoice': header,
+            'lines': [],
+            'payments': [],
+        }
+
+    for row in SalesMaster.objects.filter(sales_invoice_no__in=contents).order_by('id').values_list(
+        'sales_invoice_no', 'product_name', 'product_company', 'product_packing', 'product_batch_no',
+        'product_expiry', 'product_MRP', 'sale_rate', 'sale_quantity', 'sale_discount',
+        'sale_calculation_mode', 'sale_igst', 'sale_total_amount'
+    ):
+        contents[row[0]]['lines'].append(row[1:])
+
+    for row in SalesInvoicePaid.objects.filter(sales_ip_invoice_no__in=contents).order_by(
+        'sales_payment_date', 'sales_payment_id'
+    ).values_list(
+        'sales_ip_invoice_no', 'sales_payment_date', 'sales_payment_amount', 'sales_payment_mode',
+        'sales_payment_ref_no'
+    ):
+        contents[row[0]]['payments'].append(row[1:])
+    return contents
+
+
+def sales_invoice_content(invoice_no):
+    """Everything printed on a sales invoice, as plain data (raises Http404)"""
+    content = sales_invoices_content([invoice_no]).get(invoice_no)
+    if content is None:
+        raise Http404("Sales invoice not found")
+    return content
+
+
+def purchase_invoice_content(invoice_id):
+    """Everything printed on a purchase invoice, as plain data (raises Http404)"""
+    header = InvoiceMaster.objects.filter(invoiceid=invoice_id).values_list(
+        'invoice_no', 'invoice_date', 'transport_charges', 'invoice_total', 'invoice_paid',
+        'supplierid__supplier_name', 'supplierid__supplier_address', 'supplierid__supplier_mobile',
+        'supplierid__supplier_gstno', 'supplierid__supplier_dlno'
+    ).first()
+    if header is None:
+        raise Http404("Purchase invoice not found")
+
+    return {
+        'template': TEMPLATE_VERSION,
+        'pharmacy': _pharmacy_rows(),
+        'invoice': header,
+        'lines': list(PurchaseMaster.objects.filter(product_invoiceid=invoice_id).order_by('purchaseid').values_list(
+            'product_name', 'product_company', 'product_packing', 'product_batch_no', 'product_expiry',
+            'product_MRP', 'product_purchase_rate', 'product_quantity', 'product_scheme',
+            'product_discount_got', 'IGST', 'total_amount'
+        )),
+        'payments': list(InvoicePaid.objects.filter(ip_invoiceid=invoice_id).order_by(
+            'payment_date', 'payment_id'
+        ).values_list('payment_date', 'payment_amount', 'payment_mode', 'payment_ref_no')),
+    }
+
+
+def content_hash(content):
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _header_flowables(res, pharmacy, title):
+    story = []
+    if pharmacy:
+        name, weburl, proprietor, contact, email = pharmacy[0]
+        story.append(Paragraph(escape(name), res.title))
+        if weburl:
+            story.append(Paragraph(escape(weburl), res.subtitle))
+        story.append(Paragraph(escape(f"Proprietor: {proprietor} | Contact: {contact} | Email: {email}"), res.subtitle))
+    else:
+        story.append(Paragraph('PHARMACY MANAGEMENT SYSTEM', res.title))
+    story.append(Spacer(1, 3 * mm))
+    story.append(Paragraph(title, res.heading))
+    return story
+
+
+def _info_table(res, left, right, width):
+    def block(lines):
+        return Paragraph('<br/>'.join(f"<b>{label}:</b> {escape(str(value)) if value not in (None, '') else 'NA'}"
+                                      for label, value in lines), res.normal)
+    table = Table([[block(left), block(right)]], colWidths=[width * 0.6, width * 0.4])
+    table.setStyle(res.info_style)
+    return table
+
+
+def _totals_table(res, rows, width):
+    table = Table([[label, res.money(value)] for label, value in rows],
+                  colWidths=[width - 35 * mm, 35 * mm], hAlign='RIGHT')
+    table.setStyle(res.totals_style)
+    # The invoice total row in bold
+    table.setStyle(TableStyle([('FONT', (0, -3), (-1, -3), res.bold, 9)]))
+    return table
+
+
+def _payments_flowables(res, payments, width):
+    if not payments:
+        return []
+    rows = [['Date', 'Mode', 'Reference', 'Amount']]
+    rows += [[str(date), mode or '', ref or '', res.money(amount)] for date, amount, mode, ref in payments]
+    table = Table(rows, colWidths=[width * 0.2, width * 0.25, width * 0.35, width * 0.2], repeatRows=1)
+    table.setStyle(res.items_style)
+    table.setStyle(TableStyle([('ALIGN', (0, 1), (2, -1), 'LEFT')]))
+    return [Paragraph('Payments', res.section), table]
+
+
+def _description(res, name, company, packing):
+    return Paragraph(f"{escape(name or '')}<br/><font size=6.5 color='grey'>{escape(f'{company} - {packing}')}</font>",
+                     res.cell)
+
+
+def _footer_flowables(res, pharmacy):
+    terms = '<br/>'.join(f"{number}. {term}" for number, term in enumerate(TERMS, 1))
+    name = pharmacy[0][0] if pharmacy else ''
+    return [
+        Spacer(1, 6 * mm),
+        Paragraph(f"<b>Terms &amp; Conditions:</b><br/>{terms}", res.small),
+        Spacer(1, 10 * mm),
+        Paragraph(f"For {escape(name)}<br/><br/>Authorized Signatory", res.signature),
+    ]
+
+
+def _build(story):
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=12 * mm, rightMargin=12 * mm,
+                            topMargin=12 * mm, bottomMargin=12 * mm)
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def sales_invoice_story(content):
+    """Flowables of one sales invoice; batch printing joins several into one document"""
+    res = _get_resources()
+    width = A4[0] - 24 * mm
+    (invoice_no, invoice_date, transport, paid,
+     customer, address, mobile, gstno, dlno) = content['invoice']
+
+    story = _header_flowables(res, content['pharmacy'], 'SALES INVOICE')
+    story.append(_info_table(res, [
+        ('Invoice No', invoice_no), ('Date', invoice_date), ('Customer', customer),
+        ('Address', address), ('Contact', mobile),
+    ], [('GSTIN', gstno), ('DL No', dlno)], width))
+    story.append(Spacer(1, 4 * mm))
+
+    rows = [['S.No', 'Description', 'Batch', 'Expiry', 'MRP', 'Rate', 'Qty', 'Discount', 'GST%', 'Amount']]
+    subtotal = total_tax = total = 0
+    for number, (name, company, packing, batch, expiry, mrp, rate, quantity, discount, mode, igst,
+                 amount) in enumerate(content['lines'], 1):
+        after_discount, tax = sale_line_amounts(rate, quantity, discount, mode, igst)
+        subtotal += after_discount
+        total_tax += tax
+        total += amount or 0
+        rows.append([
+            number,
+            _description(res, name, company, packing),
+            batch, expiry, f"{mrp or 0:.2f}", f"{rate or 0:.2f}", f"{quantity or 0:g}",
+            f"{res.currency}{discount or 0:.2f}" if mode == 'flat' else f"{discount or 0:g}%",
+            f"{igst or 0:g}%", f"{amount or 0:,.2f}",
+        ])
+    items = Table(rows, repeatRows=1, colWidths=[
+        width * w for w in (0.05, 0.29, 0.1, 0.08, 0.08, 0.08, 0.06, 0.08, 0.06, 0.12)
+    ])
+    items.setStyle(res.items_style)
+    story.append(items)
+    story.append(Spacer(1, 3 * mm))
+
+    story.append(_totals_table(res, [
+        ('Sub Total:', subtotal),
+        ('Tax Amount:', total_tax),
+        ('Grand Total:', total),
+        ('Amount Paid:', paid),
+        ('Balance Due:', total - (paid or 0)),
+    ], width))
+    story += _payments_flowables(res, content['payments'], width)
+    story += _footer_flowables(res, content['pharmacy'])
+    return story
+
+
+def render_sales_invoice(content):
+    return _build(sales_invoice_story(content))
+
+
+def render_sales_invoices(contents):
+    """Several sales invoices drawn as one document, each starting on a new page"""
+    story = []
+    for content in contents:
+        if story:
+            story.append(PageBreak())
+        story += sales_invoice_story(content)
+    return _build(story)
+
+
+def render_purchase_invoice(content):
+    res = _get_resources()
+    width = A4[0] - 24 * mm
+    (invoice_no, invoice_date, transport, invoice_total, paid,
+     supplier, address, mobile, gstno, dlno) = content['invoice']
+
+    story = _header_flowables(res, content['pharmacy'], 'PURCHASE INVOICE')
+    story.append(_info_table(res, [
+        ('Invoice No', invoice_no), ('Date', invoice_date), ('Supplier', supplier),
+        ('Address', address), ('Contact', mobile),
+    ], [('GSTIN', gstno), ('DL No', dlno)], width))
+    story.append(Spacer(1, 4 * mm))
+
+    rows = [['S.No', 'Description', 'Batch', 'Expiry', 'MRP', 'Rate', 'Qty', 'Scheme', 'Discount', 'GST%', 'Amount']]
+    items_total = 0
+    for number, (name, company, packing, batch, expiry, mrp, rate, quantity, scheme, discount, igst,
+                 amount) in enumerate(content['lines'], 1):
+        items_total += amount or 0
+        rows.append([
+            number,
+            _description(res, name, company, packing),
+            batch, expiry, f"{mrp or 0:.2f}", f"{rate or 0:.2f}", f"{quantity or 0:g}",
+            f"{scheme or 0:g}", f"{discount or 0:.2f}", f"{igst or 0:g}%", f"{amount or 0:,.2f}",
+        ])
+    items = Table(rows, repeatRows=1, colWidths=[
+        width * w for w in (0.05, 0.26, 0.1, 0.08, 0.08, 0.08, 0.06, 0.06, 0.07, 0.06, 0.1)
+    ])
+    items.setStyle(res.items_style)
+    story.append(items)
+    story.append(Spacer(1, 3 * mm))
+
+    story.append(_totals_table(res, [
+        ('Items Total:', items_total),
+        ('Transport Charges:', transport),
+        ('Invoice Total:', invoice_total),
+        ('Amount Paid:', paid),
+        ('Balance Due:', (invoice_total or 0) - (paid or 0)),
+    ], width))
+    story += _payments_flowables(res, content['payments'], width)
+    story += _footer_flowables(res, content['pharmacy'])
+    return _build(story)
+
+
+def _cache_folder(kind, key):
+    return f"{CACHE_DIR}/{kind}/{get_valid_filename(str(key)) or 'invoice'}"
+
+
+def read_cached_pdf(kind, key, digest):
+    """Stored PDF bytes for this content hash, or None"""
+    name = f"{_cache_folder(kind, key)}/{digest}.pdf"
+    try:
+        if default_storage.exists(name):
+            with default_storage.open(name, 'rb') as cached:
+                return cached.read()
+    except Exception as e:
+        logger.warning("Error reading cached invoice PDF %s: %s", name, e)
+    return None
+
+
+def store_cached_pdf(kind, key, digest, pdf):
+    """Store a freshly drawn PDF and remove older ones of the same invoice"""
+    folder = _cache_folder(kind, key)
+    name = f"{folder}/{digest}.pdf"
+    try:
+        _, files = default_storage.listdir(folder) if default_storage.exists(folder) else ([], [])
+        for stale in files:
+            if stale != f"{digest}.pdf":
+                default_storage.delete(f"{folder}/{stale}")
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(pdf))
+    except Exception as e:
+        logger.warning("Error caching invoice PDF %s: %s", name, e)
+
+
+def _cached_pdf(kind, key, content, render):
+    """
+    PDF bytes for `content`, drawn only when no PDF with the same content hash
+    is stored. Returns (pdf bytes, content hash).
+    """
+    digest = content_hash(content)
+    pdf = read_cached_pdf(kind, key, digest)
+    if pdf is None:
+        pdf = render(content)
+        store_cached_pdf(kind, key, digest, pdf)
+    return pdf, digest
+
+
+def sales_invoice_pdf_bytes(invoice_no):
+    """(PDF bytes, content hash) for a sales invoice"""
+    return _cached_pdf('sales', invoice_no, sales_invoice_content(invoice_no), render_sales_invoice)
+
+
+def purchase_invoice_pdf_bytes(invoice_id):
+    """(PDF bytes, content hash) for a purchase invoice"""
+    return _cached_pdf('purchases', invoice_id, purchase_invoice_content(invoice_id), render_purchase_invoice)
+
+
+def _pdf_response(request, pdf, digest, filename):
+    etag = f'"{digest}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(pdf, content_type='application/pdf')
+        disposition = 'attachment' if request.GET.get('download') == '1' else 'inline'
+        response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+def sales_invoice_pdf(request, pk):
+    """Sales invoice as PDF; ?download=1 to save instead of opening it"""
+    pdf, digest = sales_invoice_pdf_bytes(pk)
+    return _pdf_response(request, pdf, digest, get_valid_filename(f"sales_invoice_{pk}.pdf"))
+
+
+@login_required
+def purchase_invoice_pdf(request, pk):
+    """Purchase invoice as PDF; ?download=1 to save instead of opening it"""
+    pdf, digest = purchase_invoice_pdf_bytes(pk)
+    return _pdf_response(request, pdf, digest, f"purchase_invoice_{pk}.pdf")
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.batch_print import DEFAULT_WORKERS, PDF_MERGE_SUPPORT, batch_invoice_numbers, write_sales_batch
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Invalid date "{value}"; use YYYY-MM-DD')
+
+
+class Command(BaseCommand):
+    help = ('Print sales invoices into one PDF, e.g. the day end run: '
+            'python manage.py batch_print_sales --start-date 2024-05-01 --output day.pdf')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', help='First invoice date, YYYY-MM-DD')
+        parser.add_argument('--end-date', help='Last invoice date, YYYY-MM-DD (default: the start date)')
+        parser.add_argument(
+            '--invoice',
+            action='append',
+            default=[],
+            help='Sales invoice number to print; repeat for several',
+        )
+        parser.add_argument('--output', required=True, help='PDF file to write')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_WORKERS,
+            help=f'Invoices drawn in parallel (default: {DEFAULT_WORKERS})',
+        )
+
+    def handle(self, *args, **options):
+        start_date = _date(options['start_date']) if options['start_date'] else None
+        end_date = _date(options['end_date']) if options['end_date'] else start_date
+        if not (start_date or options['invoice']):
+            start_date = end_date = timezone.localdate()
+        if options['workers'] <= 0:
+            raise CommandError('--workers must be positive')
+
+        numbers = batch_invoice_numbers(start_date, end_date, options['invoice'])
+        if not numbers:
+            raise CommandError('No sales invoices found to print')
+        if not PDF_MERGE_SUPPORT:
+            self.stdout.write('pypdf is not installed; drawing the batch in a single process')
+
+        with open(options['output'], 'wb') as target:
+            printed = write_sales_batch(numbers, target, workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(f'Printed {printed} invoice(s) to {options["output"]}'))
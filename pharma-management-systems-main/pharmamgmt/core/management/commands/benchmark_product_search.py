@@ -0,0 +1,215 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Q
+from django.test import RequestFactory
+
+from core.autocomplete_index import product_autocomplete_index
+from core.barcode_cache import barcode_cache
+from core.models import ProductMaster, PurchaseMaster, SupplierMaster, InvoiceMaster, Web_User
+from core.product_search import search_filter, rank_by_relevance
+from core import views
+
+DEFAULT_QUERIES = ['pa', 'para', 'parace', 'amox', 'azi', 'cet', 'pan', 'dolo', 'vit', 'ci']
+
+
+class Command(BaseCommand):
+    help = ('Measure product search latency (p50/p99): the in-memory autocomplete index against '
+            'search_products_api and the original LIKE query, product_list search pages ranked in '
+            'SQL against the original in-Python ranking, and barcode scans with and without the '
+            'barcode cache')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Lookups per benchmark (default: 200)',
+        )
+        parser.add_argument(
+            '--queries',
+            nargs='+',
+            default=DEFAULT_QUERIES,
+            help='Search strings to cycle through',
+        )
+        parser.add_argument(
+            '--synthetic',
+            type=int,
+            default=0,
+            help='Temporarily add this many generated products, with purchases for some of them '
+                 '(rolled back afterwards)',
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] <= 0:
+            raise CommandError('--iterations must be positive')
+
+        with transaction.atomic():
+            if options['synthetic']:
+                self.add_synthetic_products(options['synthetic'])
+            try:
+                self.run_benchmarks(options['queries'], options['iterations'])
+            finally:
+                transaction.set_rollback(True)
+                # Drop any snapshot that saw the rolled back products
+                product_autocomplete_index._snapshot = None
+                barcode_cache.clear()
+
+    def add_synthetic_products(self, count):
+        names = list(ProductMaster.objects.values_list('product_name', 'product_company', 'product_salt')[:2000])
+        if not names:
+            names = [('PARACETAMOL 500MG', 'GENERIC', 'PARACETAMOL')]
+        products = []
+        for i in range(count):
+            name, company, salt = random.choice(names)
+            products.append(ProductMaster(
+                product_name=f'{name} {i}',
+                product_company=company,
+                product_packing='PCS',
+                product_salt=salt or '',
+                product_category='SYNTHETIC',
+                product_hsn='3004',
+                product_hsn_percent='12',
+                product_barcode=f'89{i:011d}',
+            ))
+        products = ProductMaster.objects.bulk_create(products, batch_size=1000)
+
+        # A few batches each for some products so barcode scans have FEFO work to do
+        supplier = SupplierMaster.objects.first() or SupplierMaster.objects.create(
+            supplier_name='SYNTHETIC', supplier_type='SYNTHETIC', supplier_address='-',
+            supplier_mobile='-', supplier_whatsapp='-', supplier_emailid='-', supplier_spoc='-'
+        )
+        invoice = InvoiceMaster.objects.create(
+            invoice_no='SYNTHETIC-BENCH', supplierid=supplier, transport_charges=0, invoice_total=0
+        )
+        purchases = []
+        for product in products[:min(count, 2000)]:
+            for batch in range(3):
+                purchases.append(PurchaseMaster(
+                    product_supplierid=supplier, product_invoiceid=invoice, product_invoice_no=invoice.invoice_no,
+                    productid=product, product_name=product.product_name, product_company=product.product_company,
+                    product_packing=product.product_packing, product_batch_no=f'SYN{batch}',
+                    product_expiry=f'{batch + 1:02d}-2030', product_MRP=100.0, product_purchase_rate=70.0,
+                    product_quantity=100, product_discount_got=0, product_transportation_charges=0
+                ))
+        PurchaseMaster.objects.bulk_create(purchases, batch_size=1000)
+        self.stdout.write(f'Added {count} synthetic products and {len(purchases)} purchase rows (will be rolled back)')
+
+    def run_benchmarks(self, queries, iterations):
+        total = ProductMaster.objects.count()
+        self.stdout.write(f'Catalog: {total} products, {iterations} lookups per benchmark')
+
+        started = time.perf_counter()
+        product_autocomplete_index.load()
+        self.stdout.write(f'Autocomplete index load: {(time.perf_counter() - started) * 1000:.1f} ms')
+
+        factory = RequestFactory()
+        user = Web_User(username='benchmark', is_staff=True, is_superuser=True)
+
+        def call_view(view, query):
+            request = factory.get('/', {'q': query})
+            request.user = user
+            return view(request)
+
+        def like_query(query):
+            return list(ProductMaster.objects.filter(
+                Q(product_name__icontains=query) |
+                Q(product_company__icontains=query)
+            ).order_by('product_name')[:10])
+
+        benchmarks = [
+            ('autocomplete index (in-process)', lambda q: product_autocomplete_index.lookup(q)),
+            ('product_autocomplete_api', lambda q: call_view(views.product_autocomplete_api, q)),
+            ('search_products_api', lambda q: call_view(views.search_products_api, q)),
+            ('LIKE query (original)', like_query),
+        ]
+        self.report(benchmarks, queries, iterations)
+        self.benchmark_product_list_search(queries, iterations)
+
+        barcodes = list(
+            ProductMaster.objects.exclude(product_barcode__isnull=True).exclude(product_barcode='').filter(
+                productid__in=PurchaseMaster.objects.values('productid')
+            ).values_list('product_barcode', flat=True)[:200]
+        )
+        if not barcodes:
+            self.stdout.write(self.style.WARNING('No purchased products with barcodes; skipping barcode scan benchmark'))
+            return
+
+        def scan(barcode):
+            request = factory.get('/', {'barcode': barcode})
+            request.user = user
+            return views.get_product_by_barcode(request)
+
+        def scan_uncached(barcode):
+            barcode_cache.enabled = False
+            try:
+                return scan(barcode)
+            finally:
+                barcode_cache.enabled = True
+
+        barcode_cache.clear()
+        for barcode in barcodes:
+            scan(barcode)
+        self.stdout.write(f'Barcode scans over {len(barcodes)} purchased products')
+        self.report([
+            ('get_product_by_barcode (no cache)', scan_uncached),
+            ('get_product_by_barcode (cached)', scan),
+        ], barcodes, iterations)
+
+    def benchmark_product_list_search(self, queries, iterations):
+        """First page of product_list search results (excluding per-row stock work)"""
+        def base_queryset():
+            return ProductMaster.objects.select_related('classification').order_by('productid')
+
+        def original_ranking(query):
+            # product_list before ranking moved into SQL: load every match, sort in
+            # Python, re-query by id and restore the order with list.index()
+            products = search_filter(base_queryset(), query)
+            products = sorted(products, key=lambda p: (
+                not p.product_name.lower().startswith(query.lower()),
+                not query.lower() in p.product_name.lower(),
+                p.product_name.lower()
+            ))
+            product_ids = [p.productid for p in products]
+            products = ProductMaster.objects.select_related('classification').filter(productid__in=product_ids)
+            products = sorted(products, key=lambda p: product_ids.index(p.productid))
+            return list(Paginator(products, 30).get_page(1))
+
+        def sql_ranking(query):
+            products = rank_by_relevance(search_filter(base_queryset(), query), query)
+            return list(Paginator(products, 30).get_page(1))
+
+        # The original ranking is quadratic in the number of matches, so run fewer rounds
+        list_iterations = max(len(queries), iterations // 10)
+        self.stdout.write(f'product_list search, first page of 30 ({list_iterations} lookups)')
+        self.report([
+            ('product_list ranking (original)', original_ranking),
+            ('product_list ranking (SQL)', sql_ranking),
+        ], queries, list_iterations)
+
+    def report(self, benchmarks, queries, iterations):
+        self.stdout.write(f"{'benchmark':<36}{'p50':>12}{'p99':>12}{'mean':>12}")
+        for label, func in benchmarks:
+            timings = []
+            for i in range(iterations):
+                query = queries[i % len(queries)]
+                started = time.perf_counter()
+                func(query)
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            p50 = timings[len(timings) // 2]
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            self.stdout.write(
+                f'{label:<36}{self.format_time(p50):>12}{self.format_time(p99):>12}'
+                f'{self.format_time(statistics.mean(timings)):>12}'
+            )
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
+
+    def format_time(self, seconds):
+        if seconds < 0.001:
+            return f'{seconds * 1_000_000:.1f} us'
+        return f'{seconds * 1000:.2f} ms'
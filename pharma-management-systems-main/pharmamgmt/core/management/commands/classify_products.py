@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.product_classification import classify_products, ABC_THRESHOLDS, XYZ_THRESHOLDS
+
+
+class Command(BaseCommand):
+    help = ('Classify all products by ABC (revenue contribution) and XYZ (weekly demand variability). '
+            'Intended to be scheduled, e.g. nightly from cron: python manage.py classify_products')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--weeks',
+            type=int,
+            default=52,
+            help='Number of weeks of sales history to analyse (default: 52)',
+        )
+        parser.add_argument(
+            '--a-cutoff',
+            type=float,
+            default=ABC_THRESHOLDS[0],
+            help='Cumulative revenue share covered by class A (default: 0.80)',
+        )
+        parser.add_argument(
+            '--b-cutoff',
+            type=float,
+            default=ABC_THRESHOLDS[1],
+            help='Cumulative revenue share covered by classes A and B (default: 0.95)',
+        )
+        parser.add_argument(
+            '--x-cutoff',
+            type=float,
+            default=XYZ_THRESHOLDS[0],
+            help='Maximum coefficient of variation for class X (default: 0.5)',
+        )
+        parser.add_argument(
+            '--y-cutoff',
+            type=float,
+            default=XYZ_THRESHOLDS[1],
+            help='Maximum coefficient of variation for class Y (default: 1.0)',
+        )
+
+    def handle(self, *args, **options):
+        if options['weeks'] <= 0:
+            raise CommandError('--weeks must be positive')
+
+        try:
+            summary = classify_products(
+                weeks=options['weeks'],
+                abc_thresholds=(options['a_cutoff'], options['b_cutoff']),
+                xyz_thresholds=(options['x_cutoff'], options['y_cutoff']),
+            )
+        except Exception as e:
+            raise CommandError(f'Classification failed: {e}')
+
+        self.stdout.write(
+            f"Classified {summary['products']} products using sales from "
+            f"{summary['start_date']} to {summary['end_date']}"
+        )
+        self.stdout.write(f"  ABC: A={summary['A']} B={summary['B']} C={summary['C']}")
+        self.stdout.write(f"  XYZ: X={summary['X']} Y={summary['Y']} Z={summary['Z']}")
+        self.stdout.write(self.style.SUCCESS('Product classification updated'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from core.product_search import ensure_fts_index
+from core.salt_index import rebuild_salt_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search and salt substitute indexes from ProductMaster'
+
+    def handle(self, *args, **options):
+        if ensure_fts_index(connection, rebuild=True):
+            self.stdout.write(self.style.SUCCESS('Rebuilt FTS5 product search index'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                'FTS5 is not available on this database; product search uses icontains fallback'
+            ))
+
+        indexed = rebuild_salt_index()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt salt index ({indexed} products with a parsable salt)'))
@@ -0,0 +1,82 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.export_jobs import claim_next_job, mark_failed, purge_expired_jobs, requeue_stale_jobs
+from core.export_worker import init_worker, run_job
+
+PURGE_EVERY = 600  # seconds
+
+
+class Command(BaseCommand):
+    help = ('Render queued report exports (ExportJob) in a process pool. Run it alongside the web server, '
+            'e.g. under systemd or supervisor: python manage.py run_export_worker --workers 2')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Exports rendered in parallel (default: 2)',
+        )
+        parser.add_argument(
+            '--poll',
+            type=float,
+            default=1.0,
+            help='Seconds between queue checks when idle (default: 1.0)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for new jobs',
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers <= 0:
+            raise CommandError('--workers must be positive')
+
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} export(s) left running by a stopped worker')
+
+        # Pool processes open their own connections
+        connections.close_all()
+        running = {}
+        last_purge = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            try:
+                while True:
+                    if time.monotonic() - last_purge >= PURGE_EVERY:
+                        purge_expired_jobs()
+                        last_purge = time.monotonic()
+
+                    while len(running) < workers:
+                        job_id = claim_next_job()
+                        if job_id is None:
+                            break
+                        self.stdout.write(f'Export job {job_id} started')
+                        running[pool.submit(run_job, job_id)] = job_id
+
+                    if not running:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll'])
+                        continue
+
+                    finished, _ = wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        job_id = running.pop(future)
+                        try:
+                            future.result()
+                            self.stdout.write(f'Export job {job_id} finished')
+                        except Exception as e:
+                            # The pool process itself died (e.g. out of memory)
+                            mark_failed(job_id, e)
+                            self.stdout.write(self.style.ERROR(f'Export job {job_id} crashed: {e}'))
+            except KeyboardInterrupt:
+                self.stdout.write('Stopping; unfinished exports will be requeued on the next start')
+                for future in running:
+                    future.cancel()
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.import_jobs import claim_next_job, process_job, purge_expired_jobs, release_job, requeue_stale_jobs
+
+PURGE_EVERY = 600  # seconds
+
+
+class Command(BaseCommand):
+    help = ('Import queued bulk uploads (ImportJob) in committed chunks. Run it alongside the web server, '
+            'e.g. under systemd or supervisor: python manage.py run_import_worker. A job left running by a '
+            'stopped worker resumes after its last committed chunk.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll',
+            type=float,
+            default=1.0,
+            help='Seconds between queue checks when idle (default: 1.0)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for new jobs',
+        )
+
+    def handle(self, *args, **options):
+        # Imports are write-heavy, so jobs run one at a time in this process;
+        # start another worker to run two imports side by side
+        last_purge = 0
+        job_id = None
+        try:
+            while True:
+                if time.monotonic() - last_purge >= PURGE_EVERY:
+                    requeued = requeue_stale_jobs()
+                    if requeued:
+                        self.stdout.write(f'Resuming {requeued} import(s) left running by a stopped worker')
+                    purge_expired_jobs()
+                    last_purge = time.monotonic()
+
+                job_id = claim_next_job()
+                if job_id is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+
+                self.stdout.write(f'Import job {job_id} started')
+                process_job(job_id)
+                self.stdout.write(f'Import job {job_id} finished')
+                job_id = None
+        except KeyboardInterrupt:
+            if job_id is not None:
+                release_job(job_id)
+            self.stdout.write('Stopping; an unfinished import resumes from its last committed chunk on the next start')
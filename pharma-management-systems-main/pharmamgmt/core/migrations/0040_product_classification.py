@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0039_remove_scroll_no_field'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductClassification',
+            fields=[
+                ('productid', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='classification', serialize=False, to='core.productmaster')),
+                ('abc_class', models.CharField(choices=[('A', 'A'), ('B', 'B'), ('C', 'C')], default='C', max_length=1)),
+                ('xyz_class', models.CharField(choices=[('X', 'X'), ('Y', 'Y'), ('Z', 'Z')], default='Z', max_length=1)),
+                ('revenue', models.FloatField(default=0.0)),
+                ('revenue_share', models.FloatField(default=0.0)),
+                ('demand_cv', models.FloatField(blank=True, null=True)),
+                ('weeks_with_sales', models.IntegerField(default=0)),
+                ('classified_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['abc_class', 'xyz_class'], name='idx_class_abc_xyz'), models.Index(fields=['xyz_class'], name='idx_class_xyz')],
+            },
+        ),
+    ]
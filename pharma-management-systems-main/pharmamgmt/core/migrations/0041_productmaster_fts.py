@@ -0,0 +1,27 @@
+# Full-text search index for ProductMaster (SQLite FTS5 only)
+
+from django.db import migrations
+
+
+def create_fts_index(apps, schema_editor):
+    from core.product_search import ensure_fts_index
+    ensure_fts_index(schema_editor.connection, rebuild=True)
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for trigger in ('ai', 'ad', 'au'):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS core_productmaster_fts_{trigger}")
+    schema_editor.execute("DROP TABLE IF EXISTS core_productmaster_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0040_product_classification'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_salt_index(apps, schema_editor):
+    from core.salt_index import salt_keys
+    ProductMaster = apps.get_model('core', 'ProductMaster')
+    ProductSaltIndex = apps.get_model('core', 'ProductSaltIndex')
+    rows = []
+    for productid, salt in ProductMaster.objects.values_list('productid', 'product_salt').iterator():
+        salt_key, ingredients_key = salt_keys(salt)
+        if salt_key is not None:
+            rows.append(ProductSaltIndex(productid_id=productid, salt_key=salt_key, ingredients_key=ingredients_key))
+    ProductSaltIndex.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0042_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSaltIndex',
+            fields=[
+                ('productid', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='salt_index', serialize=False, to='core.productmaster')),
+                ('salt_key', models.CharField(db_index=True, help_text='Ingredients with strengths, e.g. amoxicillin 500mg+clavulanic acid 125mg', max_length=300)),
+                ('ingredients_key', models.CharField(db_index=True, help_text='Ingredients only, e.g. amoxicillin+clavulanic acid', max_length=300)),
+            ],
+        ),
+        migrations.RunPython(populate_salt_index, migrations.RunPython.noop),
+    ]
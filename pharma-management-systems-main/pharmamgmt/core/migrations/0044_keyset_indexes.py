@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0043_product_salt_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoicemaster',
+            index=models.Index(fields=['invoice_date', 'invoiceid'], name='idx_invoice_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentmaster',
+            index=models.Index(fields=['payment_date', 'payment_id'], name='idx_payment_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='receiptmaster',
+            index=models.Index(fields=['receipt_date', 'receipt_id'], name='idx_receipt_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='returninvoicemaster',
+            index=models.Index(fields=['returninvoice_date', 'returninvoiceid'], name='idx_return_invoice_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='returnsalesinvoicemaster',
+            index=models.Index(fields=['return_sales_invoice_date', 'return_sales_invoice_no'], name='idx_return_sales_date_no'),
+        ),
+        migrations.AddIndex(
+            model_name='salesinvoicemaster',
+            index=models.Index(fields=['sales_invoice_date', 'sales_invoice_no'], name='idx_sales_invoice_date_no'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0044_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchasemaster',
+            index=models.Index(fields=['productid', 'product_batch_no', 'purchaseid'], name='idx_purchase_product_batch'),
+        ),
+        migrations.AddIndex(
+            model_name='returnpurchasemaster',
+            index=models.Index(fields=['returnproductid', 'returnproduct_batch_no'], name='idx_preturn_product_batch'),
+        ),
+        migrations.AddIndex(
+            model_name='returnsalesmaster',
+            index=models.Index(fields=['return_productid', 'return_product_batch_no'], name='idx_sreturn_product_batch'),
+        ),
+        migrations.AddIndex(
+            model_name='salesmaster',
+            index=models.Index(fields=['productid', 'product_batch_no'], name='idx_sales_product_batch'),
+        ),
+    ]
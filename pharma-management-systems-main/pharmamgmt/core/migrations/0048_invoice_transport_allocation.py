@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0047_import_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoicemaster',
+            name='transport_allocation',
+            field=models.CharField(choices=[('equal', 'Equal per line'), ('value', 'By line value'), ('quantity', 'By quantity')], default='equal', help_text='How transport_charges is spread over the purchase lines', max_length=10),
+        ),
+    ]
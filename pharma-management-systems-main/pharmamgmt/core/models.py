@@ -90,17 +90,26 @@ class CustomerMaster(models.Model):
         return self.customer_name
 
 class InvoiceMaster(models.Model):
+    TRANSPORT_ALLOCATION_CHOICES = [
+        ('equal', 'Equal per line'),
+        ('value', 'By line value'),
+        ('quantity', 'By quantity'),
+    ]
     invoiceid=models.BigAutoField(primary_key=True, auto_created=True)
     invoice_no=models.CharField(max_length=20)
     invoice_date=models.DateField(null=False, blank=False, default=timezone.now)
     supplierid=models.ForeignKey(SupplierMaster, on_delete=models.CASCADE)
     transport_charges=models.FloatField()
+    transport_allocation=models.CharField(max_length=10, choices=TRANSPORT_ALLOCATION_CHOICES, default='equal', help_text="How transport_charges is spread over the purchase lines")
     invoice_total=models.FloatField(null=False, blank=False)
     invoice_paid=models.FloatField(null=False, blank=False, default=0)
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=['invoice_no', 'supplierid'], name='unique_invoiceno_supplierid')
         ]
+        indexes = [
+            models.Index(fields=['invoice_date', 'invoiceid'], name='idx_invoice_date_id'),
+        ]
     
     def __str__(self):
         return f"Invoice #{self.invoice_no} - {self.supplierid.supplier_name}"
@@ -145,6 +154,11 @@ class PurchaseMaster(models.Model):
     purchase_calculation_mode=models.CharField(max_length=5, default='flat') 
     #calculation_mode indicates how discount is calculated by flat-rupees or %-percent
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['productid', 'product_batch_no', 'purchaseid'], name='idx_purchase_product_batch'),
+        ]
+    
     def __str__(self):
         return f"{self.product_name} - {self.product_batch_no} - {self.product_quantity}"
 
@@ -154,6 +168,11 @@ class SalesInvoiceMaster(models.Model):
     customerid=models.ForeignKey(CustomerMaster, on_delete=models.CASCADE)
     sales_transport_charges=models.FloatField(default=0)
     sales_invoice_paid=models.FloatField(null=False, blank=False, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sales_invoice_date', 'sales_invoice_no'], name='idx_sales_invoice_date_no'),
+        ]
     
     def __str__(self):
         return f"Sales Invoice #{self.sales_invoice_no} - {self.customerid.customer_name}"
@@ -191,6 +210,11 @@ class SalesMaster(models.Model):
     sale_calculation_mode=models.CharField(max_length=5, default='flat') 
     #calculation_mode indicates how discount is calculated by flat-rupees or %-percent
    
+    class Meta:
+        indexes = [
+            models.Index(fields=['productid', 'product_batch_no'], name='idx_sales_product_batch'),
+        ]
+    
     def __str__(self):
         return f"{self.product_name} - {self.product_batch_no} - {self.sale_quantity}"
 
@@ -222,6 +246,11 @@ class ReturnInvoiceMaster(models.Model):
     return_charges=models.FloatField(default=0)
     returninvoice_total=models.FloatField(null=False, blank=False)
     returninvoice_paid=models.FloatField(null=False, blank=False, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['returninvoice_date', 'returninvoiceid'], name='idx_return_invoice_date_id'),
+        ]
     
     def __str__(self):
         return f"Return Invoice #{self.returninvoiceid} - {self.returnsupplierid.supplier_name}"
@@ -257,6 +286,11 @@ class ReturnPurchaseMaster(models.Model):
     return_reason=models.CharField(max_length=200, blank=True, null=True)
     returnpurchase_entry_date=models.DateField(default=timezone.now)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['returnproductid', 'returnproduct_batch_no'], name='idx_preturn_product_batch'),
+        ]
+    
     def __str__(self):
         return f"Return: {self.returnproductid.product_name} - {self.returnproduct_batch_no} - {self.returnproduct_quantity}"
 
@@ -269,6 +303,11 @@ class ReturnSalesInvoiceMaster(models.Model):
     return_sales_invoice_total=models.FloatField(null=False, blank=False)
     return_sales_invoice_paid=models.FloatField(null=False, blank=False, default=0)
     created_at=models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['return_sales_invoice_date', 'return_sales_invoice_no'], name='idx_return_sales_date_no'),
+        ]
     
     def __str__(self):
         return f"Sales Return Invoice #{self.return_sales_invoice_no} - {self.return_sales_customerid.customer_name}"
@@ -309,6 +348,11 @@ class ReturnSalesMaster(models.Model):
     return_sale_entry_date=models.DateTimeField(default=timezone.now)
     return_sale_calculation_mode=models.CharField(max_length=20, default='percentage', choices=[('percentage', 'Percentage'), ('fixed', 'Fixed Amount')])
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['return_productid', 'return_product_batch_no'], name='idx_sreturn_product_batch'),
+        ]
+    
     def __str__(self):
         return f"Sales Return: {self.return_product_name} - {self.return_product_batch_no} - {self.return_sale_quantity}"
 
@@ -342,6 +386,11 @@ class PaymentMaster(models.Model):
     payment_reference = models.CharField(max_length=100, blank=True, null=True)
     supplier = models.ForeignKey(SupplierMaster, on_delete=models.CASCADE, null=True, blank=True)
     invoice = models.ForeignKey(InvoiceMaster, on_delete=models.CASCADE, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['payment_date', 'payment_id'], name='idx_payment_date_id'),
+        ]
     
     def __str__(self):
         return f"Payment #{self.payment_id} - ₹{self.payment_amount}"
@@ -361,6 +410,11 @@ class ReceiptMaster(models.Model):
     receipt_reference = models.CharField(max_length=100, blank=True, null=True)
     customer = models.ForeignKey(CustomerMaster, on_delete=models.CASCADE, null=True, blank=True)
     sales_invoice = models.ForeignKey(SalesInvoiceMaster, on_delete=models.CASCADE, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['receipt_date', 'receipt_id'], name='idx_receipt_date_id'),
+        ]
     
     def __str__(self):
         return f"Receipt #{self.receipt_id} - ₹{self.receipt_amount}"
@@ -368,3 +422,121 @@ class ReceiptMaster(models.Model):
 
 
 
+
+class ProductClassification(models.Model):
+    """ABC (revenue contribution) / XYZ (demand variability) class per product, refreshed by classify_products"""
+    productid=models.OneToOneField(ProductMaster, on_delete=models.CASCADE, primary_key=True, related_name='classification')
+    abc_class=models.CharField(max_length=1, default='C', choices=[('A', 'A'), ('B', 'B'), ('C', 'C')])
+    xyz_class=models.CharField(max_length=1, default='Z', choices=[('X', 'X'), ('Y', 'Y'), ('Z', 'Z')])
+    revenue=models.FloatField(default=0.0)
+    revenue_share=models.FloatField(default=0.0)
+    demand_cv=models.FloatField(null=True, blank=True)
+    weeks_with_sales=models.IntegerField(default=0)
+    classified_at=models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['abc_class', 'xyz_class'], name='idx_class_abc_xyz'),
+            models.Index(fields=['xyz_class'], name='idx_class_xyz'),
+        ]
+
+    def __str__(self):
+        return f"{self.productid.product_name}: {self.abc_class}{self.xyz_class}"
+
+
+class DataVersion(models.Model):
+    """Change counter per data set (e.g. 'products'); lets each worker know when its in-memory caches are stale"""
+    key=models.CharField(max_length=50, primary_key=True)
+    version=models.PositiveBigIntegerField(default=0)
+    updated_at=models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+
+class ProductSaltIndex(models.Model):
+    """Normalized composition of ProductMaster.product_salt, used to find same-salt substitutes"""
+    productid=models.OneToOneField(ProductMaster, on_delete=models.CASCADE, primary_key=True, related_name='salt_index')
+    salt_key=models.CharField(max_length=300, db_index=True, help_text="Ingredients with strengths, e.g. amoxicillin 500mg+clavulanic acid 125mg")
+    ingredients_key=models.CharField(max_length=300, db_index=True, help_text="Ingredients only, e.g. amoxicillin+clavulanic acid")
+
+    def __str__(self):
+        return f"{self.productid_id}: {self.salt_key}"
+
+
+def export_job_upload_to(instance, filename):
+    return f"exports/{instance.token}/{filename}"
+
+
+class ExportJob(models.Model):
+    """A report export rendered by `manage.py run_export_worker` instead of inside the request"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    kind=models.CharField(max_length=30)
+    params=models.JSONField(default=dict, blank=True)
+    dedupe_key=models.CharField(max_length=64, db_index=True, help_text="Hash of kind and params; identical requests share a job")
+    data_versions=models.CharField(max_length=100, blank=True, help_text="Data versions the export was requested against")
+    status=models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    progress=models.PositiveSmallIntegerField(default=0)
+    message=models.CharField(max_length=200, blank=True)
+    token=models.CharField(max_length=32, unique=True)
+    file=models.FileField(upload_to=export_job_upload_to, blank=True)
+    filename=models.CharField(max_length=200, blank=True)
+    content_type=models.CharField(max_length=100, blank=True)
+    error=models.TextField(blank=True)
+    requested_by=models.ForeignKey(Web_User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at=models.DateTimeField(default=timezone.now)
+    started_at=models.DateTimeField(null=True, blank=True)
+    finished_at=models.DateTimeField(null=True, blank=True)
+    updated_at=models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='idx_export_job_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+def import_job_upload_to(instance, filename):
+    return f"imports/{instance.token}/{filename}"
+
+
+class ImportJob(models.Model):
+    """A bulk file import run by `manage.py run_import_worker` in committed, resumable chunks"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    kind=models.CharField(max_length=30)
+    params=models.JSONField(default=dict, blank=True)
+    file=models.FileField(upload_to=import_job_upload_to)
+    filename=models.CharField(max_length=200)
+    status=models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    progress=models.PositiveSmallIntegerField(default=0)
+    message=models.CharField(max_length=200, blank=True)
+    token=models.CharField(max_length=32, unique=True)
+    total_rows=models.PositiveIntegerField(default=0)
+    checkpoint_row=models.PositiveIntegerField(default=0, help_text="Last file row committed; a resumed job continues after it")
+    result=models.JSONField(default=dict, blank=True, help_text="Counts and row errors up to the checkpoint")
+    error=models.TextField(blank=True)
+    requested_by=models.ForeignKey(Web_User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at=models.DateTimeField(default=timezone.now)
+    started_at=models.DateTimeField(null=True, blank=True)
+    finished_at=models.DateTimeField(null=True, blank=True)
+    updated_at=models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='idx_import_job_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} import #{self.pk} ({self.status})"
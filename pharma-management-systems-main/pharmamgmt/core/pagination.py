@@ -0,0 +1,265 @@
+"""
+Pagination helpers for large tables
+KeysetPaginator: pages are selected with WHERE (date, pk) < (last date, last pk)
+instead of COUNT(*) + OFFSET, so a deep page costs the same as the first one.
+Cursors are signed, opaque tokens; a tampered or stale cursor falls back
+to the first page.
+CachedCountPaginator: offset pagination for views that keep page numbers, with
+the COUNT(*) served from a per-process cache and refreshed in the background
+"""
+
+import logging
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.core import signing
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+
+from .data_version import get_version
+
+logger = logging.getLogger(__name__)
+
+CURSOR_SALT = 'core.pagination.cursor'
+
+# Cached counts older than this (seconds) are served once more while a
+# background thread recounts
+COUNT_CACHE_TTL = 300
+# Counts at or below this are always exact; counting a small result is cheap
+EXACT_COUNT_LIMIT = 1000
+MAX_COUNT_ENTRIES = 512
+
+_count_lock = threading.Lock()
+_count_cache = {}  # query key -> (count, versions, counted_at)
+_refreshing = set()
+
+
+class KeysetPage:
+    """One page of results; iterable like a Paginator Page"""
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor, params=None):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._params = params or {}
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def _link(self, cursor=None):
+        params = dict(self._params)
+        if cursor:
+            params['cursor'] = cursor
+        return '?' + urlencode(params)
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def first_link(self):
+        return self._link()
+
+    @property
+    def next_link(self):
+        return self._link(self.next_cursor) if self.has_next else ''
+
+    @property
+    def previous_link(self):
+        return self._link(self.previous_cursor) if self.has_previous else ''
+
+    @property
+    def last_link(self):
+        return self._link(signing.dumps(['last', None, None], salt=CURSOR_SALT)) if self.has_next else ''
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset newest first on (date_field, pk).
+
+    The pk breaks ties between rows on the same date, giving a stable total
+    order; add an index on (date_field, pk) for the lookups to stay cheap.
+    """
+
+    def __init__(self, queryset, per_page, date_field):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.date_field = date_field
+        self.pk_name = queryset.model._meta.pk.name
+        self._date = queryset.model._meta.get_field(date_field)
+        self._pk = queryset.model._meta.pk
+
+    def encode_cursor(self, obj, direction):
+        value = getattr(obj, self.date_field)
+        key = self._pk.value_to_string(obj)
+        return signing.dumps([direction, value.isoformat() if value else None, key], salt=CURSOR_SALT)
+
+    def decode_cursor(self, cursor):
+        """Return (direction, date, pk) or None for a missing/invalid cursor"""
+        if not cursor:
+            return None
+        try:
+            direction, value, key = signing.loads(cursor, salt=CURSOR_SALT)
+            if direction == 'last':
+                return direction, None, None
+            if direction not in ('next', 'prev'):
+                return None
+            return direction, self._date.to_python(value), self._pk.to_python(key)
+        except Exception:
+            return None
+
+    def get_page(self, cursor=None, params=None):
+        """
+        Page after ('next') or before ('prev') the row a cursor points at, or
+        the oldest page ('last').
+        `params` (e.g. request.GET) are carried over into the page links.
+        """
+        params = {k: v for k, v in (params or {}).items() if k not in ('cursor', 'page')}
+        position = self.decode_cursor(cursor)
+        date_field, pk_name = self.date_field, self.pk_name
+
+        if position is None:
+            direction = 'next'
+            rows = list(self.queryset.order_by(f'-{date_field}', f'-{pk_name}')[:self.per_page + 1])
+        elif position[0] == 'last':
+            # Oldest rows: read ascending and flip, same cost as the first page
+            direction = 'prev'
+            rows = list(self.queryset.order_by(date_field, pk_name)[:self.per_page + 1])
+        else:
+            direction, date_value, pk_value = position
+            if direction == 'next':
+                rows = list(self.queryset.filter(
+                    Q(**{f'{date_field}__lt': date_value}) |
+                    Q(**{date_field: date_value, f'{pk_name}__lt': pk_value})
+                ).order_by(f'-{date_field}', f'-{pk_name}')[:self.per_page + 1])
+            else:
+                rows = list(self.queryset.filter(
+                    Q(**{f'{date_field}__gt': date_value}) |
+                    Q(**{date_field: date_value, f'{pk_name}__gt': pk_value})
+                ).order_by(date_field, pk_name)[:self.per_page + 1])
+
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'prev':
+            rows.reverse()
+            has_previous, has_next = more, position[0] != 'last'
+        else:
+            has_previous, has_next = position is not None, more
+
+        return KeysetPage(
+            rows,
+            has_next=has_next and bool(rows),
+            has_previous=has_previous and bool(rows),
+            next_cursor=self.encode_cursor(rows[-1], 'next') if rows else None,
+            previous_cursor=self.encode_cursor(rows[0], 'prev') if rows else None,
+            params=params,
+        )
+
+
+def keyset_json(page, serialize):
+    """JSON payload for a KeysetPage; `serialize` turns one row into a dict"""
+    return {
+        'success': True,
+        'results': [serialize(obj) for obj in page],
+        'has_next': page.has_next,
+        'has_previous': page.has_previous,
+        'next_cursor': page.next_cursor if page.has_next else None,
+        'previous_cursor': page.previous_cursor if page.has_previous else None,
+    }
+
+
+def _store_count(key, count, versions):
+    with _count_lock:
+        _count_cache.pop(key, None)
+        _count_cache[key] = (count, versions, time.monotonic())
+        while len(_count_cache) > MAX_COUNT_ENTRIES:
+            _count_cache.pop(next(iter(_count_cache)))
+
+
+def _refresh_count(key, queryset, versions):
+    """Recount `queryset` in a background thread (at most one per key)"""
+    with _count_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            _store_count(key, queryset.count(), versions)
+        except Exception as e:
+            logger.warning("Count refresh failed: %s", e)
+        finally:
+            with _count_lock:
+                _refreshing.discard(key)
+            connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def clear_count_cache():
+    with _count_lock:
+        _count_cache.clear()
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator that avoids a COUNT(*) on every page hit.
+
+    The count for a query is cached per process and served with
+    count_is_estimate set. Once it is older than `ttl`, or a data version in
+    `version_keys` has moved on, it is served once more while a background
+    thread recounts. Small results (<= exact_limit) and `exact=True` always count.
+    Drop-in for ModelAdmin.paginator.
+    """
+
+    ttl = COUNT_CACHE_TTL
+    exact_limit = EXACT_COUNT_LIMIT
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True,
+                 exact=False, version_keys=(), **kwargs):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page, **kwargs)
+        self.exact = exact
+        self.version_keys = tuple(version_keys)
+        self.count_is_estimate = False
+
+    def _cache_key(self):
+        try:
+            sql, params = self.object_list.query.sql_with_params()
+        except EmptyResultSet:
+            return None
+        return f'{self.object_list.model._meta.label}:{sql}:{params!r}'
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return len(self.object_list)
+        key = None if self.exact else self._cache_key()
+        if key is None:
+            return self.object_list.count()
+
+        versions = tuple(get_version(k) for k in self.version_keys)
+        cached = _count_cache.get(key)
+        if cached is not None and cached[0] > self.exact_limit:
+            count, cached_versions, counted_at = cached
+            self.count_is_estimate = True
+            if cached_versions != versions or time.monotonic() - counted_at >= self.ttl:
+                _refresh_count(key, self.object_list.all(), versions)
+            return count
+
+        count = self.object_list.count()
+        if count > self.exact_limit:
+            _store_count(key, count, versions)
+        return count
@@ -0,0 +1,294 @@
+"""
+Customer and supplier master import
+Loads CustomerMaster/SupplierMaster rows from CSV/XLSX with upsert semantics:
+a row whose GST number or mobile matches an existing party (or an earlier row
+of the same file) updates it, any other row adds a new party. Existing
+parties are matched through lookup dicts read once per import, and each chunk
+is written with one bulk_create and one bulk_update.
+"""
+
+import csv
+import re
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import redirect, render
+
+from .bulk_upload_views import EXCEL_SUPPORT, IMPORT_CHUNK_SIZE, MAX_REPORTED_ERRORS, iter_file_rows, iter_stored_rows
+from .import_jobs import BACKGROUND_IMPORT_BYTES, enqueue_import, import_job_response
+from .models import CustomerMaster, SupplierMaster
+
+if EXCEL_SUPPORT:
+    from openpyxl import Workbook
+
+# kind -> (model, field prefix, label, list page)
+PARTY_KINDS = {
+    'customers': (CustomerMaster, 'customer_', 'Customers', 'customer_list'),
+    'suppliers': (SupplierMaster, 'supplier_', 'Suppliers', 'supplier_list'),
+}
+
+TEMPLATE_ROWS = {
+    'customers': [
+        {'customer_name': 'City Medicals', 'customer_type': 'TYPE-A', 'customer_address': 'MG Road, Pune',
+         'customer_mobile': '9876543210', 'customer_gstno': '27ABCDE1234F1Z5', 'customer_credit_days': '30'},
+    ],
+    'suppliers': [
+        {'supplier_name': 'ABC Distributors', 'supplier_type': 'Wholesale', 'supplier_address': 'Camp, Pune',
+         'supplier_mobile': '9123456780', 'supplier_gstno': '27PQRSX5678K1Z2', 'supplier_dlno': 'MH-PZ-123'},
+    ],
+}
+
+EMPTY_VALUES = ('', 'na', 'n/a', '-')
+
+
+def party_columns(kind):
+    """Importable fields of a party model, in model order"""
+    model = PARTY_KINDS[kind][0]
+    return [field.name for field in model._meta.concrete_fields if not field.primary_key]
+
+
+def normalize_mobile(value):
+    """Last 10 digits of a phone number (without +91/0 prefixes), or None"""
+    digits = re.sub(r'\D', '', value or '')
+    return digits[-10:] if len(digits) >= 10 else None
+
+
+def normalize_gst(value):
+    value = re.sub(r'\s', '', value or '').upper()
+    return None if value.lower() in EMPTY_VALUES else value
+
+
+def _party_lookups(kind):
+    """{GST number: pk} and {mobile: pk} for every existing party of `kind`"""
+    model, prefix = PARTY_KINDS[kind][:2]
+    by_gst = {}
+    by_mobile = {}
+    for pk, gstno, mobile in model.objects.values_list(
+        'pk', f'{prefix}gstno', f'{prefix}mobile'
+    ).iterator(chunk_size=5000):
+        gstno = normalize_gst(gstno)
+        mobile = normalize_mobile(mobile)
+        if gstno:
+            by_gst.setdefault(gstno, pk)
+        if mobile:
+            by_mobile.setdefault(mobile, pk)
+    return by_gst, by_mobile
+
+
+def _clean_party_row(kind, row):
+    """{field: value} for the non-empty cells of a row; raises ValueError with the reason"""
+    model, prefix = PARTY_KINDS[kind][:2]
+    values = {}
+    for field in model._meta.concrete_fields:
+        value = row.get(field.name, '')
+        if field.primary_key or value.lower() in EMPTY_VALUES:
+            continue
+        if field.get_internal_type() == 'IntegerField':
+            try:
+                value = int(float(value))
+            except (ValueError, OverflowError):
+                raise ValueError(f"{field.name} must be a number")
+            if not -2**31 <= value < 2**31:
+                raise ValueError(f"{field.name} is out of range")
+        elif len(value) > field.max_length:
+            raise ValueError(f"{field.name} is longer than {field.max_length} characters")
+        values[field.name] = value
+    if values.get(f'{prefix}gstno'):
+        values[f'{prefix}gstno'] = normalize_gst(values[f'{prefix}gstno'])
+    if values.get(f'{prefix}emailid') and '@' not in values[f'{prefix}emailid']:
+        raise ValueError(f"Invalid email address {values[f'{prefix}emailid']}")
+    return values
+
+
+def _new_party(kind, values):
+    model = PARTY_KINDS[kind][0]
+    if model is SupplierMaster:
+        # SupplierMaster fields have no defaults; leave what the file doesn't give blank
+        values = {**{field: '' for field in party_columns(kind)}, **values}
+    return model(**values)
+
+
+def _report_error(result, row_number, name, error):
+    result['error_count'] += 1
+    if len(result['errors']) < MAX_REPORTED_ERRORS:
+        result['errors'].append({'row': row_number, 'name': name, 'error': error})
+
+
+def _import_party_chunk(kind, rows, by_gst, by_mobile, result):
+    """
+    Upsert one chunk of non-empty rows. `by_gst` and `by_mobile` map keys to
+    existing pks and learn the parties this chunk adds.
+    """
+    model, prefix = PARTY_KINDS[kind][:2]
+    created = []
+    pending = {}  # key -> party added by this chunk
+    updates = {}  # pk -> merged values, later rows winning
+    for row_number, row in rows:
+        name = row.get(f'{prefix}name', '')
+        try:
+            values = _clean_party_row(kind, row)
+        except ValueError as e:
+            _report_error(result, row_number, name, str(e))
+            continue
+
+        gstno = values.get(f'{prefix}gstno')
+        mobile = normalize_mobile(values.get(f'{prefix}mobile'))
+        keys = [key for key in (('gst', gstno), ('mobile', mobile)) if key[1]]
+        # A GST number identifies a party more surely than a mobile number
+        pk = by_gst.get(gstno) if gstno else None
+        if pk is None and mobile:
+            pk = by_mobile.get(mobile)
+        party = next((pending[key] for key in keys if key in pending), None)
+
+        if pk is not None:
+            updates.setdefault(pk, {}).update(values)
+        elif party is not None:
+            for field, value in values.items():
+                setattr(party, field, value)
+        elif not values.get(f'{prefix}name'):
+            _report_error(result, row_number, name, f"{prefix}name is required for a new {prefix.rstrip('_')}")
+            continue
+        else:
+            party = _new_party(kind, values)
+            created.append(party)
+        if party is not None:
+            for key in keys:
+                pending.setdefault(key, party)
+
+    with transaction.atomic():
+        if created:
+            model.objects.bulk_create(created, batch_size=1000)
+            result['created'] += len(created)
+            for (key_type, value), party in pending.items():
+                (by_gst if key_type == 'gst' else by_mobile).setdefault(value, party.pk)
+        if updates:
+            changed = []
+            fields = set()
+            for pk, party in model.objects.in_bulk(list(updates)).items():
+                values = {field: value for field, value in updates[pk].items() if getattr(party, field) != value}
+                if values:
+                    for field, value in values.items():
+                        setattr(party, field, value)
+                    changed.append(party)
+                    fields.update(values)
+            if changed:
+                model.objects.bulk_update(changed, sorted(fields), batch_size=500)
+            result['updated'] += len(changed)
+
+
+def import_parties(kind, rows):
+    """
+    Upsert (row number, {column: text}) rows in chunks.
+    Returns {'created', 'updated', 'error_count', 'errors': [{'row', 'name', 'error'}], 'rows'}.
+    """
+    by_gst, by_mobile = _party_lookups(kind)
+    result = {'created': 0, 'updated': 0, 'error_count': 0, 'errors': [], 'rows': 0}
+    chunk = []
+    for row_number, row in rows:
+        if not any(row.values()):  # Skip empty rows
+            continue
+        result['rows'] += 1
+        chunk.append((row_number, row))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            _import_party_chunk(kind, chunk, by_gst, by_mobile, result)
+            chunk = []
+    if chunk:
+        _import_party_chunk(kind, chunk, by_gst, by_mobile, result)
+    return result
+
+
+def _party_import_job(kind, job):
+    # Read when the job (re)starts, so parties committed before a crash are matched
+    by_gst, by_mobile = _party_lookups(kind)
+
+    def process(rows, result):
+        result.setdefault('updated', 0)
+        _import_party_chunk(kind, rows, by_gst, by_mobile, result)
+
+    return (lambda: iter_stored_rows(job.file, job.filename, party_columns(kind))), process
+
+
+def customer_import_job(job):
+    """ImportJob handler for kind 'customers' (see import_jobs.IMPORT_KINDS)"""
+    return _party_import_job('customers', job)
+
+
+def supplier_import_job(job):
+    """ImportJob handler for kind 'suppliers' (see import_jobs.IMPORT_KINDS)"""
+    return _party_import_job('suppliers', job)
+
+
+@login_required
+def import_parties_view(request, kind):
+    """Bulk add/update customers or suppliers from a CSV or Excel file"""
+    if kind not in PARTY_KINDS:
+        raise Http404("Unknown import")
+    label, list_url = PARTY_KINDS[kind][2:]
+    context = {
+        'kind': kind,
+        'label': label,
+        'list_url': list_url,
+        'columns': party_columns(kind),
+        'title': f'Import {label}'
+    }
+
+    if request.method == 'POST':
+        file = request.FILES.get('file')
+        if not file:
+            messages.error(request, 'Please select a file to upload')
+            return redirect(request.path)
+        if not file.name.endswith(('.csv', '.xlsx', '.xls')):
+            messages.error(request, 'Invalid file format. Please upload CSV or Excel file')
+            return redirect(request.path)
+
+        if request.POST.get('background') or file.size > BACKGROUND_IMPORT_BYTES:
+            job = enqueue_import(kind, file, user=request.user)
+            return import_job_response(request, job)
+
+        try:
+            result = import_parties(kind, iter_file_rows(file, file.name, context['columns']))
+        except Exception as e:
+            messages.error(request, f'Error processing file: {str(e)}')
+            return redirect(request.path)
+
+        if request.GET.get('format') == 'json':
+            return JsonResponse({'success': True, **result})
+        if result['created'] or result['updated']:
+            messages.success(request, f"{result['created']} {label.lower()} added, {result['updated']} updated")
+        if result['errors']:
+            messages.warning(request, f"{result['error_count']} rows were not imported; see the report below")
+        context['result'] = result
+
+    return render(request, 'imports/party_import.html', context)
+
+
+@login_required
+def download_party_template(request, kind):
+    if kind not in PARTY_KINDS:
+        raise Http404("Unknown import")
+    columns = party_columns(kind)
+    rows = [[sample.get(column, '') for column in columns] for sample in TEMPLATE_ROWS[kind]]
+
+    if request.GET.get('format') == 'excel':
+        if not EXCEL_SUPPORT:
+            messages.error(request, 'Excel support not available. Please use CSV format.')
+            return redirect(f'import_{kind}')
+        wb = Workbook()
+        ws = wb.active
+        ws.title = PARTY_KINDS[kind][2]
+        ws.append(columns)
+        for row in rows:
+            ws.append(row)
+        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response['Content-Disposition'] = f'attachment; filename="{kind}_template.xlsx"'
+        wb.save(response)
+        return response
+
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{kind}_template.csv"'
+    writer = csv.writer(response)
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return response
@@ -0,0 +1,146 @@
+"""
+Picker endpoints for invoice forms
+Form pages no longer render the whole catalog; product, customer and supplier
+selects are filled from these paginated, searchable APIs, and the product
+quick search works off a compact catalog snapshot keyed by the 'products'
+data version so the browser can cache it until products change
+"""
+
+import json
+import threading
+
+from django.contrib.auth.decorators import login_required
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.urls import reverse
+
+from .data_version import PRODUCTS, get_version
+from .models import ProductMaster, CustomerMaster, SupplierMaster
+from .product_search import search_filter, rank_by_relevance
+
+PICKER_PAGE_SIZE = 20
+PICKER_MAX_PAGE_SIZE = 200
+
+_snapshot_lock = threading.Lock()
+_snapshot = None  # (version, body, etag)
+
+
+def product_catalog_url():
+    """Snapshot URL for templates; the version in the query string busts the browser cache"""
+    return f"{reverse('product_catalog_snapshot')}?v={get_version(PRODUCTS)}"
+
+
+def _picker_page(request, queryset, serialize):
+    """One page of picker results: ?page=1&page_size=20"""
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        page_size = min(max(int(request.GET.get('page_size', PICKER_PAGE_SIZE)), 1), PICKER_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'page and page_size must be numbers'}, status=400)
+
+    offset = (page - 1) * page_size
+    # One extra row tells whether another page exists, without a COUNT(*)
+    rows = list(queryset[offset:offset + page_size + 1])
+    return JsonResponse({
+        'success': True,
+        'results': [serialize(row) for row in rows[:page_size]],
+        'page': page,
+        'has_more': len(rows) > page_size,
+    })
+
+
+@login_required
+def product_picker_api(request):
+    """Products for a picker: ?q=<search>&page=1&page_size=20"""
+    query = request.GET.get('q', '').strip()
+    products = ProductMaster.objects.all()
+    if query:
+        products = rank_by_relevance(search_filter(products, query), query)
+    else:
+        products = products.order_by('product_name', 'productid')
+
+    return _picker_page(
+        request,
+        products.values('productid', 'product_name', 'product_company', 'product_packing'),
+        lambda p: {
+            'id': p['productid'],
+            'name': p['product_name'],
+            'company': p['product_company'],
+            'packing': p['product_packing'],
+        }
+    )
+
+
+@login_required
+def customer_picker_api(request):
+    """Customers for a picker: ?q=<name or mobile>&page=1&page_size=20"""
+    query = request.GET.get('q', '').strip()
+    customers = CustomerMaster.objects.all()
+    if query:
+        customers = customers.filter(
+            Q(customer_name__icontains=query) | Q(customer_mobile__icontains=query)
+        )
+
+    return _picker_page(
+        request,
+        customers.order_by('customer_name', 'customerid').values('customerid', 'customer_name', 'customer_type'),
+        lambda c: {'id': c['customerid'], 'name': c['customer_name'], 'type': c['customer_type']}
+    )
+
+
+@login_required
+def supplier_picker_api(request):
+    """Suppliers for a picker: ?q=<name or mobile>&page=1&page_size=20"""
+    query = request.GET.get('q', '').strip()
+    suppliers = SupplierMaster.objects.all()
+    if query:
+        suppliers = suppliers.filter(
+            Q(supplier_name__icontains=query) | Q(supplier_mobile__icontains=query)
+        )
+
+    return _picker_page(
+        request,
+        suppliers.order_by('supplier_name', 'supplierid').values('supplierid', 'supplier_name'),
+        lambda s: {'id': s['supplierid'], 'name': s['supplier_name']}
+    )
+
+
+def _catalog_snapshot(version):
+    """Serialized catalog for `version`, built once per worker and version"""
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is not None and snapshot[0] == version:
+        return snapshot
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot[0] != version:
+            rows = list(ProductMaster.objects.order_by('product_name', 'productid').values_list(
+                'productid', 'product_name', 'product_company', 'product_packing'
+            ))
+            body = json.dumps({
+                'version': version,
+                'fields': ['id', 'name', 'company', 'packing'],
+                'rows': rows,
+            }, separators=(',', ':'))
+            _snapshot = (version, body.encode(), f'"products-{version}"')
+        return _snapshot
+
+
+@login_required
+def product_catalog_snapshot(request):
+    """
+    Whole product catalog as compact rows. Requested with ?v=<current version>
+    it may be cached for good; otherwise clients revalidate with the ETag.
+    """
+    version = get_version(PRODUCTS)
+    _, body, etag = _catalog_snapshot(version)
+
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    if request.GET.get('v') == str(version):
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,127 @@
+"""
+ABC/XYZ product classification
+ABC ranks products by their share of sales revenue, XYZ by how steady their
+weekly demand is (coefficient of variation of weekly quantity sold)
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+
+from .models import ProductMaster, SalesMaster, ProductClassification
+
+try:
+    import numpy as np
+    NUMPY_SUPPORT = True
+except ImportError:
+    NUMPY_SUPPORT = False
+
+# Cumulative revenue share upper bounds for A and B (everything after is C)
+ABC_THRESHOLDS = (0.80, 0.95)
+# Coefficient of variation upper bounds for X and Y (everything above is Z)
+XYZ_THRESHOLDS = (0.5, 1.0)
+
+
+def classify_products(weeks=52, end_date=None, abc_thresholds=ABC_THRESHOLDS, xyz_thresholds=XYZ_THRESHOLDS):
+    """
+    Classify every ProductMaster by ABC and XYZ over the last `weeks` weeks
+    and replace the ProductClassification table with the result.
+
+    Sales are bucketed per product and week in a single grouped query; the
+    revenue ranking and weekly variability are then computed with numpy over
+    the whole catalog at once.
+
+    Returns a summary dict with the number of products in each class.
+    """
+    if not NUMPY_SUPPORT:
+        raise Exception('numpy is required for product classification. Please install numpy: pip install numpy')
+
+    end_date = end_date or timezone.localdate()
+    start_date = end_date - timedelta(weeks=weeks)
+    # Align to the Monday TruncWeek returns so week indexes start at 0
+    first_week = start_date - timedelta(days=start_date.weekday())
+    n_weeks = (end_date - first_week).days // 7 + 1
+
+    product_ids = np.fromiter(
+        ProductMaster.objects.order_by('productid').values_list('productid', flat=True),
+        dtype=np.int64
+    )
+    n_products = len(product_ids)
+
+    weekly = SalesMaster.objects.filter(
+        sales_invoice_no__sales_invoice_date__range=(start_date, end_date)
+    ).annotate(
+        week=TruncWeek('sales_invoice_no__sales_invoice_date')
+    ).values('productid', 'week').annotate(
+        quantity=Sum('sale_quantity'),
+        amount=Sum('sale_total_amount')
+    ).values_list('productid', 'week', 'quantity', 'amount')
+
+    rows = list(weekly)
+    quantity = np.zeros((n_products, n_weeks), dtype=np.float64)
+    revenue = np.zeros(n_products, dtype=np.float64)
+
+    if rows and n_products:
+        sale_pids = np.array([r[0] for r in rows], dtype=np.int64)
+        week_idx = np.array([(_as_date(r[1]) - first_week).days // 7 for r in rows], dtype=np.int64)
+        qty = np.array([r[2] or 0 for r in rows], dtype=np.float64)
+        amount = np.array([r[3] or 0 for r in rows], dtype=np.float64)
+
+        product_idx = np.searchsorted(product_ids, sale_pids)
+        valid = (product_idx < n_products) & (week_idx >= 0) & (week_idx < n_weeks)
+        valid[valid] &= product_ids[product_idx[valid]] == sale_pids[valid]
+
+        np.add.at(quantity, (product_idx[valid], week_idx[valid]), qty[valid])
+        revenue = np.bincount(product_idx[valid], weights=amount[valid], minlength=n_products)
+
+    # ABC: rank by revenue, classify on the cumulative share reached before each product
+    total_revenue = revenue.sum()
+    share = revenue / total_revenue if total_revenue > 0 else np.zeros(n_products)
+    order = np.argsort(-revenue, kind='stable')
+    preceding_share = np.empty(n_products)
+    preceding_share[order] = np.cumsum(share[order]) - share[order]
+    abc = np.where(preceding_share < abc_thresholds[0], 'A',
+                   np.where(preceding_share < abc_thresholds[1], 'B', 'C'))
+    abc[revenue <= 0] = 'C'
+
+    # XYZ: coefficient of variation of weekly quantity
+    mean = quantity.mean(axis=1) if n_weeks else np.zeros(n_products)
+    std = quantity.std(axis=1) if n_weeks else np.zeros(n_products)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cv = np.where(mean > 0, std / mean, np.inf)
+    xyz = np.where(cv <= xyz_thresholds[0], 'X', np.where(cv <= xyz_thresholds[1], 'Y', 'Z'))
+    weeks_with_sales = (quantity > 0).sum(axis=1)
+
+    classified_at = timezone.now()
+    classifications = [
+        ProductClassification(
+            productid_id=int(product_ids[i]),
+            abc_class=str(abc[i]),
+            xyz_class=str(xyz[i]),
+            revenue=float(revenue[i]),
+            revenue_share=float(share[i]),
+            demand_cv=float(cv[i]) if np.isfinite(cv[i]) else None,
+            weeks_with_sales=int(weeks_with_sales[i]),
+            classified_at=classified_at
+        )
+        for i in range(n_products)
+    ]
+
+    with transaction.atomic():
+        ProductClassification.objects.all().delete()
+        ProductClassification.objects.bulk_create(classifications, batch_size=1000)
+
+    summary = {'products': n_products, 'weeks': n_weeks, 'start_date': start_date, 'end_date': end_date}
+    for label in ('A', 'B', 'C'):
+        summary[label] = int((abc == label).sum())
+    for label in ('X', 'Y', 'Z'):
+        summary[label] = int((xyz == label).sum())
+    return summary
+
+
+def _as_date(value):
+    """TruncWeek returns a datetime on some backends and a date on others"""
+    return value.date() if hasattr(value, 'date') else value
@@ -0,0 +1,203 @@
+"""
+Full-text product search
+Uses an SQLite FTS5 index mirroring ProductMaster when available and falls
+back to icontains/istartswith filtering on other database backends
+"""
+
+import logging
+import re
+
+from django.db import connection, connections, DEFAULT_DB_ALIAS
+from django.db.models import Q, Case, When, Value, IntegerField
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'core_productmaster_fts'
+
+# Indexed columns and their bm25 weights (higher = more relevant)
+FTS_COLUMNS = (
+    ('product_name', 10.0),
+    ('product_company', 3.0),
+    ('product_salt', 5.0),
+    ('product_packing', 1.0),
+    ('product_category', 1.0),
+    ('product_barcode', 8.0),
+)
+SEARCH_FIELDS = tuple(column for column, _ in FTS_COLUMNS)
+
+_fts_state = {}
+
+
+def _column_list(prefix=''):
+    return ', '.join(f'{prefix}{column}' for column in SEARCH_FIELDS)
+
+
+FTS_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {_column_list()},
+        content='core_productmaster', content_rowid='productid',
+        tokenize="unicode61 remove_diacritics 2", prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON core_productmaster BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_column_list()})
+        VALUES (new.productid, {_column_list('new.')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON core_productmaster BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_column_list()})
+        VALUES ('delete', old.productid, {_column_list('old.')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON core_productmaster BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_column_list()})
+        VALUES ('delete', old.productid, {_column_list('old.')});
+        INSERT INTO {FTS_TABLE}(rowid, {_column_list()})
+        VALUES (new.productid, {_column_list('new.')});
+    END
+    """,
+]
+
+
+def ensure_fts_index(conn=None, rebuild=False):
+    """
+    Create the FTS5 table and its sync triggers if they are missing.
+
+    SQLite drops triggers together with their table, so this is re-run after
+    every migrate (a ProductMaster schema change rebuilds core_productmaster).
+    Returns True when the index is usable on this connection.
+    """
+    conn = conn or connection
+    if conn.vendor != 'sqlite':
+        return False
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='core_productmaster'")
+        if cursor.fetchone() is None:
+            return False
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=%s", [FTS_TABLE])
+        created = cursor.fetchone() is None
+        try:
+            for statement in FTS_SCHEMA:
+                cursor.execute(statement)
+        except Exception as e:
+            # SQLite compiled without FTS5
+            logger.warning("Product full-text index unavailable: %s", e)
+            _fts_state[conn.alias] = False
+            return False
+        if created or rebuild:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('rebuild')")
+
+    _fts_state[conn.alias] = True
+    return True
+
+
+def fts_enabled(using=DEFAULT_DB_ALIAS):
+    """Whether the FTS5 index exists on this database (checked once per process)"""
+    if using not in _fts_state:
+        conn = connections[using]
+        enabled = False
+        if conn.vendor == 'sqlite':
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=%s", [FTS_TABLE])
+                    enabled = cursor.fetchone() is not None
+            except Exception:
+                enabled = False
+        _fts_state[using] = enabled
+    return _fts_state[using]
+
+
+def search_terms(term):
+    """Split a search string into lowercase word tokens"""
+    return re.findall(r'\w+', (term or '').lower())
+
+
+def build_match_query(term, fields=SEARCH_FIELDS):
+    """
+    Build an FTS5 MATCH expression where every word must appear as a word
+    prefix in one of `fields`, e.g. 'para 500' -> {product_name ...} : "para"* "500"*
+    """
+    words = search_terms(term)
+    if not words:
+        return None
+    query = ' '.join(f'"{word}"*' for word in words)
+    if tuple(fields) != SEARCH_FIELDS:
+        query = '{' + ' '.join(fields) + '} : ' + query
+    return query
+
+
+def search_filter(queryset, term, fields=SEARCH_FIELDS, fallback_lookup='icontains'):
+    """
+    Restrict a ProductMaster queryset to products matching every word of `term`.
+
+    With FTS5 this is a single indexed MATCH subquery; otherwise each word
+    is matched with `fallback_lookup` across `fields`.
+    """
+    match = build_match_query(term, fields)
+    if match is None:
+        return queryset
+
+    if fts_enabled(queryset.db):
+        return queryset.filter(productid__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+        ))
+
+    search_filter_q = Q()
+    for word in term.split():
+        word_filter = Q()
+        for field in fields:
+            word_filter |= Q(**{f'{field}__{fallback_lookup}': word})
+        search_filter_q &= word_filter
+    return queryset.filter(search_filter_q)
+
+
+def rank_by_relevance(queryset, term, field='product_name'):
+    """
+    Order a ProductMaster queryset by how well `field` matches `term`:
+    exact match, then prefix, then contains, then everything else, by name.
+    Done in SQL so callers can paginate without loading the full result.
+    """
+    term = (term or '').strip()
+    if not term:
+        return queryset
+    return queryset.annotate(
+        search_rank=Case(
+            When(**{f'{field}__iexact': term}, then=Value(0)),
+            When(**{f'{field}__istartswith': term}, then=Value(1)),
+            When(**{f'{field}__icontains': term}, then=Value(2)),
+            default=Value(3),
+            output_field=IntegerField()
+        )
+    ).order_by('search_rank', field, 'productid')
+
+
+def ranked_product_ids(term, limit=20, fields=SEARCH_FIELDS, using=DEFAULT_DB_ALIAS):
+    """
+    Return product ids matching `term` ordered by bm25 relevance, or None when
+    the FTS index is not available (callers then use search_filter ordering).
+    """
+    if not fts_enabled(using):
+        return None
+    match = build_match_query(term, fields)
+    if match is None:
+        return []
+
+    weights = ', '.join(str(weight) for _, weight in FTS_COLUMNS)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s",
+            [match, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def ensure_product_search_index(sender=None, using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate receiver: restore the FTS table/triggers after schema changes"""
+    ensure_fts_index(connections[using])
@@ -0,0 +1,388 @@
+"""
+Supplier invoice import
+Maps a distributor's invoice spreadsheet (CSV/XLSX) to one InvoiceMaster and
+its PurchaseMaster lines. Products are resolved by barcode or name from one
+prefetch, line rates and the transport split are computed for the whole
+invoice at once (with numpy when it is installed), and the purchases and
+batch sale rates are written with bulk_create / a bulk upsert in a single
+transaction (save_purchase_invoice, shared with the invoice entry form). A file with any bad row is rejected as a whole, with a per-row
+report, so the stored invoice always matches the paper one.
+"""
+
+import csv
+import math
+import re
+from datetime import date
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import redirect, render
+
+try:
+    import numpy as np
+    NUMPY_SUPPORT = True
+except ImportError:
+    NUMPY_SUPPORT = False
+
+from .bulk_upload_views import EXCEL_SUPPORT, iter_file_rows, iter_stored_rows
+from .data_version import PURCHASES, SALE_RATES, bump_version
+from .forms import InvoiceForm
+from .import_jobs import enqueue_import, import_job_response
+from .models import InvoiceMaster, ProductMaster, PurchaseMaster, SaleRateMaster
+from .transport_allocation import DEFAULT_ALLOCATION, line_amounts
+
+if EXCEL_SUPPORT:
+    from openpyxl import Workbook
+
+# Lines accepted from one file
+MAX_IMPORT_LINES = 2000
+
+IMPORT_COLUMNS = [
+    'product_barcode', 'product_name', 'product_company', 'batch_no', 'expiry', 'mrp', 'purchase_rate',
+    'quantity', 'scheme', 'discount', 'igst', 'calculation_mode', 'rate_a', 'rate_b', 'rate_c'
+]
+NUMERIC_COLUMNS = ['mrp', 'purchase_rate', 'quantity', 'scheme', 'discount', 'igst']
+RATE_COLUMNS = ['rate_a', 'rate_b', 'rate_c']
+TEMPLATE_ROWS = [
+    ['8901234567890', 'Paracetamol 500mg', 'ABC Pharma', 'PCM2401', '12-2026', '25', '15.5', '100', '10', '5',
+     '12', 'percentage', '20', '21', '22'],
+    ['', 'Amoxicillin 250mg', 'XYZ Labs', 'AMX118', '0627', '80', '52', '50', '0', '100', '12', 'flat', '', '', ''],
+]
+
+
+def normalize_expiry(value):
+    """
+    Expiry as MM-YYYY from MM-YYYY, MM/YYYY, MMYY, MMYYYY or a spreadsheet
+    date (YYYY-MM-DD); raises ValueError otherwise (same rules as the invoice form)
+    """
+    text = str(value or '').strip()
+    if len(text) == 4 and text.isdigit():
+        text = f"{text[:2]}-20{text[2:]}"
+    elif len(text) == 6 and text.isdigit():
+        text = f"{text[:2]}-{text[2:]}"
+    text = text.replace('/', '-')
+    match = re.match(r'^(\d{1,2})-(\d{4})$', text)
+    if match:
+        month, year = int(match.group(1)), int(match.group(2))
+    else:
+        match = re.match(r'^(\d{4})-(\d{2})-\d{2}', text)
+        if not match:
+            raise ValueError("Use MM-YYYY (e.g. 12-2025)")
+        year, month = int(match.group(1)), int(match.group(2))
+    if not 1 <= month <= 12:
+        raise ValueError("Invalid month")
+    if not 2020 <= year <= 2050:
+        raise ValueError("Invalid year")
+    return f"{month:02d}-{year}"
+
+
+def compute_line_amounts(rates, quantities, discounts, percent_modes, transport_charges, method=DEFAULT_ALLOCATION):
+    """
+    (actual rate per qty, transport share, actual rate with transport, total)
+    lists for all lines: the discount is flat per line or a percentage, and
+    transport is allocated by transport_allocation.line_amounts
+    """
+    if NUMPY_SUPPORT and rates:
+        rate = np.asarray(rates, dtype=float)
+        quantity = np.asarray(quantities, dtype=float)
+        discount = np.asarray(discounts, dtype=float)
+        per_qty = np.where(np.asarray(percent_modes, dtype=bool), rate * (1 - discount / 100), rate - discount / quantity).tolist()
+    else:
+        per_qty = [
+            rate * (1 - discount / 100) if percent else rate - discount / quantity
+            for rate, quantity, discount, percent in zip(rates, quantities, discounts, percent_modes)
+        ]
+    shares, actual, totals = line_amounts(per_qty, quantities, transport_charges, method)
+    return per_qty, shares, actual, totals
+
+
+def save_purchase_invoice(invoice, lines):
+    """
+    Save the unsaved InvoiceMaster `invoice` with its validated lines
+    [(product, batch no, expiry, calculation mode, {numeric column: value},
+    {rate column: value or None})] in one transaction: the purchases with
+    bulk_create, batch sale rates with one upsert, and the invoice total from
+    the lines. Returns the purchases; a duplicate invoice raises IntegrityError.
+    """
+    per_qty, shares, actual, totals = compute_line_amounts(
+        [values['purchase_rate'] for _, _, _, _, values, _ in lines],
+        [values['quantity'] for _, _, _, _, values, _ in lines],
+        [values['discount'] for _, _, _, _, values, _ in lines],
+        [mode != 'flat' for _, _, _, mode, _, _ in lines],
+        invoice.transport_charges or 0,
+        invoice.transport_allocation or DEFAULT_ALLOCATION,
+    )
+
+    with transaction.atomic():
+        invoice.invoice_paid = 0
+        invoice.invoice_total = sum(totals)
+        invoice.save()
+
+        purchases = []
+        sale_rates = {}
+        for index, (product, batch_no, expiry, mode, values, rates) in enumerate(lines):
+            purchases.append(PurchaseMaster(
+                product_supplierid_id=invoice.supplierid_id,
+                product_invoiceid=invoice,
+                product_invoice_no=invoice.invoice_no,
+                productid=product,
+                product_name=product.product_name,
+                product_company=product.product_company,
+                product_packing=product.product_packing,
+                product_batch_no=batch_no,
+                product_expiry=expiry,
+                product_MRP=values['mrp'],
+                product_purchase_rate=values['purchase_rate'],
+                product_quantity=values['quantity'],
+                product_scheme=values['scheme'],
+                product_discount_got=values['discount'],
+                IGST=values['igst'],
+                purchase_calculation_mode=mode,
+                actual_rate_per_qty=per_qty[index],
+                product_transportation_charges=shares[index],
+                product_actual_rate=actual[index],
+                total_amount=totals[index],
+            ))
+            if rates and any(rates.values()):
+                # A batch listed twice keeps the rates of its last line
+                sale_rates[(product.productid, batch_no)] = SaleRateMaster(
+                    productid=product,
+                    product_batch_no=batch_no,
+                    rate_A=rates['rate_a'] or 0,
+                    rate_B=rates['rate_b'] or 0,
+                    rate_C=rates['rate_c'] or 0,
+                )
+
+        PurchaseMaster.objects.bulk_create(purchases, batch_size=500)
+        if sale_rates:
+            SaleRateMaster.objects.bulk_create(
+                list(sale_rates.values()),
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['productid', 'product_batch_no'],
+                update_fields=['rate_A', 'rate_B', 'rate_C'],
+            )
+
+        # bulk_create skips the post_save receivers that bump these
+        bump_version(PURCHASES)
+        if sale_rates:
+            bump_version(SALE_RATES)
+    return purchases
+
+
+def _resolve_products(rows):
+    """
+    Look up every row's product in one query, by barcode first and then by
+    name (narrowed by company when a name is shared). Returns
+    {row number: ProductMaster or error message}.
+    """
+    barcodes = {row['product_barcode'] for _, row in rows if row.get('product_barcode')}
+    names = {row['product_name'].casefold() for _, row in rows if row.get('product_name')}
+    candidates = ProductMaster.objects.annotate(name_key=Lower('product_name')).filter(
+        Q(product_barcode__in=barcodes) | Q(name_key__in=names)
+    ).only('productid', 'product_name', 'product_company', 'product_packing', 'product_barcode')
+
+    by_barcode = {}
+    by_name = {}
+    for product in candidates:
+        if product.product_barcode:
+            by_barcode[product.product_barcode] = product
+        by_name.setdefault(product.product_name.casefold(), []).append(product)
+
+    resolved = {}
+    for row_number, row in rows:
+        barcode = row.get('product_barcode')
+        name = row.get('product_name', '')
+        if barcode and barcode in by_barcode:
+            resolved[row_number] = by_barcode[barcode]
+            continue
+        matches = by_name.get(name.casefold(), [])
+        company = row.get('product_company', '').casefold()
+        if len(matches) > 1 and company:
+            matches = [product for product in matches if product.product_company.casefold() == company]
+        if len(matches) == 1:
+            resolved[row_number] = matches[0]
+        elif matches:
+            resolved[row_number] = f"Several products are named {name}; add the company or barcode"
+        else:
+            resolved[row_number] = f"Product not found: {barcode or name or 'no barcode or name given'}"
+    return resolved
+
+
+def _parse_line(row):
+    """Validated numbers, expiry and rates of one row; raises ValueError with the reason"""
+    if not row.get('batch_no'):
+        raise ValueError("Batch number is required")
+    if len(row['batch_no']) > PurchaseMaster._meta.get_field('product_batch_no').max_length:
+        raise ValueError("Batch number is too long")
+    if not row.get('expiry'):
+        raise ValueError("Expiry date is required")
+    try:
+        expiry = normalize_expiry(row['expiry'])
+    except ValueError as e:
+        raise ValueError(f"Invalid expiry date: {e}")
+
+    try:
+        values = {column: float(row.get(column) or 0) for column in NUMERIC_COLUMNS}
+        rates = {column: float(row[column]) if row.get(column) else None for column in RATE_COLUMNS}
+    except ValueError:
+        raise ValueError("Numbers expected in mrp, purchase_rate, quantity, scheme, discount, igst and rate columns")
+    # float() also accepts nan/inf, which slip past the range checks below
+    if not all(math.isfinite(value) for value in [*values.values(), *(rate for rate in rates.values() if rate is not None)]):
+        raise ValueError("Numbers in mrp, purchase_rate, quantity, scheme, discount, igst and rate columns must be finite")
+
+    mode = (row.get('calculation_mode') or 'flat').lower()
+    if mode in ('percent', '%'):
+        mode = 'percentage'
+    if mode not in ('flat', 'percentage'):
+        raise ValueError("calculation_mode must be flat or percentage")
+    if values['quantity'] <= 0:
+        raise ValueError("Quantity must be greater than 0")
+    if values['purchase_rate'] <= 0:
+        raise ValueError("Purchase rate must be greater than 0")
+    if mode == 'flat' and values['discount'] > values['purchase_rate'] * values['quantity']:
+        raise ValueError("Flat discount cannot exceed total amount")
+    if mode == 'percentage' and values['discount'] > 100:
+        raise ValueError("Percentage discount cannot exceed 100%")
+    return expiry, mode, values, rates
+
+
+def import_purchase_invoice(invoice, rows):
+    """
+    Save the unsaved InvoiceMaster `invoice` with the spreadsheet's
+    (row number, {column: text}) lines. Returns (invoice or None, errors); when
+    any row has an error nothing is written.
+    """
+    rows = [(row_number, row) for row_number, row in rows if any(row.values())]
+    if not rows:
+        return None, [{'row': None, 'error': 'The file has no invoice lines'}]
+    if len(rows) > MAX_IMPORT_LINES:
+        return None, [{'row': None, 'error': f'At most {MAX_IMPORT_LINES} lines can be imported at once'}]
+
+    products = _resolve_products(rows)
+    errors = []
+    lines = []
+    for row_number, row in rows:
+        product = products[row_number]
+        if isinstance(product, str):
+            errors.append({'row': row_number, 'error': product})
+            continue
+        try:
+            lines.append((product, row['batch_no']) + _parse_line(row))
+        except ValueError as e:
+            errors.append({'row': row_number, 'error': f"{product.product_name}: {e}"})
+    if errors:
+        return None, errors
+
+    try:
+        save_purchase_invoice(invoice, lines)
+    except IntegrityError:
+        return None, [{'row': None, 'error': f'Invoice {invoice.invoice_no} already exists for this supplier'}]
+    return invoice, []
+
+
+def purchase_invoice_import_job(job):
+    """ImportJob handler for kind 'purchase_invoice'; the whole file is one chunk, like the page import"""
+    def process(rows, result):
+        invoice = InvoiceMaster(
+            invoice_no=job.params['invoice_no'],
+            invoice_date=date.fromisoformat(job.params['invoice_date']),
+            supplierid_id=job.params['supplierid'],
+            transport_charges=job.params['transport_charges'],
+            transport_allocation=job.params.get('transport_allocation', DEFAULT_ALLOCATION),
+        )
+        invoice, errors = import_purchase_invoice(invoice, rows)
+        if invoice is None:
+            result['error_count'] += len(errors)
+            result['errors'] += errors
+        else:
+            result['created'] += len(rows)
+            result['invoice_id'] = invoice.invoiceid
+
+    return (lambda: iter_stored_rows(job.file, job.filename, IMPORT_COLUMNS)), process
+
+
+@login_required
+def import_purchase_invoice_view(request):
+    """Create a purchase invoice from a supplier's spreadsheet"""
+    errors = []
+    if request.method == 'POST':
+        data = request.POST.copy()
+        # The total comes from the imported lines
+        data.setdefault('invoice_total', '0')
+        invoice_form = InvoiceForm(data)
+        file = request.FILES.get('file')
+
+        invoice = None
+
+        if not file:
+            errors.append({'row': None, 'error': 'Please select a file to upload'})
+        elif not file.name.endswith(('.csv', '.xlsx')):
+            errors.append({'row': None, 'error': 'Invalid file format. Please upload a CSV or Excel (.xlsx) file'})
+        elif not invoice_form.is_valid():
+            # Field errors are shown next to the fields; a duplicate invoice number is a form-wide error
+            errors = [{'row': None, 'error': error} for error in invoice_form.non_field_errors()]
+        elif request.POST.get('background'):
+            job = enqueue_import('purchase_invoice', file, params={
+                'invoice_no': invoice_form.cleaned_data['invoice_no'],
+                'invoice_date': invoice_form.cleaned_data['invoice_date'].isoformat(),
+                'supplierid': invoice_form.cleaned_data['supplierid'].pk,
+                'transport_charges': invoice_form.cleaned_data['transport_charges'] or 0,
+                'transport_allocation': invoice_form.cleaned_data['transport_allocation'],
+            }, user=request.user)
+            return import_job_response(request, job)
+        else:
+            try:
+                rows = iter_file_rows(file, file.name, IMPORT_COLUMNS)
+                invoice, errors = import_purchase_invoice(invoice_form.save(commit=False), rows)
+            except Exception as e:
+                errors = [{'row': None, 'error': f'Error processing file: {str(e)}'}]
+
+        if request.GET.get('format') == 'json':
+            if invoice is None:
+                return JsonResponse({'success': False, 'errors': errors,
+                                     'form_errors': invoice_form.errors.get_json_data()}, status=400)
+            return JsonResponse({'success': True, 'invoice_id': invoice.invoiceid,
+                                 'invoice_total': invoice.invoice_total})
+        if invoice is not None:
+            messages.success(request, f"Purchase Invoice #{invoice.invoice_no} imported successfully!")
+            return redirect('invoice_detail', pk=invoice.invoiceid)
+    else:
+        invoice_form = InvoiceForm()
+
+    context = {
+        'invoice_form': invoice_form,
+        'errors': errors,
+        'max_lines': MAX_IMPORT_LINES,
+        'title': 'Import Purchase Invoice'
+    }
+    return render(request, 'purchases/invoice_import.html', context)
+
+
+@login_required
+def download_purchase_import_template(request):
+    if request.GET.get('format') == 'excel':
+        if not EXCEL_SUPPORT:
+            messages.error(request, 'Excel support not available. Please use CSV format.')
+            return redirect('import_purchase_invoice')
+        wb = Workbook()
+        ws = wb.active
+        ws.title = 'Invoice Lines'
+        ws.append(IMPORT_COLUMNS)
+        for row in TEMPLATE_ROWS:
+            ws.append(row)
+        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response['Content-Disposition'] = 'attachment; filename="purchase_invoice_template.xlsx"'
+        wb.save(response)
+        return response
+
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="purchase_invoice_template.csv"'
+    writer = csv.writer(response)
+    writer.writerow(IMPORT_COLUMNS)
+    writer.writerows(TEMPLATE_ROWS)
+    return response
@@ -0,0 +1,126 @@
+"""
+Bulk sale-rate revision
+Revises rate_A/B/C of every SaleRateMaster batch of a company, category and/or
+list of products: by a percentage, by a fixed amount, or to a fixed amount.
+The preview annotates the very expressions the revision writes, and the
+revision itself is one set-based UPDATE in a transaction followed by a
+SALE_RATES version bump, so cached rates (barcode lookups, exports) refresh.
+"""
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Greatest, Round
+from django.http import JsonResponse
+from django.shortcuts import redirect, render
+
+from .data_version import SALE_RATES, bump_version
+from .forms import SaleRateRevisionForm
+from .models import SaleRateMaster
+
+# Batches listed in the preview
+PREVIEW_ROWS = 50
+
+
+def revision_queryset(product_company='', product_category='', products=None):
+    """Batch rates of the matching products"""
+    rates = SaleRateMaster.objects.all()
+    if product_company:
+        rates = rates.filter(productid__product_company__iexact=product_company.strip())
+    if product_category:
+        rates = rates.filter(productid__product_category__iexact=product_category.strip())
+    if products:
+        rates = rates.filter(productid__in=products)
+    return rates
+
+
+def revised_rate(field, mode, value):
+    """Database expression for the new value of rate `field`, rounded to paise and never negative"""
+    if mode == 'set':
+        return Value(round(value, 2), output_field=FloatField())
+    if mode == 'percent':
+        expression = F(field) * (1 + value / 100)
+    else:
+        expression = F(field) + value
+    return Round(Greatest(expression, Value(0.0), output_field=FloatField()), 2)
+
+
+def preview_revision(rates, fields, mode, value, limit=PREVIEW_ROWS):
+    """(number of batches, first `limit` batches annotated with new_rate_A/B/C)"""
+    sample = rates.select_related('productid').annotate(
+        **{f'new_{field}': revised_rate(field, mode, value) for field in fields}
+    ).order_by('productid__product_name', 'product_batch_no')[:limit]
+    return rates.count(), list(sample)
+
+
+def apply_revision(rates, fields, mode, value):
+    """Revise the rates in one UPDATE; returns the number of batches changed"""
+    with transaction.atomic():
+        updated = rates.update(**{field: revised_rate(field, mode, value) for field in fields})
+        if updated:
+            # update() skips the SaleRateMaster post_save receiver
+            bump_version(SALE_RATES)
+    return updated
+
+
+def _preview_json(count, sample, fields):
+    return {
+        'success': True,
+        'count': count,
+        'rows': [
+            {
+                'id': rate.id,
+                'product_name': rate.productid.product_name,
+                'product_company': rate.productid.product_company,
+                'product_batch_no': rate.product_batch_no,
+                **{field: getattr(rate, field) for field in fields},
+                **{f'new_{field}': getattr(rate, f'new_{field}') for field in fields},
+            }
+            for rate in sample
+        ],
+    }
+
+
+@login_required
+def revise_sale_rates(request):
+    """Preview (action=preview) or apply (action=apply) a bulk sale-rate revision"""
+    wants_json = request.GET.get('format') == 'json'
+    context = {'title': 'Revise Sale Rates'}
+
+    if request.method == 'POST':
+        form = SaleRateRevisionForm(request.POST)
+        if form.is_valid():
+            data = form.cleaned_data
+            rates = revision_queryset(data['product_company'], data['product_category'], data['products'])
+
+            if request.POST.get('action') == 'apply':
+                if request.user.user_type.lower() not in ['admin']:
+                    if wants_json:
+                        return JsonResponse({'success': False, 'error': "You don't have permission to perform this action."}, status=403)
+                    messages.error(request, "You don't have permission to perform this action.")
+                    return redirect('revise_sale_rates')
+                updated = apply_revision(rates, data['rates'], data['mode'], data['value'])
+                if wants_json:
+                    return JsonResponse({'success': True, 'updated': updated})
+                messages.success(request, f"Sale rates revised for {updated} batches")
+                return redirect('sale_rate_list')
+
+            count, sample = preview_revision(rates, data['rates'], data['mode'], data['value'])
+            if wants_json:
+                return JsonResponse(_preview_json(count, sample, data['rates']))
+            context.update({
+                'count': count,
+                'preview_rows': [
+                    (rate, [(getattr(rate, field), getattr(rate, f'new_{field}')) for field in data['rates']])
+                    for rate in sample
+                ],
+                'rate_labels': [dict(form.RATE_CHOICES)[field] for field in data['rates']],
+            })
+        elif wants_json:
+            return JsonResponse({'success': False, 'errors': form.errors.get_json_data()}, status=400)
+    else:
+        form = SaleRateRevisionForm()
+
+    context['form'] = form
+    return render(request, 'rates/sale_rate_revision.html', context)
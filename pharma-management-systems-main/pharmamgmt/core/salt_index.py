@@ -0,0 +1,177 @@
+"""
+Salt / composition index for substitute lookup
+product_salt is free text ("Amoxycillin 500mg + Clavulanic Acid 125 MG",
+"PARACETAMOL IP 0.5 G"); it is parsed into sorted ingredient/strength pairs
+and stored in ProductSaltIndex so same-salt products are an indexed equality match
+"""
+
+import re
+
+from django.db import transaction
+from django.db.models import Case, When, Value, IntegerField, FloatField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import ProductMaster, ProductSaltIndex, PurchaseMaster
+from .utils import annotate_current_stock
+
+# product_salt values that mean "unknown"
+EMPTY_SALTS = {'', '0', '-', 'na', 'n a', 'nil', 'none', 'not available', 'demo'}
+
+# Pharmacopoeia / dosage form words that don't change the composition
+NOISE_WORDS = {'ip', 'bp', 'usp', 'ep', 'tab', 'tabs', 'tablet', 'tablets', 'cap', 'caps', 'capsule',
+               'capsules', 'syrup', 'syp', 'inj', 'injection', 'each', 'contains', 'film', 'coated'}
+
+# Spelling variants seen in Indian labelling
+SALT_SYNONYMS = {
+    'acetaminophen': 'paracetamol',
+    'amoxycillin': 'amoxicillin',
+    'potassium clavulanate': 'clavulanic acid',
+    'clavulanate potassium': 'clavulanic acid',
+    'diluted potassium clavulanate': 'clavulanic acid',
+    'cetirizine hydrochloride': 'cetirizine',
+    'cetrizine': 'cetirizine',
+    'pantoprazole sodium': 'pantoprazole',
+    'azithromycin dihydrate': 'azithromycin',
+}
+
+# Strength units converted to a common base (mass -> mg)
+UNIT_SCALE = {'mg': 1, 'g': 1000, 'gm': 1000, 'gms': 1000, 'mcg': 0.001, 'ug': 0.001, 'µg': 0.001}
+UNIT_ALIASES = {'iu': 'iu', 'ml': 'ml', '%': '%'}
+
+COMPONENT_SPLIT_RE = re.compile(r'\+|,|;|&|\band\b')
+STRENGTH_RE = re.compile(
+    r'(?<![a-z\d.])(\d+(?:\.\d+)?)\s*(mg|mcg|µg|ug|gms|gm|g|iu|ml|%)?'
+    r'(?:\s*/\s*(\d+(?:\.\d+)?)?\s*(ml|g|gm|tab|cap)\b)?',
+    re.IGNORECASE
+)
+
+
+def _format_number(value):
+    return format(round(value, 4), 'g')
+
+
+def _parse_strength(match):
+    number = float(match.group(1))
+    # A bare number ("PARACETAMOL 650") is a strength in mg
+    unit = (match.group(2) or 'mg').lower()
+    if unit in UNIT_SCALE:
+        strength = f'{_format_number(number * UNIT_SCALE[unit])}mg'
+    else:
+        strength = f'{_format_number(number)}{UNIT_ALIASES.get(unit, "")}'
+    if match.group(4):
+        per = match.group(3) or '1'
+        strength += f'/{_format_number(float(per))}{match.group(4).lower().replace("gm", "g")}'
+    return strength
+
+
+def parse_salt(text):
+    """
+    Parse a salt string into a sorted list of (ingredient, strength) tuples.
+    strength is '' when none is given; returns [] for placeholder values.
+    """
+    text = (text or '').strip().lower()
+    if re.sub(r'[^a-z0-9]+', ' ', text).strip() in EMPTY_SALTS:
+        return []
+
+    # "0.1% w/w" -> "0.1%"
+    text = re.sub(r'\bw\s*/\s*[wv]\b', ' ', text)
+
+    components = []
+    for part in COMPONENT_SPLIT_RE.split(text):
+        # Drop "(as trihydrate)" style qualifiers
+        part = re.sub(r'\([^)]*\)', ' ', part)
+        match = STRENGTH_RE.search(part)
+        strength = _parse_strength(match) if match else ''
+        name_part = STRENGTH_RE.sub(' ', part)
+        words = [w for w in re.findall(r'[a-z][a-z0-9]*', name_part) if w not in NOISE_WORDS]
+        if not words:
+            continue
+        name = ' '.join(words)
+        name = SALT_SYNONYMS.get(name, name)
+        components.append((name, strength))
+    return sorted(set(components))
+
+
+def salt_keys(text):
+    """Return (salt_key, ingredients_key) for a salt string, or (None, None)"""
+    components = parse_salt(text)
+    if not components:
+        return None, None
+    salt_key = '+'.join(f'{name} {strength}'.strip() for name, strength in components)
+    ingredients_key = '+'.join(sorted({name for name, _ in components}))
+    return salt_key[:300], ingredients_key[:300]
+
+
+def index_product_salt(product):
+    """Create/refresh/remove the ProductSaltIndex row for one product"""
+    salt_key, ingredients_key = salt_keys(product.product_salt)
+    if salt_key is None:
+        ProductSaltIndex.objects.filter(productid=product.pk).delete()
+        return None
+    ProductSaltIndex.objects.update_or_create(
+        productid_id=product.pk,
+        defaults={'salt_key': salt_key, 'ingredients_key': ingredients_key}
+    )
+    return salt_key
+
+
+def rebuild_salt_index(product_ids=None):
+    """Rebuild ProductSaltIndex for all products (or only `product_ids`); returns rows written"""
+    products = ProductMaster.objects.all()
+    if product_ids is not None:
+        products = products.filter(productid__in=product_ids)
+
+    rows = []
+    for productid, salt in products.values_list('productid', 'product_salt').iterator(chunk_size=5000):
+        salt_key, ingredients_key = salt_keys(salt)
+        if salt_key is not None:
+            rows.append(ProductSaltIndex(productid_id=productid, salt_key=salt_key, ingredients_key=ingredients_key))
+
+    with transaction.atomic():
+        if product_ids is None:
+            ProductSaltIndex.objects.all().delete()
+        else:
+            ProductSaltIndex.objects.filter(productid__in=product_ids).delete()
+        ProductSaltIndex.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def find_substitutes(product, same_strength=False, in_stock_only=True, limit=20):
+    """
+    Products with the same ingredients as `product`, with current stock and the
+    latest purchase MRP, fetched in a single query. Exact-strength matches rank
+    first, then higher stock, then lower MRP.
+    """
+    salt_key, ingredients_key = salt_keys(product.product_salt)
+    if salt_key is None:
+        return []
+
+    latest_mrp = PurchaseMaster.objects.filter(
+        productid=OuterRef('productid')
+    ).order_by('-purchase_entry_date').values('product_MRP')[:1]
+
+    substitutes = ProductMaster.objects.exclude(productid=product.pk)
+    if same_strength:
+        substitutes = substitutes.filter(salt_index__salt_key=salt_key)
+    else:
+        substitutes = substitutes.filter(salt_index__ingredients_key=ingredients_key)
+
+    substitutes = annotate_current_stock(substitutes).annotate(
+        mrp=Coalesce(Subquery(latest_mrp, output_field=FloatField()), Value(0.0)),
+        same_strength=Case(
+            When(salt_index__salt_key=salt_key, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField()
+        )
+    )
+    if in_stock_only:
+        substitutes = substitutes.filter(current_stock__gt=0)
+
+    return list(substitutes.select_related('salt_index').order_by(
+        '-same_strength', '-current_stock', 'mrp', 'product_name'
+    )[:limit])
+
+
+def update_salt_index(sender, instance, **kwargs):
+    """post_save receiver for ProductMaster"""
+    index_product_salt(instance)
@@ -409,6 +409,85 @@ class StockManager:
                 'available_stock': 0
             }
     
+    @staticmethod
+    def expiry_sort_key(expiry):
+        """
+        Sort key for MM-YYYY (or YYYY-MM-DD) expiry values; unparsable ones sort last
+        """
+        expiry_str = str(expiry or '').strip()
+        parts = expiry_str.split('-')
+        try:
+            if len(parts) == 2 and len(parts[1]) == 4:
+                return (int(parts[1]), int(parts[0]))
+            if len(parts) == 3 and len(parts[0]) == 4:
+                return (int(parts[0]), int(parts[1]))
+        except ValueError:
+            pass
+        return (9999, 12)
+    
+    @staticmethod
+    def get_fefo_batches(product_id):
+        """
+        Batches of a product in FEFO order (first expiring first), with stock.
+        Uses one grouped query per movement table instead of per-batch queries.
+        """
+        batches = StockManager.get_purchased_batches(product_id)
+        for batch_no, quantity in StockManager.get_sold_quantities(product_id).items():
+            batch = batches.get(batch_no)
+            if batch is not None:
+                batch['stock'] -= quantity
+        return StockManager.fefo_order(batches.values())
+    
+    @staticmethod
+    def fefo_order(batches):
+        return sorted(batches, key=lambda b: (StockManager.expiry_sort_key(b['expiry']), b['batch_no']))
+    
+    @staticmethod
+    def get_purchased_batches(product_id):
+        """
+        {batch_no: {'batch_no', 'expiry', 'mrp', 'stock'}} with stock counting
+        purchases and purchase returns only; changes only with purchase data
+        """
+        batches = {}
+        for row in PurchaseMaster.objects.filter(productid=product_id).values(
+            'product_batch_no'
+        ).annotate(total=Sum('product_quantity')):
+            batches[row['product_batch_no']] = {'batch_no': row['product_batch_no'], 'stock': row['total'] or 0}
+        
+        if not batches:
+            return {}
+        
+        # Latest purchase row of each batch supplies expiry and MRP
+        for row in PurchaseMaster.objects.filter(productid=product_id).order_by(
+            'purchase_entry_date', 'purchaseid'
+        ).values('product_batch_no', 'product_expiry', 'product_MRP'):
+            batches[row['product_batch_no']].update({
+                'expiry': row['product_expiry'],
+                'mrp': float(row['product_MRP'] or 0)
+            })
+        
+        for row in ReturnPurchaseMaster.objects.filter(returnproductid=product_id).values(
+            'returnproduct_batch_no'
+        ).annotate(total=Sum('returnproduct_quantity')):
+            batch = batches.get(row['returnproduct_batch_no'])
+            if batch is not None:
+                batch['stock'] -= row['total'] or 0
+        return batches
+    
+    @staticmethod
+    def get_sold_quantities(product_id):
+        """{batch_no: quantity sold net of sales returns}, in one query"""
+        sold = SalesMaster.objects.filter(productid=product_id).values(
+            batch_no=F('product_batch_no')
+        ).annotate(total=Sum('sale_quantity'))
+        returned = ReturnSalesMaster.objects.filter(return_productid=product_id).values(
+            batch_no=F('return_product_batch_no')
+        ).annotate(total=-Sum('return_sale_quantity'))
+        quantities = {}
+        for row in sold.union(returned, all=True):
+            quantities[row['batch_no']] = quantities.get(row['batch_no'], 0) + (row['total'] or 0)
+        return quantities
+    
     @staticmethod
     def get_low_stock_products(threshold=10):
         """
@@ -3,8 +3,10 @@ Stock validation utilities for sales operations
 Handles stock checking with edit mode support
 """
 
+from django.db.models import F, Sum
+
 from .utils import get_batch_stock_status
-from .models import SalesMaster
+from .models import PurchaseMaster, ReturnPurchaseMaster, ReturnSalesMaster, SalesMaster
 
 
 def validate_sale_stock(product_id, batch_no, required_quantity, exclude_sale_id=None):
@@ -115,4 +117,76 @@ def validate_edit_sale_stock(sale_id, new_product_id, new_batch_no, new_quantity
             'valid': False,
             'available_stock': 0,
             'message': f'Validation error: {str(e)}'
-        }
\ No newline at end of file
+        }
+
+
+def batch_stock_levels(keys, exclude_sale_ids=None):
+    """
+    Current stock of many (product_id, batch_no) pairs in one query:
+    purchased - sold - purchase returns + sales returns, as get_batch_stock_status
+    computes it for a single batch. Returns {(product_id, batch_no): stock}.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    product_ids = {product_id for product_id, _ in keys}
+    batch_nos = {batch_no for _, batch_no in keys}
+
+    def movements(model, product_field, batch_field, quantity_field, sign, exclude=None):
+        rows = model.objects.filter(**{f'{product_field}__in': product_ids, f'{batch_field}__in': batch_nos})
+        if exclude:
+            rows = rows.exclude(id__in=exclude)
+        return rows.order_by().values(product=F(product_field), batch=F(batch_field)).annotate(
+            quantity=Sum(quantity_field) * sign
+        )
+
+    # One UNION ALL of the four grouped sums; the filters above match a superset of `keys`
+    rows = movements(PurchaseMaster, 'productid', 'product_batch_no', 'product_quantity', 1).union(
+        movements(SalesMaster, 'productid', 'product_batch_no', 'sale_quantity', -1, exclude_sale_ids),
+        movements(ReturnPurchaseMaster, 'returnproductid', 'returnproduct_batch_no', 'returnproduct_quantity', -1),
+        movements(ReturnSalesMaster, 'return_productid', 'return_product_batch_no', 'return_sale_quantity', 1),
+        all=True,
+    )
+    stock = dict.fromkeys(keys, 0)
+    for row in rows:
+        key = (row['product'], row['batch'])
+        if key in stock:
+            stock[key] += row['quantity'] or 0
+    return stock
+
+
+def validate_sale_lines(lines, exclude_sale_ids=None):
+    """
+    Validate the stock of all lines of a sales invoice at once
+
+    Args:
+        lines: (product, batch_no, quantity) per line; product is a ProductMaster
+        exclude_sale_ids: Sale IDs to leave out of the stock (for edit mode)
+
+    Returns:
+        list: None for a line that can be sold, else the error message.
+        Lines of the same batch draw on its stock in order, so a batch entered
+        twice cannot be oversold.
+    """
+    try:
+        stock = batch_stock_levels(
+            [(product.productid, batch_no) for product, batch_no, _ in lines], exclude_sale_ids
+        )
+    except Exception as e:
+        return [f'Error checking stock: {str(e)}'] * len(lines)
+
+    remaining = dict(stock)
+    errors = []
+    for product, batch_no, quantity in lines:
+        key = (product.productid, batch_no)
+        if stock[key] <= 0:
+            errors.append(f"Product {product.product_name} batch {batch_no} is out of stock.")
+        elif remaining[key] < quantity:
+            errors.append(
+                f"Insufficient stock for {product.product_name} batch {batch_no}. "
+                f"Available: {remaining[key]}, Required: {quantity}"
+            )
+        else:
+            remaining[key] -= quantity
+            errors.append(None)
+    return errors
@@ -0,0 +1,81 @@
+"""
+Purchase transport charge allocation
+Spreads invoice.transport_charges over the PurchaseMaster lines of an invoice:
+
+    equal     every line carries the same share (the historical behaviour)
+    value     shares in proportion to line value (actual_rate_per_qty * quantity)
+    quantity  shares in proportion to quantity, i.e. the same charge per unit
+
+The method is stored per invoice (InvoiceMaster.transport_allocation).
+line_amounts() does the arithmetic for lines that are not saved yet (invoice
+entry and import); allocate_transport() reapplies the invoice's method to its
+saved lines with one read and one bulk_update, whatever the number of lines
+"""
+
+from django.db import transaction
+
+from .data_version import PURCHASES, bump_version
+from .models import InvoiceMaster, PurchaseMaster
+
+ALLOCATION_METHODS = tuple(method for method, _ in InvoiceMaster.TRANSPORT_ALLOCATION_CHOICES)
+DEFAULT_ALLOCATION = 'equal'
+
+
+def transport_shares(transport_charges, rates, quantities, method=DEFAULT_ALLOCATION):
+    """Transport share of each line, given its actual rate per qty and quantity"""
+    if method not in ALLOCATION_METHODS:
+        raise ValueError(f"Unknown transport allocation '{method}'")
+    if not rates or not transport_charges or transport_charges <= 0:
+        return [0.0] * len(rates)
+
+    if method == 'value':
+        weights = [rate * quantity for rate, quantity in zip(rates, quantities)]
+    elif method == 'quantity':
+        weights = list(quantities)
+    else:
+        weights = [1.0] * len(rates)
+    total_weight = sum(weights)
+    if not total_weight:
+        # Nothing to weigh by; fall back to an equal split
+        weights, total_weight = [1.0] * len(rates), float(len(rates))
+    return [transport_charges * weight / total_weight for weight in weights]
+
+
+def line_amounts(rates, quantities, transport_charges, method=DEFAULT_ALLOCATION):
+    """
+    (transport share, actual rate with transport, total) lists for lines with
+    actual rate per qty `rates`; a line's share is spread over its quantity
+    """
+    shares = transport_shares(transport_charges, rates, quantities, method)
+    actual = [rate + (share / quantity if quantity else 0.0) for rate, quantity, share in zip(rates, quantities, shares)]
+    totals = [rate * quantity + share for rate, quantity, share in zip(rates, quantities, shares)]
+    return shares, actual, totals
+
+
+def allocate_transport(invoice):
+    """
+    Redistribute the transport charges of `invoice` over its purchase lines
+    using the invoice's allocation method. Returns the number of lines updated.
+    """
+    lines = list(PurchaseMaster.objects.filter(product_invoiceid=invoice).only(
+        'purchaseid', 'actual_rate_per_qty', 'product_quantity'
+    ))
+    shares, actual, totals = line_amounts(
+        [line.actual_rate_per_qty for line in lines],
+        [line.product_quantity for line in lines],
+        invoice.transport_charges or 0,
+        invoice.transport_allocation or DEFAULT_ALLOCATION,
+    )
+    for line, share, rate, total in zip(lines, shares, actual, totals):
+        line.product_transportation_charges = share
+        line.product_actual_rate = rate
+        line.total_amount = total
+
+    if lines:
+        with transaction.atomic():
+            PurchaseMaster.objects.bulk_update(
+                lines, ['product_transportation_charges', 'product_actual_rate', 'total_amount'], batch_size=500
+            )
+            # bulk_update skips the PurchaseMaster post_save receiver
+            bump_version(PURCHASES)
+    return len(lines)
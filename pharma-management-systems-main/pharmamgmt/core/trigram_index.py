@@ -0,0 +1,306 @@
+"""
+In-process trigram index for typo-tolerant product search
+Product names and salts are split into pg_trgm style trigrams ("  p", " pa",
+"par", ...) held in memory; a query is scored by how many of its trigrams
+each product shares, so "paracetmol" still finds PARACETAMOL.
+Each worker builds the index lazily, applies its own product saves
+incrementally and rebuilds it in the background when the 'products' data
+version moves past those saves, so products written by other workers show up too
+"""
+
+import logging
+import re
+import threading
+from collections import Counter
+
+from django.db import connection, transaction
+
+from .data_version import PRODUCTS, get_version
+from .models import ProductMaster
+
+try:
+    import numpy as np
+    NUMPY_SUPPORT = True
+except ImportError:
+    NUMPY_SUPPORT = False
+
+TRIGRAM_FIELDS = ('product_name', 'product_salt')
+
+# Minimum share of the query's trigrams a product must contain
+DEFAULT_THRESHOLD = 0.4
+
+logger = logging.getLogger(__name__)
+
+
+def trigrams(text):
+    """Return the set of trigrams of every word in `text` (words padded like pg_trgm)"""
+    grams = set()
+    for word in re.findall(r'\w+', (text or '').lower()):
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class _Postings:
+    """Trigram -> slot postings for one generation of the index"""
+
+    def __init__(self):
+        self.slots = {}          # productid -> slot
+        self.slot_ids = []       # slot -> productid (None once deleted)
+        self.slot_grams = []     # slot -> frozenset of trigram ids
+        self.gram_ids = {}       # trigram -> id
+        self.postings = []       # trigram id -> set of slots
+        self.arrays = {}         # trigram id -> cached numpy array of slots
+        self.free_slots = []
+
+    def gram_id(self, gram):
+        gid = self.gram_ids.get(gram)
+        if gid is None:
+            gid = len(self.postings)
+            self.gram_ids[gram] = gid
+            self.postings.append(set())
+        return gid
+
+    def add(self, productid, text):
+        gids = frozenset(self.gram_id(gram) for gram in trigrams(text))
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.slot_ids[slot] = productid
+            self.slot_grams[slot] = gids
+        else:
+            slot = len(self.slot_ids)
+            self.slot_ids.append(productid)
+            self.slot_grams.append(gids)
+        self.slots[productid] = slot
+        for gid in gids:
+            self.postings[gid].add(slot)
+            self.arrays.pop(gid, None)
+
+    def remove(self, productid):
+        slot = self.slots.pop(productid, None)
+        if slot is None:
+            return
+        for gid in self.slot_grams[slot]:
+            self.postings[gid].discard(slot)
+            self.arrays.pop(gid, None)
+        self.slot_ids[slot] = None
+        self.slot_grams[slot] = frozenset()
+        self.free_slots.append(slot)
+
+    def posting_array(self, gid):
+        array = self.arrays.get(gid)
+        if array is None:
+            array = np.fromiter(self.postings[gid], dtype=np.int64, count=len(self.postings[gid]))
+            self.arrays[gid] = array
+        return array
+
+
+class TrigramIndex:
+    """
+    Trigram -> product postings for one or more ProductMaster text fields.
+
+    Each product gets a slot; postings hold slot numbers. Queries count shared
+    trigrams per slot with numpy.bincount over the query's postings (a Counter
+    when numpy is missing), so scoring cost depends on how common the query's
+    trigrams are rather than on catalog size.
+    """
+
+    def __init__(self, fields=TRIGRAM_FIELDS):
+        self.fields = tuple(fields)
+        self._lock = threading.RLock()
+        self._build_lock = threading.RLock()   # one build at a time
+        self._state = _Postings()
+        self._built = False
+        self._version = None
+        self._own_updates = 0     # incremental updates applied since _version was read
+        self._pending = None      # updates made while a rebuild reads the catalog
+        self._reloading = False
+
+    @property
+    def built(self):
+        return self._built
+
+    @property
+    def version(self):
+        return self._version
+
+    def __len__(self):
+        return len(self._state.slots)
+
+    def _document(self, values):
+        return ' '.join(str(value) for value in values if value)
+
+    def build(self):
+        """
+        (Re)load the whole catalog into fresh postings and swap them in;
+        queries keep using the current postings until the swap
+        """
+        with self._build_lock:
+            version = get_version(PRODUCTS, max_age=0)
+            with self._lock:
+                self._pending = []
+            try:
+                rows = list(ProductMaster.objects.values_list('productid', *self.fields))
+                state = _Postings()
+                for row in rows:
+                    state.add(row[0], self._document(row[1:]))
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                # Replay the updates that raced the read so the swap does not lose them
+                for productid, text in self._pending:
+                    state.remove(productid)
+                    if text is not None:
+                        state.add(productid, text)
+                # Bumps behind these updates may or may not be in `version`; counting
+                # none of them at worst costs one extra rebuild
+                self._own_updates = 0
+                self._pending = None
+                self._state = state
+                self._version = version
+                self._built = True
+            return len(state.slots)
+
+    def _is_current(self):
+        """
+        True when the products version only moved by this worker's own
+        incremental updates, which the postings already contain
+        """
+        current = get_version(PRODUCTS)
+        with self._lock:
+            if current <= self._version + self._own_updates:
+                if current == self._version + self._own_updates:
+                    self._version, self._own_updates = current, 0
+                return True
+        return False
+
+    def ensure_built(self):
+        """
+        Build the index on first use; once built, a version change by another
+        process triggers a background rebuild and queries keep using the
+        current postings meanwhile
+        """
+        if not self._built:
+            with self._build_lock:
+                if not self._built:
+                    self.build()
+            return
+        if self._reloading or self._is_current():
+            return
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(target=self._rebuild, daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            self.build()
+        except Exception:
+            logger.exception("Trigram index rebuild failed")
+        finally:
+            self._reloading = False
+            connection.close()
+
+    def _apply(self, changes):
+        """
+        Apply incremental changes [(productid, text), ...] (text None removes
+        the product); together they account for one products version bump
+        """
+        with self._lock:
+            for productid, text in changes:
+                self._state.remove(productid)
+                if text is not None:
+                    self._state.add(productid, text)
+            if self._pending is not None:
+                self._pending.extend(changes)
+            else:
+                self._own_updates += 1
+
+    def update(self, product):
+        """Re-index one ProductMaster instance (no-op until the index is built)"""
+        self.update_many([product])
+
+    def update_many(self, products):
+        """Re-index products written by one bulk operation that bumps the products version once"""
+        if not self._built:
+            return
+        self._apply([
+            (product.pk, self._document(getattr(product, field) for field in self.fields))
+            for product in products
+        ])
+
+    def remove(self, productid):
+        if not self._built:
+            return
+        self._apply([(productid, None)])
+
+    def search(self, query, limit=10, threshold=DEFAULT_THRESHOLD):
+        """
+        Return [(productid, score), ...] best first.
+
+        score is the fraction of the query's trigrams found in the product;
+        ties are broken by trigram similarity (shared / union) so shorter,
+        closer names come first.
+        """
+        self.ensure_built()
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        with self._lock:
+            state = self._state
+            gids = [state.gram_ids[gram] for gram in query_grams if gram in state.gram_ids]
+            if not gids:
+                return []
+            min_shared = max(1, int(threshold * len(query_grams) + 0.999999))
+            n_query = len(query_grams)
+
+            if NUMPY_SUPPORT:
+                hits = np.concatenate([state.posting_array(gid) for gid in gids])
+                counts = np.bincount(hits, minlength=len(state.slot_ids))
+                slots = np.flatnonzero(counts >= min_shared)
+                if not len(slots):
+                    return []
+                shared = counts[slots].astype(np.float64)
+                sizes = np.fromiter((len(state.slot_grams[s]) for s in slots), dtype=np.float64, count=len(slots))
+                score = shared / n_query
+                similarity = shared / (n_query + sizes - shared)
+                order = np.lexsort((-similarity, -score))[:limit]
+                return [
+                    (state.slot_ids[slots[i]], round(float(score[i]), 3))
+                    for i in order
+                ]
+
+            counts = Counter()
+            for gid in gids:
+                counts.update(state.postings[gid])
+            candidates = []
+            for slot, shared in counts.items():
+                if shared >= min_shared:
+                    size = len(state.slot_grams[slot])
+                    candidates.append((shared / n_query, shared / (n_query + size - shared), slot))
+            candidates.sort(reverse=True)
+            return [(state.slot_ids[slot], round(score, 3)) for score, _, slot in candidates[:limit]]
+
+
+product_trigram_index = TrigramIndex()
+
+
+def fuzzy_search_products(query, limit=10, threshold=DEFAULT_THRESHOLD):
+    """Typo-tolerant product search over name and salt, best match first"""
+    return product_trigram_index.search(query, limit=limit, threshold=threshold)
+
+
+def update_trigram_index(sender, instance, **kwargs):
+    """post_save receiver for ProductMaster (applied once the write commits)"""
+    transaction.on_commit(lambda: product_trigram_index.update(instance))
+
+
+def remove_from_trigram_index(sender, instance, **kwargs):
+    """post_delete receiver for ProductMaster (applied once the delete commits)"""
+    productid = instance.pk
+    transaction.on_commit(lambda: product_trigram_index.remove(productid))
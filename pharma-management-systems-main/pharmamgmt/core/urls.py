@@ -3,6 +3,15 @@ from . import views
 from .combined_invoice_view import add_invoice_with_products, get_existing_batches, cleanup_duplicate_batches
 from .low_stock_views import low_stock_update, update_low_stock_item, bulk_update_low_stock, get_batch_suggestions
 from .bulk_upload_views import bulk_upload_products, download_product_template
+from .picker_views import product_picker_api, customer_picker_api, supplier_picker_api, product_catalog_snapshot
+from .csv_exports import export_sales_csv, export_purchases_csv, export_inventory_csv, export_payments_csv
+from .invoice_pdf import sales_invoice_pdf, purchase_invoice_pdf
+from .batch_print import batch_print_sales
+from .export_jobs import start_export, export_job_detail, export_job_status, export_job_download
+from .import_jobs import import_job_detail, import_job_status, import_job_resume
+from .party_import import import_parties_view, download_party_template
+from .rate_revision import revise_sale_rates
+from .purchase_import import import_purchase_invoice_view, download_purchase_import_template
 
 urlpatterns = [
     # Authentication
@@ -37,6 +46,7 @@ urlpatterns = [
     # Suppliers
     path('suppliers/', views.supplier_list, name='supplier_list'),
     path('suppliers/add/', views.add_supplier, name='add_supplier'),
+    path('suppliers/import/', import_parties_view, {'kind': 'suppliers'}, name='import_suppliers'),
     path('suppliers/<int:pk>/', views.supplier_detail, name='supplier_detail'),
     path('suppliers/<int:pk>/update/', views.update_supplier, name='update_supplier'),
     path('suppliers/<int:pk>/delete/', views.delete_supplier, name='delete_supplier'),
@@ -44,6 +54,7 @@ urlpatterns = [
     # Customers
     path('customers/', views.customer_list, name='customer_list'),
     path('customers/add/', views.add_customer, name='add_customer'),
+    path('customers/import/', import_parties_view, {'kind': 'customers'}, name='import_customers'),
     path('customers/<int:pk>/', views.customer_detail, name='customer_detail'),
     path('customers/<int:pk>/update/', views.update_customer, name='update_customer'),
     path('customers/<int:pk>/delete/', views.delete_customer, name='delete_customer'),
@@ -52,8 +63,11 @@ urlpatterns = [
     path('invoices/', views.invoice_list, name='invoice_list'),
     path('invoices/add/', views.add_invoice, name='add_invoice'),
     path('invoices/add-with-products/', views.add_invoice_with_products, name='add_invoice_with_products'),
+    path('invoices/import/', import_purchase_invoice_view, name='import_purchase_invoice'),
+    path('invoices/import/template/', download_purchase_import_template, name='download_purchase_import_template'),
 
     path('invoices/<int:pk>/', views.invoice_detail, name='invoice_detail'),
+    path('invoices/<int:pk>/pdf/', purchase_invoice_pdf, name='purchase_invoice_pdf'),
     path('invoices/<int:pk>/edit/', views.edit_invoice, name='edit_invoice'),
     path('invoices/<int:pk>/delete/', views.delete_invoice, name='delete_invoice'),
     path('invoices/<int:invoice_id>/add-purchase/', views.add_purchase, name='add_purchase'),
@@ -67,9 +81,11 @@ urlpatterns = [
     path('sales/', views.sales_invoice_list, name='sales_invoice_list'),
     path('sales/add/', views.add_sales_invoice, name='add_sales_invoice'),
     path('sales/add-with-products/', views.add_sales_invoice_with_products, name='add_sales_invoice_with_products'),
+    path('sales/batch-print/', batch_print_sales, name='batch_print_sales'),
     path('sales/<str:pk>/', views.sales_invoice_detail, name='sales_invoice_detail'),
     path('sales/<str:pk>/edit/', views.edit_sales_invoice, name='edit_sales_invoice'),
     path('sales/<str:pk>/print/', views.print_sales_bill, name='print_sales_bill'),
+    path('sales/<str:pk>/pdf/', sales_invoice_pdf, name='sales_invoice_pdf'),
     path('sales/<str:pk>/print-receipt/', views.print_receipt, name='print_receipt'),
     path('sales/<str:pk>/delete/', views.delete_sales_invoice, name='delete_sales_invoice'),
     path('sales/<str:invoice_id>/add-sale/', views.add_sale, name='add_sale'),
@@ -119,7 +135,7 @@ urlpatterns = [
     path('get-product-info/', views.get_product_info, name='get_product_info'),
     path('api/product-info/', views.get_product_info, name='get_product_info_api'),
     path('api/product-by-barcode/', views.get_product_by_barcode, name='get_product_by_barcode'),
-    path('api/export-inventory/', views.export_inventory_csv, name='export_inventory_csv'),
+    path('api/export-inventory/', export_inventory_csv, name='export_inventory_csv'),
     path('api/sales-analytics/', views.get_sales_analytics_api, name='get_sales_analytics_api'),
 
     
@@ -128,16 +144,31 @@ urlpatterns = [
     path('export/inventory/excel/', views.export_inventory_excel, name='export_inventory_excel'),
     path('export/sales/pdf/', views.export_sales_pdf, name='export_sales_pdf'),
     path('export/sales/excel/', views.export_sales_excel, name='export_sales_excel'),
+    path('export/sales/csv/', export_sales_csv, name='export_sales_csv'),
     path('export/purchases/pdf/', views.export_purchases_pdf, name='export_purchases_pdf'),
     # path('export/purchases/excel/', views.export_purchases_excel, name='export/financial/pdf/', views.export_financial_pdf, name='export_financial_pdf'),
     path('export/purchases/excel/', views.export_purchases_excel, name='export_purchases_excel'),
+    path('export/purchases/csv/', export_purchases_csv, name='export_purchases_csv'),
 path('export/financial/pdf/', views.export_financial_pdf, name='export_financial_pdf'),
 
     path('export/financial/excel/', views.export_financial_excel, name='export_financial_excel'),
     
+    # Background export queue
+    path('exports/jobs/<str:token>/', export_job_detail, name='export_job_detail'),
+    path('exports/jobs/<str:token>/status/', export_job_status, name='export_job_status'),
+    path('exports/jobs/<str:token>/download/', export_job_download, name='export_job_download'),
+    path('exports/<str:kind>/', start_export, name='start_export'),
+
+    # Background import queue
+    path('imports/jobs/<str:token>/', import_job_detail, name='import_job_detail'),
+    path('imports/jobs/<str:token>/status/', import_job_status, name='import_job_status'),
+    path('imports/jobs/<str:token>/resume/', import_job_resume, name='import_job_resume'),
+    path('imports/<str:kind>/template/', download_party_template, name='download_party_template'),
+    
     # Sale Rate Management
     path('rates/', views.sale_rate_list, name='sale_rate_list'),
     path('rates/add/', views.add_sale_rate, name='add_sale_rate'),
+    path('rates/revise/', revise_sale_rates, name='revise_sale_rates'),
     path('rates/<int:pk>/update/', views.update_sale_rate, name='update_sale_rate'),
     path('rates/<int:pk>/delete/', views.delete_sale_rate, name='delete_sale_rate'),
     
@@ -146,6 +177,12 @@ path('export/financial/pdf/', views.export_financial_pdf, name='export_financial
     path('api/batch-details/', views.get_batch_details, name='get_batch_details'),
     path('api/product-batch-selector/', views.get_product_batch_selector, name='api_product_batch_selector'),
     path('api/search-products/', views.search_products_api, name='search_products_api'),
+    path('api/product-autocomplete/', views.product_autocomplete_api, name='product_autocomplete_api'),
+    path('api/product-substitutes/', views.product_substitutes_api, name='product_substitutes_api'),
+    path('api/picker/products/', product_picker_api, name='product_picker_api'),
+    path('api/picker/customers/', customer_picker_api, name='customer_picker_api'),
+    path('api/picker/suppliers/', supplier_picker_api, name='supplier_picker_api'),
+    path('api/product-catalog/', product_catalog_snapshot, name='product_catalog_snapshot'),
     path('api/customer-rate-info/', views.get_customer_rate_info, name='api_customer_rate_info'),
     path('api/get-batch-rates/', views.get_batch_rates, name='get_batch_rates'),
     path('api/update-purchase-return/', views.update_purchase_return_api, name='update_purchase_return_api'),
@@ -169,6 +206,7 @@ path('export/financial/pdf/', views.export_financial_pdf, name='export_financial
     path('payments/<int:pk>/delete/', views.delete_payment, name='delete_payment'),
     path('payments/export-pdf/', views.export_payments_pdf, name='export_payments_pdf'),
     path('payments/export-excel/', views.export_payments_excel, name='export_payments_excel'),
+    path('payments/export-csv/', export_payments_csv, name='export_payments_csv'),
     
     # Finance - Receipts
     path('receipts/', views.receipt_list, name='receipt_list'),
@@ -169,24 +169,20 @@ def get_stock_status(product_id):
 
 def generate_invoice_pdf(invoice):
     """
-    Generate a PDF for purchase invoice
-    Note: This is a placeholder function. In a real implementation, 
-    you would use a PDF library like ReportLab or WeasyPrint
+    PDF bytes for a purchase invoice (InvoiceMaster or its id); served from the
+    invoice PDF cache unless the invoice changed since it was last drawn
     """
-    # In a real implementation, you would create a PDF here
-    # For now, this is just a placeholder
-    return None
+    from .invoice_pdf import purchase_invoice_pdf_bytes
+    return purchase_invoice_pdf_bytes(getattr(invoice, 'invoiceid', invoice))[0]
 
 
 def generate_sales_invoice_pdf(invoice):
     """
-    Generate a PDF for sales invoice
-    Note: This is a placeholder function. In a real implementation, 
-    you would use a PDF library like ReportLab or WeasyPrint
+    PDF bytes for a sales invoice (SalesInvoiceMaster or its number); served
+    from the invoice PDF cache unless the invoice changed since it was last drawn
     """
-    # In a real implementation, you would create a PDF here
-    # For now, this is just a placeholder
-    return None
+    from .invoice_pdf import sales_invoice_pdf_bytes
+    return sales_invoice_pdf_bytes(getattr(invoice, 'sales_invoice_no', invoice))[0]
 
 
 def generate_sales_invoice_number():
@@ -404,6 +400,36 @@ def get_bulk_inventory_data(product_ids=None, search_query=None, limit=None):
     
     return products_with_stock
 
+def annotate_current_stock(products_query):
+    """
+    Annotate a ProductMaster queryset with total_purchased, total_sold,
+    total_purchase_returns, total_sales_returns and current_stock using
+    correlated subqueries, so stock comes back in the same query
+    """
+    from django.db.models import Subquery, OuterRef, Value, FloatField
+    from django.db.models.functions import Coalesce
+    
+    def total(model, product_field, quantity_field):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(**{product_field: OuterRef('productid')})
+                .values(product_field)
+                .annotate(total=Sum(quantity_field))
+                .values('total')[:1],
+                output_field=FloatField()
+            ), Value(0.0), output_field=FloatField()
+        )
+    
+    return products_query.annotate(
+        total_purchased=total(PurchaseMaster, 'productid', 'product_quantity'),
+        total_sold=total(SalesMaster, 'productid', 'sale_quantity'),
+        total_purchase_returns=total(ReturnPurchaseMaster, 'returnproductid', 'returnproduct_quantity'),
+        total_sales_returns=total(ReturnSalesMaster, 'return_productid', 'return_sale_quantity'),
+    ).annotate(
+        # Stock = Purchased - Sold - Purchase Returns + Sales Returns
+        current_stock=F('total_purchased') - F('total_sold') - F('total_purchase_returns') + F('total_sales_returns')
+    )
+
 def normalize_expiry_date(expiry_input):
     """
     Normalize expiry date to consistent format
@@ -530,3 +556,78 @@ def get_inventory_batches_info(product_id):
         print(f"Error processing inventory for {product_id}: {[str(e)]}")
     
     return batches
+
+
+def get_inventory_page_info(product_ids):
+    """
+    Stock and batch details for a page of products in a fixed number of
+    grouped queries (instead of get_stock_status + get_inventory_batches_info
+    per product).
+    Returns {product_id: {'current_stock': ..., 'batches': [...]}}; batches have
+    the same shape and order as get_inventory_batches_info().
+    """
+    from django.db.models import Min
+    from .models import SaleRateMaster
+    
+    product_ids = list(product_ids)
+    info = {pid: {'current_stock': 0, 'batches': []} for pid in product_ids}
+    if not product_ids:
+        return info
+    
+    # (product, batch) -> batch dict, in first purchase order
+    batches = {}
+    first_purchase_ids = {}
+    for row in PurchaseMaster.objects.filter(productid__in=product_ids).values(
+        'productid', 'product_batch_no'
+    ).annotate(total=Sum('product_quantity'), first_id=Min('purchaseid')).order_by('first_id'):
+        key = (row['productid'], row['product_batch_no'])
+        total = row['total'] or 0
+        batches[key] = {
+            'batch_no': row['product_batch_no'],
+            'expiry': '',
+            'stock': total,
+            'mrp': 0,
+            'rates': {'rate_A': 0, 'rate_B': 0, 'rate_C': 0}
+        }
+        first_purchase_ids[row['first_id']] = key
+        info[row['productid']]['current_stock'] += total
+    
+    # MRP and expiry come from the first purchase row of each batch
+    for row in PurchaseMaster.objects.filter(purchaseid__in=list(first_purchase_ids)).values(
+        'purchaseid', 'product_expiry', 'product_MRP'
+    ):
+        batch = batches[first_purchase_ids[row['purchaseid']]]
+        batch['expiry'] = row['product_expiry']
+        batch['mrp'] = row['product_MRP']
+    
+    # Stock = Purchased - Sold - Purchase Returns + Sales Returns; movements on
+    # batches never purchased still count towards the product total
+    movements = [
+        (SalesMaster, 'productid', 'product_batch_no', 'sale_quantity', -1),
+        (ReturnPurchaseMaster, 'returnproductid', 'returnproduct_batch_no', 'returnproduct_quantity', -1),
+        (ReturnSalesMaster, 'return_productid', 'return_product_batch_no', 'return_sale_quantity', 1),
+    ]
+    for model, product_field, batch_field, quantity_field, sign in movements:
+        for row in model.objects.filter(**{f'{product_field}__in': product_ids}).values(
+            product_field, batch_field
+        ).annotate(total=Sum(quantity_field)).order_by():
+            quantity = sign * (row['total'] or 0)
+            info[row[product_field]]['current_stock'] += quantity
+            batch = batches.get((row[product_field], row[batch_field]))
+            if batch is not None:
+                batch['stock'] += quantity
+    
+    for row in SaleRateMaster.objects.filter(productid__in=product_ids).values(
+        'productid', 'product_batch_no', 'rate_A', 'rate_B', 'rate_C'
+    ):
+        batch = batches.get((row['productid'], row['product_batch_no']))
+        if batch is not None:
+            batch['rates'] = {
+                'rate_A': float(row['rate_A'] or 0),
+                'rate_B': float(row['rate_B'] or 0),
+                'rate_C': float(row['rate_C'] or 0)
+            }
+    
+    for (productid, _), batch in batches.items():
+        info[productid]['batches'].append(batch)
+    return info
@@ -27,9 +27,20 @@ from .forms import (
     PurchaseReturnInvoiceForm, PurchaseReturnForm, SalesReturnInvoiceForm, SalesReturnForm,
     SaleRateForm, SalesReturnPaymentForm, PaymentForm, ReceiptForm
 )
-from .utils import get_stock_status, get_batch_stock_status, generate_invoice_pdf, generate_sales_invoice_pdf, get_avg_mrp, parse_expiry_date, generate_sales_invoice_number
+from .invoice_pdf import sale_line_amounts
+from .utils import get_stock_status, get_batch_stock_status, generate_invoice_pdf, generate_sales_invoice_pdf, get_avg_mrp, parse_expiry_date, generate_sales_invoice_number, get_inventory_page_info
 from .date_utils import parse_ddmmyyyy_date, format_date_for_display, format_date_for_backend, convert_legacy_dates
 from .low_stock_views import low_stock_update, update_low_stock_item, bulk_update_low_stock
+from .product_search import search_filter as product_search_filter, ranked_product_ids, rank_by_relevance
+from .trigram_index import fuzzy_search_products
+from .autocomplete_index import product_autocomplete_index
+from .salt_index import find_substitutes, salt_keys
+from .barcode_cache import barcode_cache
+from .pagination import KeysetPaginator, CachedCountPaginator, keyset_json
+from .picker_views import product_catalog_url
+from .transport_allocation import ALLOCATION_METHODS, allocate_transport
+from .stock_validation import validate_sale_lines
+from .data_version import SALES, bump_version
 # Authentication views
 def login_view(request):
     if request.user.is_authenticated:
@@ -334,61 +345,47 @@ def product_list(request):
     
     if sort_by == 'name':
         products = ProductMaster.objects.all().order_by('product_name')
+    elif sort_by == 'class':
+        # A before B before C, highest revenue first within a class; unclassified last
+        products = ProductMaster.objects.all().order_by(
+            F('classification__abc_class').asc(nulls_last=True),
+            F('classification__revenue').desc(nulls_last=True),
+            'product_name'
+        )
     else:
         products = ProductMaster.objects.all().order_by('productid')
 
+    products = products.select_related('classification')
+
+    # ABC/XYZ class filters (populated by the classify_products job)
+    abc_filter = request.GET.get('abc', '').strip().upper()
+    xyz_filter = request.GET.get('xyz', '').strip().upper()
+    if abc_filter in ('A', 'B', 'C'):
+        products = products.filter(classification__abc_class=abc_filter)
+    if xyz_filter in ('X', 'Y', 'Z'):
+        products = products.filter(classification__xyz_class=xyz_filter)
+
     # Enhanced search functionality
     search_query = request.GET.get('search', '').strip()
     if search_query:
-        # Split search query into words for better matching
-        search_words = search_query.split()
-        
-        # Start with all products
-        search_filter = Q()
-        
-        # For each word, create OR conditions across all fields
-        for word in search_words:
-            word_filter = (
-                Q(product_name__icontains=word) |
-                Q(product_company__icontains=word) |
-                Q(product_salt__icontains=word) |
-                Q(product_packing__icontains=word) |
-                Q(product_category__icontains=word) |
-                Q(product_barcode__icontains=word)
-            )
-            search_filter &= word_filter  # AND between words
+        # Every word must match one of name/company/salt/packing/category/barcode
+        # (FTS5 index when available, icontains otherwise)
+        products = product_search_filter(products, search_query)
         
-        products = products.filter(search_filter)
-        
-        # Sort by relevance: exact matches first, then startswith, then contains
-        products = sorted(products, key=lambda p: (
-            not p.product_name.lower().startswith(search_query.lower()),
-            not search_query.lower() in p.product_name.lower(),
-            p.product_name.lower()
-        ))
-        
-        # Convert back to queryset for pagination
-        product_ids = [p.productid for p in products]
-        products = ProductMaster.objects.filter(productid__in=product_ids)
-        # Preserve the sorted order
-        products = sorted(products, key=lambda p: product_ids.index(p.productid))
+        # Sort by relevance in the query: exact name, then prefix, then contains
+        products = rank_by_relevance(products, search_query)
     
     # Pagination first to limit the number of products processed
     paginator = Paginator(products, 30)  # 30 products per page
     page_number = request.GET.get('page')
     products_page = paginator.get_page(page_number)
     
-    # Add stock and batch information to products
+    # Add stock and batch information to products (grouped queries for the whole page)
+    page_info = get_inventory_page_info(product.productid for product in products_page)
     for product in products_page:
         try:
-            from .utils import get_inventory_batches_info
-            
-            # Get stock status
-            stock_info = get_stock_status(product.productid)
-            product.current_stock = stock_info.get('current_stock', 0)
-            
-            # Get all batches information with rates and MRP
-            product.batches_info = get_inventory_batches_info(product.productid)
+            product.current_stock = page_info[product.productid]['current_stock']
+            product.batches_info = page_info[product.productid]['batches']
             
             # Set primary batch info for backward compatibility
             if product.batches_info:
@@ -416,6 +413,8 @@ def product_list(request):
         'products': products_page,
         'search_query': search_query,
         'sort_by': sort_by,
+        'abc_filter': abc_filter,
+        'xyz_filter': xyz_filter,
         'title': 'Product List'
     }
     return render(request, 'products/product_list.html', context)
@@ -483,94 +482,6 @@ def product_detail(request, pk):
     }
     return render(request, 'products/product_detail.html', context)
 
-@login_required
-def bulk_upload_products(request):
-    # Check if user is admin (case-insensitive)
-    if not request.user.user_type.lower() in ['admin']:
-        messages.error(request, "You don't have permission to access this page.")
-        return redirect('product_list')
-    
-    if request.method == 'POST':
-        csv_file = request.FILES.get('csv_file')
-        
-        if not csv_file:
-            messages.error(request, "Please select a CSV file.")
-            return redirect('bulk_upload_products')
-        
-        if not csv_file.name.endswith('.csv'):
-            messages.error(request, "File must be a CSV.")
-            return redirect('bulk_upload_products')
-        
-        # Process CSV file
-        try:
-            decoded_file = csv_file.read().decode('utf-8').splitlines()
-            reader = csv.DictReader(decoded_file)
-            
-            success_count = 0
-            error_count = 0
-            errors = []
-            
-            for row in reader:
-                try:
-                    # Create or update product
-                    product, created = ProductMaster.objects.update_or_create(
-                        product_name=row.get('product_name', '').strip(),
-                        product_company=row.get('product_company', '').strip(),
-                        defaults={
-                            'product_packing': row.get('product_packing', '').strip(),
-                            'product_salt': row.get('product_salt', '').strip(),
-                            'product_category': row.get('product_category', '').strip(),
-                            'product_hsn': row.get('product_hsn', '').strip(),
-                            'product_hsn_percent': row.get('product_hsn_percent', '').strip(),
-                        }
-                    )
-                    success_count += 1
-                except Exception as e:
-                    error_count += 1
-                    errors.append(f"Error on row {reader.line_num}: {str(e)}")
-            
-            if success_count > 0:
-                messages.success(request, f"Successfully processed {success_count} products.")
-            
-            if error_count > 0:
-                messages.warning(request, f"Encountered {error_count} errors during import.")
-                for error in errors[:10]:  # Show first 10 errors
-                    messages.error(request, error)
-                if len(errors) > 10:
-                    messages.error(request, f"... and {len(errors) - 10} more errors.")
-            
-            return redirect('product_list')
-            
-        except Exception as e:
-            messages.error(request, f"Error processing CSV file: {str(e)}")
-            return redirect('bulk_upload_products')
-    
-    # Generate a sample CSV for download
-    if request.GET.get('sample'):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="product_template.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'product_name', 'product_company', 'product_packing', 
-            'product_salt', 'product_category', 'product_hsn', 
-            'product_hsn_percent'
-        ])
-        
-        # Add sample row
-        writer.writerow([
-            'Paracetamol 500mg', 'ABC Pharma', '10x10',
-            'Paracetamol', 'Analgesic', '30049099',
-            '12'
-        ])
-        
-        return response
-    
-    context = {
-        'title': 'Bulk Upload Products'
-    }
-    return render(request, 'products/bulk_upload.html', context)
-
 @login_required
 def delete_product(request, pk):
     # Check if user is admin (case-insensitive)
@@ -917,7 +828,7 @@ def delete_customer(request, pk):
 # Purchase Invoice views
 @login_required
 def invoice_list(request):
-    invoices = InvoiceMaster.objects.all().order_by('-invoice_date')
+    invoices = InvoiceMaster.objects.select_related('supplierid')
     
     # Search functionality
     search_query = request.GET.get('search', '')
@@ -939,10 +850,18 @@ def invoice_list(request):
         except ValueError:
             messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
     
-    # Pagination
-    paginator = Paginator(invoices, 10)
-    page_number = request.GET.get('page')
-    invoices = paginator.get_page(page_number)
+    # Pagination (keyset on invoice_date, invoiceid; no COUNT/OFFSET)
+    invoices = KeysetPaginator(invoices, 10, 'invoice_date').get_page(request.GET.get('cursor'), request.GET)
+    
+    if request.GET.get('format') == 'json':
+        return JsonResponse(keyset_json(invoices, lambda invoice: {
+            'id': invoice.invoiceid,
+            'invoice_no': invoice.invoice_no,
+            'invoice_date': invoice.invoice_date.strftime('%Y-%m-%d'),
+            'supplier': invoice.supplierid.supplier_name,
+            'invoice_total': float(invoice.invoice_total),
+            'invoice_paid': float(invoice.invoice_paid),
+        }))
     
     context = {
         'invoices': invoices,
@@ -987,13 +906,25 @@ def edit_invoice(request, pk):
         invoice.supplierid_id = request.POST.get('supplierid')
         invoice.scroll_no = request.POST.get('scroll_no') or ''
         invoice.transport_charges = float(request.POST.get('transport_charges', 0))
+        transport_allocation = request.POST.get('transport_allocation')
+        if transport_allocation:
+            if transport_allocation not in ALLOCATION_METHODS:
+                raise ValueError(f"Unknown transport allocation '{transport_allocation}'")
+            invoice.transport_allocation = transport_allocation
         
         # Process products data if provided
+        products = None
         products_data = request.POST.get('products_data')
         if products_data:
             try:
                 products = json.loads(products_data)
-                
+            except json.JSONDecodeError:
+                pass  # If products_data is invalid, just update basic fields
+        
+        with transaction.atomic():
+            invoice.save()
+            
+            if products is not None:
                 # Get existing products for this invoice
                 existing_products = list(PurchaseMaster.objects.filter(product_invoiceid=invoice))
                 
@@ -1055,19 +986,16 @@ def edit_invoice(request, pk):
                             
                     except ProductMaster.DoesNotExist:
                         continue
-
-                
-                # Recalculate invoice total
-                new_total = PurchaseMaster.objects.filter(product_invoiceid=invoice).aggregate(
+            
+            # Spread transport charges over the lines; they or the charges may have changed
+            line_count = allocate_transport(invoice)
+            
+            # Recalculate invoice total (an invoice without lines keeps the total entered)
+            if products is not None or line_count:
+                invoice.invoice_total = PurchaseMaster.objects.filter(product_invoiceid=invoice).aggregate(
                     total=Sum('total_amount')
                 )['total'] or 0
-                
-                invoice.invoice_total = new_total
-                
-            except json.JSONDecodeError:
-                pass  # If products_data is invalid, just update basic fields
-        
-        invoice.save()
+                invoice.save(update_fields=['invoice_total'])
         
         messages.success(request, f'Invoice #{invoice.invoice_no} updated successfully!')
         
@@ -1098,10 +1026,6 @@ def invoice_detail(request, pk):
     # Get all payments for this invoice
     payments = InvoicePaid.objects.filter(ip_invoiceid=pk).order_by('-payment_date')
     
-    # Get suppliers and products for modal
-    suppliers = SupplierMaster.objects.all().order_by('supplier_name')
-    products = ProductMaster.objects.all().order_by('product_name')
-    
     context = {
         'invoice': invoice,
         'purchases': purchases,
@@ -1109,8 +1033,8 @@ def invoice_detail(request, pk):
         'purchases_total': purchases_total,
         'invoice_pending': invoice_pending,
         'has_pending_entries': abs(invoice_pending) > 0.01,  # Using a small threshold to account for floating-point errors
-        'suppliers': suppliers,
-        'products': products,
+        # The edit modal loads suppliers/products from the picker APIs
+        'catalog_url': product_catalog_url(),
         'title': f'Purchase Invoice #{invoice.invoice_no}'
     }
     return render(request, 'purchases/invoice_detail.html', context)
@@ -1169,37 +1093,12 @@ def add_purchase(request, invoice_id):
                 }
                 return render(request, 'purchases/purchase_form.html', context)
             
-            # Calculate and distribute transport charges
-            if invoice.transport_charges > 0:
-                # Count existing products plus this new one
-                existing_purchases = list(PurchaseMaster.objects.filter(product_invoiceid=invoice))
-                total_products = len(existing_purchases) + 1
-                
-                # Calculate transport share per product
-                transport_share_per_product = invoice.transport_charges / total_products
-                
-                # Update this product's transport charges
-                purchase.product_transportation_charges = transport_share_per_product
-                
-                # Add the transport share to the actual rate
-                transport_per_unit = transport_share_per_product / purchase.product_quantity
-                purchase.product_actual_rate = purchase.actual_rate_per_qty + transport_per_unit
-                
-                # Recalculate total amount with transport charges included
-                purchase.total_amount = purchase.product_actual_rate * purchase.product_quantity
-                
-                # Update existing products to redistribute transport charges
-                for prev_purchase in existing_purchases:
-                    prev_purchase.product_transportation_charges = transport_share_per_product
-                    transport_per_unit = transport_share_per_product / prev_purchase.product_quantity
-                    prev_purchase.product_actual_rate = prev_purchase.actual_rate_per_qty + transport_per_unit
-                    prev_purchase.total_amount = prev_purchase.product_actual_rate * prev_purchase.product_quantity
-                    prev_purchase.save()
-            else:
-                purchase.product_transportation_charges = 0
-            
+            purchase.product_transportation_charges = 0
             purchase.save()
             
+            # Redistribute transport charges over all lines, this one included
+            allocate_transport(invoice)
+            
             # Save batch-specific sale rates to SaleRateMaster
             rate_A = form.cleaned_data.get('rate_A')
             rate_B = form.cleaned_data.get('rate_B')
@@ -1319,43 +1218,13 @@ def edit_purchase(request, invoice_id, purchase_id):
                 }
                 return render(request, 'purchases/purchase_form.html', context)
             
-            # Calculate and distribute transport charges
-            if invoice.transport_charges > 0:
-                # Get all purchases for this invoice excluding the current one
-                other_purchases = list(PurchaseMaster.objects.filter(
-                    product_invoiceid=invoice
-                ).exclude(
-                    purchaseid=purchase_id
-                ))
-                
-                total_products = len(other_purchases) + 1
-                
-                # Calculate transport share per product
-                transport_share_per_product = invoice.transport_charges / total_products
-                
-                # Update this product's transport charges
-                purchase.product_transportation_charges = transport_share_per_product
-                
-                # Add transport share to actual rate
-                transport_per_unit = transport_share_per_product / purchase.product_quantity
-                purchase.product_actual_rate = purchase.actual_rate_per_qty + transport_per_unit
-                
-                # Recalculate total amount with transport charges included
-                purchase.total_amount = purchase.product_actual_rate * purchase.product_quantity
-                
-                # Update other products to redistribute transport charges
-                for other_purchase in other_purchases:
-                    other_purchase.product_transportation_charges = transport_share_per_product
-                    other_transport_per_unit = transport_share_per_product / other_purchase.product_quantity
-                    other_purchase.product_actual_rate = other_purchase.actual_rate_per_qty + other_transport_per_unit
-                    other_purchase.total_amount = other_purchase.product_actual_rate * other_purchase.product_quantity
-                    other_purchase.save()
-            else:
-                purchase.product_transportation_charges = 0
-                purchase.total_amount = base_total
-            
+            purchase.product_transportation_charges = 0
+            purchase.total_amount = base_total
             purchase.save()
             
+            # Redistribute transport charges over all lines, this one included
+            allocate_transport(invoice)
+            
             # Only recalculate invoice total if quantity or rate changed, not for expiry date changes
             # Check if this is just an expiry date change
             old_purchase_data = PurchaseMaster.objects.get(purchaseid=purchase_id)
@@ -1368,8 +1237,9 @@ def edit_purchase(request, invoice_id, purchase_id):
             
             # Only update invoice total if it's not just an expiry date change
             if not is_expiry_only_change:
-                all_purchases = PurchaseMaster.objects.filter(product_invoiceid=invoice)
-                new_invoice_total = sum(p.total_amount for p in all_purchases)
+                new_invoice_total = PurchaseMaster.objects.filter(product_invoiceid=invoice).aggregate(
+                    total=Sum('total_amount')
+                )['total'] or 0
                 invoice.invoice_total = new_invoice_total
                 invoice.save()
             
@@ -1455,34 +1325,15 @@ def delete_purchase(request, invoice_id, purchase_id):
     if request.method == 'POST':
         product_name = purchase.product_name
         try:
-            # Before deleting, check if we need to redistribute transport charges
-            if invoice.transport_charges > 0:
-                # Get all other purchases for this invoice
-                other_purchases = list(PurchaseMaster.objects.filter(
-                    product_invoiceid=invoice
-                ).exclude(
-                    purchaseid=purchase_id
-                ))
-                
-                # If there are other purchases, redistribute transport charges
-                if other_purchases:
-                    # Calculate new transport share per product
-                    transport_share_per_product = invoice.transport_charges / len(other_purchases)
-                    
-                    # Update all other products with new transport charges
-                    for other_purchase in other_purchases:
-                        other_purchase.product_transportation_charges = transport_share_per_product
-                        transport_per_unit = transport_share_per_product / other_purchase.product_quantity
-                        other_purchase.product_actual_rate = other_purchase.actual_rate_per_qty + transport_per_unit
-                        other_purchase.total_amount = other_purchase.product_actual_rate * other_purchase.product_quantity
-                        other_purchase.save()
-            
-            # Now delete the purchase
             purchase.delete()
             
+            # Redistribute transport charges over the remaining lines
+            allocate_transport(invoice)
+            
             # Recalculate and update invoice total
-            remaining_purchases = PurchaseMaster.objects.filter(product_invoiceid=invoice)
-            new_total = sum(p.total_amount for p in remaining_purchases)
+            new_total = PurchaseMaster.objects.filter(product_invoiceid=invoice).aggregate(
+                total=Sum('total_amount')
+            )['total'] or 0
             invoice.invoice_total = new_total
             invoice.save()
             
@@ -1734,7 +1585,7 @@ def delete_invoice(request, pk):
 # Sales Invoice views
 @login_required
 def sales_invoice_list(request):
-    invoices = SalesInvoiceMaster.objects.all().order_by('-sales_invoice_date')
+    invoices = SalesInvoiceMaster.objects.select_related('customerid')
     
     # Search functionality
     search_query = request.GET.get('search', '')
@@ -1756,10 +1607,17 @@ def sales_invoice_list(request):
         except ValueError:
             messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
     
-    # Pagination
-    paginator = Paginator(invoices, 10)
-    page_number = request.GET.get('page')
-    invoices = paginator.get_page(page_number)
+    # Pagination (keyset on sales_invoice_date, sales_invoice_no; no COUNT/OFFSET)
+    invoices = KeysetPaginator(invoices, 10, 'sales_invoice_date').get_page(request.GET.get('cursor'), request.GET)
+    
+    if request.GET.get('format') == 'json':
+        return JsonResponse(keyset_json(invoices, lambda invoice: {
+            'invoice_no': invoice.sales_invoice_no,
+            'invoice_date': invoice.sales_invoice_date.strftime('%Y-%m-%d'),
+            'customer': invoice.customerid.customer_name,
+            'invoice_total': float(invoice.sales_invoice_total),
+            'invoice_paid': float(invoice.sales_invoice_paid),
+        }))
     
     context = {
         'invoices': invoices,
@@ -1811,16 +1669,12 @@ def sales_invoice_detail(request, pk):
     # Get all payments for this invoice
     payments = SalesInvoicePaid.objects.filter(sales_ip_invoice_no=pk).order_by('-sales_payment_date')
     
-    # Get customers and products for edit modal
-    customers = CustomerMaster.objects.all().order_by('customer_name')
-    products = ProductMaster.objects.all().order_by('product_name')
-    
     context = {
         'invoice': invoice,
         'sales': sales,
         'payments': payments,
-        'customers': customers,
-        'products': products,
+        # The edit modal loads customers/products from the picker APIs
+        'catalog_url': product_catalog_url(),
         'title': f'Sales Invoice #{invoice.sales_invoice_no}'
     }
     return render(request, 'sales/sales_invoice_detail.html', context)
@@ -1841,27 +1695,18 @@ def print_sales_bill(request, pk):
     except Pharmacy_Details.DoesNotExist:
         pharmacy = None
     
-    # Calculate totals and tax amounts
+    # Calculate totals and tax amounts the same way as the PDF invoice
     subtotal = 0
     total_tax = 0
+    total = 0
     
     for sale in sales:
-        # Base price before tax
-        base_price = sale.sale_rate * sale.sale_quantity
-        
-        # Apply discount
-        if sale.sale_calculation_mode == 'flat':
-            # Flat discount in rupees
-            base_price_after_discount = base_price - sale.sale_discount
-        else:
-            # Percentage discount
-            base_price_after_discount = base_price - (base_price * sale.sale_discount / 100)
-        
-        # Calculate tax amount
-        tax_amount = base_price_after_discount * (sale.sale_igst / 100)
-        
+        base_price_after_discount, tax_amount = sale_line_amounts(
+            sale.sale_rate, sale.sale_quantity, sale.sale_discount, sale.sale_calculation_mode, sale.sale_igst
+        )
         subtotal += base_price_after_discount
         total_tax += tax_amount
+        total += sale.sale_total_amount
     
     context = {
         'invoice': invoice,
@@ -1870,8 +1715,8 @@ def print_sales_bill(request, pk):
         'pharmacy': pharmacy,
         'subtotal': subtotal,
         'total_tax': total_tax,
-        'total': invoice.sales_invoice_total,
-        'balance': invoice.balance_due,
+        'total': total,
+        'balance': total - invoice.sales_invoice_paid,
         'title': f'Print Bill: {invoice.sales_invoice_no}'
     }
     return render(request, 'sales/print_sales_bill.html', context)
@@ -2427,39 +2272,39 @@ def add_sales_invoice_with_products(request):
                         
                         sales_to_create = []
                         
-                        # Validate all products first
+                        # Validate all products first: one query for the products,
+                        # one for the stock of every batch on the invoice
+                        product_ids = set()
+                        for product_data in products:
+                            try:
+                                product_ids.add(int(product_data.get('productid')))
+                            except (TypeError, ValueError):
+                                pass
+                        catalog = ProductMaster.objects.in_bulk(product_ids)
+                        
+                        lines = []
                         for i, product_data in enumerate(products):
-                            print(f"Processing product {i+1}: {product_data}")
-                            
                             if not product_data.get('productid'):
                                 print(f"Skipping product {i+1}: No product ID")
                                 continue
-                                
+                            
                             try:
-                                product = ProductMaster.objects.get(productid=product_data['productid'])
-                                print(f"Found product: {product.product_name}")
-                            except ProductMaster.DoesNotExist:
+                                product = catalog.get(int(product_data['productid']))
+                            except (TypeError, ValueError):
+                                product = None
+                            if product is None:
                                 error_msg = f"Product with ID {product_data['productid']} not found."
                                 print(error_msg)
                                 messages.error(request, error_msg)
                                 continue
-                            
-                            # Check stock availability
-                            batch_quantity, is_available = get_batch_stock_status(
-                                product.productid, product_data['batch_no']
-                            )
-                            
-                            sale_quantity = float(product_data['quantity'])
-                            print(f"Stock check - Available: {batch_quantity}, Required: {sale_quantity}")
-                            
-                            if not is_available:
-                                error_msg = f"Product {product.product_name} batch {product_data['batch_no']} is out of stock."
-                                print(error_msg)
-                                messages.error(request, error_msg)
-                                continue
-                            
-                            if batch_quantity < sale_quantity:
-                                error_msg = f"Insufficient stock for {product.product_name} batch {product_data['batch_no']}. Available: {batch_quantity}, Required: {sale_quantity}"
+                            lines.append((product, product_data, float(product_data['quantity'])))
+                        
+                        stock_errors = validate_sale_lines(
+                            [(product, product_data['batch_no'], sale_quantity) for product, product_data, sale_quantity in lines]
+                        )
+                        
+                        for (product, product_data, sale_quantity), error_msg in zip(lines, stock_errors):
+                            if error_msg:
                                 print(error_msg)
                                 messages.error(request, error_msg)
                                 continue
@@ -2526,6 +2371,9 @@ def add_sales_invoice_with_products(request):
                         # Bulk create all sales
                         if sales_to_create:
                             SalesMaster.objects.bulk_create(sales_to_create)
+                            # bulk_create skips the receiver that bumps the sales version
+                            # (barcode lookups cache batch stock)
+                            bump_version(SALES)
                             sales_created_count = len(sales_to_create)
                             print(f"Successfully created {sales_created_count} sales records")
                         else:
@@ -2565,14 +2413,9 @@ def add_sales_invoice_with_products(request):
     else:
         invoice_form = SalesInvoiceForm()
     
-    # Get customers and products for dropdowns
-    customers = CustomerMaster.objects.select_related().order_by('customer_name')
-    products = ProductMaster.objects.only('productid', 'product_name', 'product_company').order_by('product_name')
-    
     context = {
         'invoice_form': invoice_form,
-        'customers': customers,
-        'products': products,
+        'catalog_url': product_catalog_url(),
         'preview_invoice_no': generate_sales_invoice_number(),
         'title': 'Add Sales Invoice with Products'
     }
@@ -2762,7 +2605,7 @@ def delete_sales_payment(request, invoice_id, payment_id):
 # Purchase Return views
 @login_required
 def purchase_return_list(request):
-    returns = ReturnInvoiceMaster.objects.all().order_by('-returninvoice_date')
+    returns = ReturnInvoiceMaster.objects.select_related('returnsupplierid')
     
     search_query = request.GET.get('search', '')
     if search_query:
@@ -2783,9 +2626,16 @@ def purchase_return_list(request):
         except ValueError:
             messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
     
-    paginator = Paginator(returns, 10)
-    page_number = request.GET.get('page')
-    returns_page = paginator.get_page(page_number)
+    returns_page = KeysetPaginator(returns, 10, 'returninvoice_date').get_page(request.GET.get('cursor'), request.GET)
+    
+    if request.GET.get('format') == 'json':
+        return JsonResponse(keyset_json(returns_page, lambda ret: {
+            'return_id': ret.returninvoiceid,
+            'return_date': ret.returninvoice_date.strftime('%Y-%m-%d'),
+            'supplier': ret.returnsupplierid.supplier_name,
+            'return_total': float(ret.returninvoice_total),
+            'return_paid': float(ret.returninvoice_paid),
+        }))
     
     context = {
         'returns': returns_page,
@@ -3291,7 +3141,7 @@ def delete_purchase_return_item(request, return_id, item_id):
 
 @login_required
 def sales_return_list(request):
-    returns = ReturnSalesInvoiceMaster.objects.all().order_by('-return_sales_invoice_date')
+    returns = ReturnSalesInvoiceMaster.objects.select_related('return_sales_customerid')
     
     search_query = request.GET.get('search', '')
     if search_query:
@@ -3312,9 +3162,16 @@ def sales_return_list(request):
         except ValueError:
             messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
         
-    paginator = Paginator(returns, 10)
-    page_number = request.GET.get('page')
-    returns_page = paginator.get_page(page_number)
+    returns_page = KeysetPaginator(returns, 10, 'return_sales_invoice_date').get_page(request.GET.get('cursor'), request.GET)
+    
+    if request.GET.get('format') == 'json':
+        return JsonResponse(keyset_json(returns_page, lambda ret: {
+            'return_no': ret.return_sales_invoice_no,
+            'return_date': ret.return_sales_invoice_date.strftime('%Y-%m-%d'),
+            'customer': ret.return_sales_customerid.customer_name,
+            'return_total': float(ret.return_sales_invoice_total),
+            'return_paid': float(ret.return_sales_invoice_paid),
+        }))
     
     context = {
         'returns': returns_page,
@@ -3885,6 +3742,8 @@ def update_sales_return_api(request):
             # Bulk create all items at once
             if new_items:
                 ReturnSalesMaster.objects.bulk_create(new_items)
+                # bulk_create skips the receiver that bumps the sales version
+                bump_version(SALES)
             
             # Update total and save
             return_invoice.return_sales_invoice_total = total_amount + return_charges
@@ -3990,14 +3849,30 @@ def inventory_list(request):
     limit = 50  # Reduced for better performance
 
     # Base query for products
-    products_query = ProductMaster.objects.all().order_by('product_name')
+    sort_by = request.GET.get('sort', 'name')
+    if sort_by == 'class':
+        products_query = ProductMaster.objects.select_related('classification').order_by(
+            F('classification__abc_class').asc(nulls_last=True),
+            F('classification__revenue').desc(nulls_last=True),
+            'product_name'
+        )
+    else:
+        products_query = ProductMaster.objects.select_related('classification').order_by('product_name')
+    
+    # ABC/XYZ class filters (populated by the classify_products job)
+    abc_filter = request.GET.get('abc', '').strip().upper()
+    xyz_filter = request.GET.get('xyz', '').strip().upper()
+    if abc_filter in ('A', 'B', 'C'):
+        products_query = products_query.filter(classification__abc_class=abc_filter)
+    if xyz_filter in ('X', 'Y', 'Z'):
+        products_query = products_query.filter(classification__xyz_class=xyz_filter)
     
-    # Enhanced search filter - startswith only
+    # Enhanced search filter - word prefixes of name/company/salt
     if search_query:
-        products_query = products_query.filter(
-            Q(product_name__istartswith=search_query) |
-            Q(product_company__istartswith=search_query) |
-            Q(product_salt__istartswith=search_query)
+        products_query = product_search_filter(
+            products_query, search_query,
+            fields=('product_name', 'product_company', 'product_salt'),
+            fallback_lookup='istartswith'
         )
     
     # Get total count for "More" button logic
@@ -4006,18 +3881,15 @@ def inventory_list(request):
     # Get products with offset and limit
     products = products_query[offset:offset + limit]
     
-    # Process results with detailed batch information
+    # Process results with detailed batch information; stock, batches and
+    # rates for the whole page come from a handful of grouped queries
+    products = list(products)
+    page_info = get_inventory_page_info(product.productid for product in products)
     inventory_data = []
     for product in products:
         try:
-            from .utils import get_inventory_batches_info
-            
-            # Get stock status using the enhanced function
-            stock_info = get_stock_status(product.productid)
-            current_stock = stock_info.get('current_stock', 0)
-            
-            # Get all batches information for this product with rates and MRP
-            batches_info = get_inventory_batches_info(product.productid)
+            current_stock = page_info[product.productid]['current_stock']
+            batches_info = page_info[product.productid]['batches']
             
             # Calculate average MRP from batches
             if batches_info:
@@ -4104,6 +3976,9 @@ def inventory_list(request):
         'page_out_of_stock': page_out_of_stock,
         'page_low_stock': page_low_stock,
         'search_query': search_query,
+        'sort_by': sort_by,
+        'abc_filter': abc_filter,
+        'xyz_filter': xyz_filter,
         'has_more': (offset + limit) < total_products,
         'next_offset': offset + limit,
         'title': 'Inventory - All Products'
@@ -4112,8 +3987,8 @@ def inventory_list(request):
 
 @login_required
 def batch_inventory_report(request):
-    from django.core.paginator import Paginator
     from django.db.models import Sum, Avg, Case, When, DecimalField
+    from .data_version import PURCHASES
     
     # Search functionality
     search_query = request.GET.get('search', '')
@@ -4152,8 +4027,13 @@ def batch_inventory_report(request):
             Q(product_batch_no__icontains=search_query)
         )
     
-    # Pagination with reasonable page size
-    paginator = Paginator(batches_query, 100)
+    # Pagination with reasonable page size; the grouped COUNT(*) is cached
+    # (?exact_count=1 forces a fresh one)
+    paginator = CachedCountPaginator(
+        batches_query, 100,
+        exact=request.GET.get('exact_count') == '1',
+        version_keys=(PURCHASES,)
+    )
     page_number = request.GET.get('page')
     batches_page = paginator.get_page(page_number)
     
@@ -4721,60 +4601,44 @@ def get_batch_rates(request):
 
 @login_required
 def get_product_by_barcode(request):
+    """
+    Resolve a scanned barcode to the product, its first-expiring in-stock batch
+    (FEFO), batch rates and MRP. Served from the per-process barcode cache.
+    """
     barcode = request.GET.get('barcode')
     
     if not barcode:
         return JsonResponse({'error': 'Barcode is required'}, status=400)
     
     try:
-        product = ProductMaster.objects.get(product_barcode=barcode)
+        resolved = barcode_cache.get(barcode.strip())
         
-        # Get the first available batch for this product
-        purchase_record = PurchaseMaster.objects.filter(
-            productid=product
-        ).first()
-        
-        if not purchase_record:
+        if resolved is None:
             return JsonResponse({
-                'error': f'No purchase records found for product {product.product_name}'
+                'success': False,
+                'error': f'Product with barcode {barcode} not found'
             }, status=404)
         
-        # Get batch-specific rates if available
-        batch_rates = {'rate_a': 0, 'rate_b': 0, 'rate_c': 0}
-        try:
-            sale_rate = SaleRateMaster.objects.get(
-                productid=product,
-                product_batch_no=purchase_record.product_batch_no
-            )
-            batch_rates = {
-                'rate_a': float(sale_rate.rate_A or 0),
-                'rate_b': float(sale_rate.rate_B or 0),
-                'rate_c': float(sale_rate.rate_C or 0)
-            }
-        except SaleRateMaster.DoesNotExist:
-            # Use MRP as fallback
-            batch_rates = {
-                'rate_a': float(purchase_record.product_MRP or 0),
-                'rate_b': float(purchase_record.product_MRP or 0),
-                'rate_c': float(purchase_record.product_MRP or 0)
-            }
+        batch = resolved['batch']
+        if batch is None:
+            return JsonResponse({
+                'error': f'No purchase records found for product {resolved["product_name"]}'
+            }, status=404)
         
         return JsonResponse({
             'success': True,
-            'product_id': product.productid,
-            'product_name': product.product_name,
-            'product_company': product.product_company,
-            'batch_no': purchase_record.product_batch_no,
-            'expiry': purchase_record.product_expiry,
-            'mrp': float(purchase_record.product_MRP or 0),
-            **batch_rates
+            'product_id': resolved['product_id'],
+            'product_name': resolved['product_name'],
+            'product_company': resolved['product_company'],
+            'batch_no': batch['batch_no'],
+            'expiry': batch['expiry'],
+            'mrp': batch['mrp'],
+            'batch_stock': batch['stock'],
+            'rate_a': batch['rate_a'],
+            'rate_b': batch['rate_b'],
+            'rate_c': batch['rate_c']
         })
         
-    except ProductMaster.DoesNotExist:
-        return JsonResponse({
-            'success': False,
-            'error': f'Product with barcode {barcode} not found'
-        }, status=404)
     except Exception as e:
         return JsonResponse({
             'success': False,
@@ -5115,10 +4979,6 @@ def get_customer_rate_info(request):
             'error': f'Server error: {str(e)}'
         }, status=500)
 
-@login_required
-def export_inventory_csv(request):
-    return JsonResponse({'status': 'gtt'})
-
 # Finance - Payments
 @login_required
 def payment_list(request):
@@ -5306,28 +5166,6 @@ def export_payments_pdf(request):
     response.write(html_content)
     return response
 
-@login_required
-def export_payments_excel(request):
-    import csv
-    from django.http import HttpResponse
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="payments_report.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Amount', 'Mode', 'Reference'])
-    
-    payments = PaymentMaster.objects.all()[:100]
-    for payment in payments:
-        writer.writerow([
-            payment.payment_date,
-            payment.payment_amount,
-            payment.payment_mode,
-            payment.payment_ref_no or 'N/A'
-        ])
-    
-    return response
-
 # Finance - Receipts
 @login_required
 def receipt_list(request):
@@ -5465,28 +5303,6 @@ def export_receipts_pdf(request):
     response.write(html_content)
     return response
 
-@login_required
-def export_receipts_excel(request):
-    import csv
-    from django.http import HttpResponse
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="receipts_report.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Amount', 'Mode', 'Reference'])
-    
-    receipts = ReceiptMaster.objects.all()[:100]
-    for receipt in receipts:
-        writer.writerow([
-            receipt.receipt_date,
-            receipt.receipt_amount,
-            receipt.receipt_mode,
-            receipt.receipt_ref_no or 'N/A'
-        ])
-    
-    return response
-
 # Sale Rate Management
 @login_required
 def sale_rate_list(request):
@@ -5617,37 +5433,45 @@ def export_inventory_pdf(request):
         styles = getSampleStyleSheet()
         story = []
 
-        # Get inventory data
-        products = ProductMaster.objects.all().order_by('product_name')[:100]  # Limit for performance
+        # Get inventory data for the whole catalog, a chunk of products at a
+        # time with batched stock queries; run from the export queue this
+        # reports progress as it goes
+        report_progress = getattr(request, 'export_progress', None)
+        product_rows = list(ProductMaster.objects.order_by('product_name').values_list(
+            'productid', 'product_name', 'product_company', 'product_category'
+        ))
         inventory_data = []
-        
-        for product in products:
-            try:
-                # Get current stock
-                stock_info = get_stock_status(product.productid)
-                
-                # Get latest batch info
-                latest_batch = PurchaseMaster.objects.filter(
-                    productid=product.productid
-                ).order_by('-purchase_entry_date').first()
-                
-                # Calculate stock value
-                current_stock = stock_info.get('current_stock', 0)
-                avg_mrp = stock_info.get('avg_mrp', 0)
-                stock_value = current_stock * avg_mrp
-                
+        chunk_size = 500
+        
+        for start in range(0, len(product_rows), chunk_size):
+            chunk = product_rows[start:start + chunk_size]
+            product_ids = [row[0] for row in chunk]
+            stock_info = get_inventory_page_info(product_ids)
+            
+            # Latest purchased batch per product
+            latest_batches = {}
+            for productid, batch_no, mrp in PurchaseMaster.objects.filter(
+                productid__in=product_ids
+            ).order_by('productid', '-purchase_entry_date', '-purchaseid').values_list(
+                'productid', 'product_batch_no', 'product_MRP'
+            ):
+                latest_batches.setdefault(productid, (batch_no, mrp))
+            
+            for productid, product_name, company, category in chunk:
+                current_stock = stock_info[productid]['current_stock']
+                batch_no, mrp = latest_batches.get(productid, ('N/A', 0))
                 inventory_data.append({
-                    'product_name': product.product_name or 'N/A',
-                    'company': product.product_company or 'N/A',
-                    'category': product.product_category or 'N/A',
-                    'batch_no': latest_batch.product_batch_no if latest_batch else 'N/A',
+                    'product_name': product_name or 'N/A',
+                    'company': company or 'N/A',
+                    'category': category or 'N/A',
+                    'batch_no': batch_no or 'N/A',
                     'stock': current_stock,
-                    'mrp': avg_mrp,
-                    'value': stock_value
+                    'mrp': mrp or 0,
+                    'value': current_stock * (mrp or 0)
                 })
-            except Exception as e:
-                print(f"Error processing product {product.product_name}: {e}")
-                continue
+            
+            if report_progress:
+                report_progress(80 * (start + len(chunk)) / len(product_rows), 'Collecting stock')
 
         # Title
         title_style = styles['Heading1']
@@ -5729,6 +5553,8 @@ def export_inventory_pdf(request):
         story.append(inventory_table)
 
         # Build PDF
+        if report_progress:
+            report_progress(85, 'Building PDF')
         doc.build(story)
 
         buffer.seek(0)
@@ -5744,28 +5570,27 @@ def export_inventory_pdf(request):
 
 @login_required
 def export_inventory_excel(request):
-    import csv
-    from django.http import HttpResponse
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="inventory_report.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Product Name', 'Company', 'Batch No', 'MRP', 'Value'])
-    
-    products = ProductMaster.objects.all()[:100]
-    for product in products:
-        stock_info = get_stock_status(product.productid)
-        batch = PurchaseMaster.objects.filter(productid=product.productid).first()
-        writer.writerow([
-            product.product_name,
-            product.product_company,
-            batch.product_batch_no if batch else 'N/A',
-            stock_info.get('avg_mrp', 0),
-            stock_info['current_stock'] * stock_info.get('avg_mrp', 0)
-        ])
-    
-    return response
+    """Stock by batch as a write-only workbook; ?in_stock=1 leaves out batches with nothing left"""
+    from .csv_exports import CHUNK_SIZE, inventory_batch_rows
+    from .excel_report import ExcelReport
+    report = ExcelReport("Inventory", [30, 20, 12, 14, 10, 12, 12, 12, 12, 12, 12, 16])
+
+    report.row([
+        "Product", "Company", "Packing", "Batch No", "Expiry", "MRP", "Purchased", "Sold",
+        "Purchase Returns", "Sales Returns", "Stock", "Stock Value (MRP)"
+    ], 'header')
+
+    rows = inventory_batch_rows()
+    if request.GET.get('in_stock') == '1':
+        rows = rows.filter(stock__gt=0)
+
+    row_styles = ['text', 'text', 'center', 'center', 'center', 'currency',
+                  'center', 'center', 'center', 'center', 'center', 'currency']
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        mrp, stock = row[6] or 0, row[-1]
+        report.row(list(row[1:]) + [round(stock * mrp, 2)], row_styles)
+
+    return report.response('inventory_by_batch.xlsx')
 
 @login_required
 def export_products_pdf(request):
@@ -7276,34 +7101,6 @@ def export_financial_pdf(request):
     response.write(html_content)
     return response
 
-@login_required
-def export_financial_excel(request):
-    import csv
-    from django.http import HttpResponse
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="financial_report.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Metric', 'Amount'])
-    
-    # Get basic financial data
-    total_receivables = 0
-    for invoice in SalesInvoiceMaster.objects.all():
-        balance = invoice.sales_invoice_total - invoice.sales_invoice_paid
-        if balance > 0:
-            total_receivables += balance
-    
-    total_payables = InvoiceMaster.objects.aggregate(
-        total=Sum(F('invoice_total') - F('invoice_paid'))
-    )['total'] or 0
-    
-    writer.writerow(['Total Receivables', total_receivables])
-    writer.writerow(['Total Payables', total_payables])
-    writer.writerow(['Net Position', total_receivables - total_payables])
-    
-    return response
-
 # Finance views
 @login_required
 def payment_list(request):
@@ -7839,10 +7636,6 @@ def get_sales_analytics_api(request):
 def export_payments_pdf(request):
     return JsonResponse({'status': 'ok'})
 
-@login_required
-def export_payments_excel(request):
-    return JsonResponse({'status': 'ok'})
-
 @login_required
 def export_payments_print(request):
     return JsonResponse({'status': 'ok'})
@@ -7851,10 +7644,6 @@ def export_payments_print(request):
 def export_receipts_pdf(request):
     return JsonResponse({'status': 'ok'})
 
-@login_required
-def export_receipts_excel(request):
-    return JsonResponse({'status': 'ok'})
-
 @login_required
 def export_receipts_print(request):
     return JsonResponse({'status': 'ok'})
@@ -7893,17 +7682,32 @@ def get_customer_rate_info(request):
 
 @login_required
 def search_products_api(request):
-    """API endpoint for product search"""
+    """
+    API endpoint for product search
+    ?fuzzy=1 ranks by trigram similarity on name/salt (tolerates misspellings);
+    a normal search that finds nothing falls back to fuzzy matching as well
+    """
     query = request.GET.get('q', '').strip()
+    fuzzy = request.GET.get('fuzzy', '').lower() in ('1', 'true', 'yes')
     
     if len(query) < 2:
         return JsonResponse({'products': []})
     
     try:
-        products = ProductMaster.objects.filter(
-            Q(product_name__icontains=query) |
-            Q(product_company__icontains=query)
-        ).order_by('product_name')[:10]
+        if fuzzy:
+            return JsonResponse({'products': _fuzzy_product_results(query), 'fuzzy': True})
+        
+        ranked_ids = ranked_product_ids(query, limit=10, fields=('product_name', 'product_company', 'product_barcode'))
+        if ranked_ids is not None:
+            # FTS5: best bm25 matches first
+            products_by_id = ProductMaster.objects.in_bulk(ranked_ids)
+            products = [products_by_id[pid] for pid in ranked_ids if pid in products_by_id]
+        else:
+            products = ProductMaster.objects.filter(
+                Q(product_name__icontains=query) |
+                Q(product_company__icontains=query) |
+                Q(product_barcode__icontains=query)
+            ).order_by('product_name')[:10]
         
         product_list = []
         for product in products:
@@ -7914,11 +7718,106 @@ def search_products_api(request):
                 'packing': product.product_packing
             })
         
+        if not product_list:
+            return JsonResponse({'products': _fuzzy_product_results(query), 'fuzzy': True})
+        
         return JsonResponse({'products': product_list})
         
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@login_required
+def product_autocomplete_api(request):
+    """
+    Keystroke autocomplete for product boxes, answered from the in-memory
+    prefix index (same response shape as search_products_api)
+    """
+    query = request.GET.get('q', '').strip()
+    
+    if len(query) < 2:
+        return JsonResponse({'products': []})
+    
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), 50))
+    except ValueError:
+        limit = 10
+    
+    try:
+        return JsonResponse({'products': product_autocomplete_index.lookup(query, limit=limit)})
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@login_required
+def product_substitutes_api(request):
+    """
+    Same-salt substitutes for a product, with current stock and MRP
+    ?product_id=<id>&same_strength=1&include_out_of_stock=1&limit=20
+    """
+    product_id = request.GET.get('product_id')
+    if not product_id:
+        return JsonResponse({'success': False, 'error': 'product_id is required'})
+    
+    try:
+        product = ProductMaster.objects.get(productid=product_id)
+    except (ProductMaster.DoesNotExist, ValueError):
+        return JsonResponse({'success': False, 'error': 'Product not found'})
+    
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 20)), 100))
+    except ValueError:
+        limit = 20
+    
+    try:
+        substitutes = find_substitutes(
+            product,
+            same_strength=request.GET.get('same_strength') == '1',
+            in_stock_only=request.GET.get('include_out_of_stock') != '1',
+            limit=limit
+        )
+        
+        salt_key, _ = salt_keys(product.product_salt)
+        return JsonResponse({
+            'success': True,
+            'product': {
+                'id': product.productid,
+                'name': product.product_name,
+                'salt': product.product_salt,
+                'salt_key': salt_key
+            },
+            'substitutes': [{
+                'id': sub.productid,
+                'name': sub.product_name,
+                'company': sub.product_company,
+                'packing': sub.product_packing,
+                'salt': sub.product_salt,
+                'salt_key': sub.salt_index.salt_key,
+                'same_strength': bool(sub.same_strength),
+                'stock': sub.current_stock,
+                'mrp': sub.mrp
+            } for sub in substitutes]
+        })
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+def _fuzzy_product_results(query, limit=10):
+    """Trigram-ranked products for search_products_api, with their match score"""
+    matches = fuzzy_search_products(query, limit=limit)
+    products_by_id = ProductMaster.objects.in_bulk([pid for pid, _ in matches])
+    product_list = []
+    for pid, score in matches:
+        product = products_by_id.get(pid)
+        if product is None:
+            continue
+        product_list.append({
+            'id': product.productid,
+            'name': product.product_name,
+            'company': product.product_company,
+            'packing': product.product_packing,
+            'salt': product.product_salt,
+            'score': score
+        })
+    return product_list
+
 @login_required
 def get_sales_analytics_api(request):
     """API endpoint for sales analytics"""
@@ -8010,12 +7909,9 @@ def export_purchases_excel(request):
     """
     Export purchases data to Excel using OpenPyXL
     """
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from django.http import HttpResponse
     from datetime import datetime, date
-    from .models import PurchaseMaster, InvoiceMaster, SupplierMaster, ProductMaster
-    import io
+    from .excel_report import ExcelReport
+    from .models import PurchaseMaster, SupplierMaster
 
     def parse_date(date_str):
         """Parse date from various formats including DDMM"""
@@ -8082,10 +7978,6 @@ def export_purchases_excel(request):
         # Get purchases data
         purchases_data = PurchaseMaster.objects.filter(
             product_invoiceid__invoice_date__range=[start_date, end_date]
-        ).select_related(
-            'product_invoiceid',
-            'product_invoiceid__supplierid',
-            'productid'
         )
 
         # Apply filters
@@ -8095,190 +7987,63 @@ def export_purchases_excel(request):
         if invoice_no:
             purchases_data = purchases_data.filter(product_invoice_no__icontains=invoice_no)
 
-        # Create workbook and worksheet
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Purchase Report"
+        purchases_data = purchases_data.order_by('product_invoiceid__invoice_date', 'purchaseid').values_list(
+            'product_invoiceid__invoice_no', 'product_invoiceid__invoice_date',
+            'product_invoiceid__supplierid__supplier_name', 'product_name', 'product_batch_no',
+            'product_expiry', 'product_quantity', 'product_actual_rate', 'total_amount'
+        )
 
-        # Define styles
-        header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
-        normal_font = Font(name='Arial', size=10)
-        title_font = Font(name='Arial', size=14, bold=True)
-        header_fill = PatternFill(start_color="2E8B57", end_color="2E8B57", fill_type="solid")  # Green header
-        currency_format = '#,##0.00'
-        
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
+        # Write-only workbook: rows are streamed to disk as they are appended
+        report = ExcelReport(
+            "Purchase Report", [8, 15, 12, 25, 35, 15, 10, 8, 15, 15],
+            header_color="2E8B57", total_color="90EE90", freeze='A7'
         )
 
         # Title and headers
-        ws.merge_cells('A1:J1')
-        ws['A1'] = "PURCHASE ORDER REPORT"
-        ws['A1'].font = title_font
-        ws['A1'].alignment = Alignment(horizontal='center')
+        report.banner("PURCHASE ORDER REPORT", 'title')
+        report.banner(f"Report Period: {start_date.strftime('%d-%m-%Y')} to {end_date.strftime('%d-%m-%Y')}", 'subtitle')
+        report.banner(f"Generated on: {datetime.now().strftime('%d-%m-%Y %H:%M')}", 'note')
         
-        ws.merge_cells('A2:J2')
-        ws['A2'] = f"Report Period: {start_date.strftime('%d-%m-%Y')} to {end_date.strftime('%d-%m-%Y')}"
-        ws['A2'].font = Font(bold=True)
-        ws['A2'].alignment = Alignment(horizontal='center')
-        
-        ws.merge_cells('A3:J3')
-        ws['A3'] = f"Generated on: {datetime.now().strftime('%d-%m-%Y %H:%M')}"
-        ws['A3'].alignment = Alignment(horizontal='center')
-        
-        if supplier_id:
-            supplier = SupplierMaster.objects.filter(supplierid=supplier_id).first()
-            if supplier:
-                ws.merge_cells('A4:J4')
-                ws['A4'] = f"Supplier: {supplier.supplier_name}"
-                ws['A4'].alignment = Alignment(horizontal='center')
+        supplier = SupplierMaster.objects.filter(supplierid=supplier_id).first() if supplier_id else None
+        if supplier:
+            report.banner(f"Supplier: {supplier.supplier_name}", 'note')
+        else:
+            report.blank()
+        report.blank()
 
         # Column headers
-        headers = [
+        report.row([
             'S.No', 'Invoice No', 'Date', 'Supplier', 'Product', 
             'Batch No', 'Expiry', 'Qty', 'Purchase Rate', 'Total Amount'
-        ]
-        
-        header_row = 6
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=header_row, column=col)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = thin_border
+        ], 'header')
 
         # Data rows
-        row_num = header_row + 1
+        row_styles = ['center', 'text', 'text', 'text', 'text', 'text', 'center', 'center', 'currency', 'currency']
         total_amount = 0
         total_quantity = 0
-        serial_number = 1
+        serial_number = 0
         
-        for purchase in purchases_data:
-            # Serial number
-            ws.cell(row=row_num, column=1, value=serial_number)
-            ws.cell(row=row_num, column=1).alignment = Alignment(horizontal='center')
-            
-            # Invoice details
-            ws.cell(row=row_num, column=2, value=purchase.product_invoiceid.invoice_no)
-            ws.cell(row=row_num, column=3, value=purchase.product_invoiceid.invoice_date.strftime('%d-%m-%Y'))
-            
-            # Supplier
-            ws.cell(row=row_num, column=4, value=purchase.product_invoiceid.supplierid.supplier_name)
-            
-            # Product details
-            ws.cell(row=row_num, column=5, value=purchase.product_name)
-            ws.cell(row=row_num, column=6, value=purchase.product_batch_no)
-            
-            # Expiry date
-            expiry_display = 'N/A'
-            if purchase.product_expiry:
-                if isinstance(purchase.product_expiry, str):
-                    expiry_display = purchase.product_expiry
-                else:
-                    expiry_display = purchase.product_expiry.strftime('%m-%Y')
-            ws.cell(row=row_num, column=7, value=expiry_display)
-            ws.cell(row=row_num, column=7).alignment = Alignment(horizontal='center')
-            
-            # Numeric values
-            ws.cell(row=row_num, column=8, value=float(purchase.product_quantity))
-            ws.cell(row=row_num, column=8).alignment = Alignment(horizontal='center')
-            
-            ws.cell(row=row_num, column=9, value=float(purchase.product_actual_rate))
-            ws.cell(row=row_num, column=9).number_format = currency_format
-            
-            ws.cell(row=row_num, column=10, value=float(purchase.total_amount))
-            ws.cell(row=row_num, column=10).number_format = currency_format
-            
-            # Add borders to all cells
-            for col in range(1, len(headers) + 1):
-                ws.cell(row=row_num, column=col).border = thin_border
-                if col not in [1, 7, 8]:  # Center align serial, expiry, and quantity
-                    ws.cell(row=row_num, column=col).alignment = Alignment(horizontal='left', vertical='center')
-            
-            total_amount += float(purchase.total_amount)
-            total_quantity += float(purchase.product_quantity)
-            serial_number += 1
-            row_num += 1
+        for serial_number, (invoice, invoice_date, supplier_name, product_name, batch_no,
+                            expiry, quantity, rate, amount) in enumerate(purchases_data.iterator(chunk_size=2000), 1):
+            report.row([
+                serial_number, invoice, invoice_date.strftime('%d-%m-%Y'), supplier_name, product_name,
+                batch_no, expiry or 'N/A', float(quantity), float(rate), float(amount)
+            ], row_styles)
+            total_amount += float(amount)
+            total_quantity += float(quantity)
 
         # Summary section
-        if row_num > header_row + 1:
-            # Empty row
-            row_num += 1
-            
-            # Total row for amount
-            ws.merge_cells(f'A{row_num}:I{row_num}')
-            total_cell = ws.cell(row=row_num, column=1, value="TOTAL PURCHASE AMOUNT:")
-            total_cell.font = Font(bold=True, size=12)
-            total_cell.alignment = Alignment(horizontal='right')
-            
-            amount_cell = ws.cell(row=row_num, column=10, value=total_amount)
-            amount_cell.font = Font(bold=True, size=12)
-            amount_cell.number_format = currency_format
-            
-            # Add border and color to total row
-            for col in range(1, len(headers) + 1):
-                ws.cell(row=row_num, column=col).border = thin_border
-                ws.cell(row=row_num, column=col).fill = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")
-
-            # Quantity summary row
-            row_num += 1
-            ws.merge_cells(f'A{row_num}:I{row_num}')
-            qty_cell = ws.cell(row=row_num, column=1, value="TOTAL QUANTITY:")
-            qty_cell.font = Font(bold=True)
-            qty_cell.alignment = Alignment(horizontal='right')
-            
-            qty_value_cell = ws.cell(row=row_num, column=10, value=total_quantity)
-            qty_value_cell.font = Font(bold=True)
-            qty_value_cell.alignment = Alignment(horizontal='center')
-
-            # Statistics row
-            row_num += 1
-            ws.merge_cells(f'A{row_num}:I{row_num}')
-            stats_cell = ws.cell(row=row_num, column=1, value=f"Total Purchase Items: {serial_number - 1}")
-            stats_cell.font = Font(bold=True)
-            stats_cell.alignment = Alignment(horizontal='right')
-
+        if serial_number:
+            report.blank()
+            report.total("TOTAL PURCHASE AMOUNT:", total_amount)
+            report.total("TOTAL QUANTITY:", total_quantity, 'summary_label', 'summary_value')
+            report.banner(f"Total Purchase Items: {serial_number}", 'summary_label', report.columns - 1)
         else:
             # No data message
-            ws.merge_cells(f'A{row_num}:J{row_num}')
-            ws.cell(row=row_num, column=1, value="No purchase data found for the selected period.")
-            ws.cell(row=row_num, column=1).alignment = Alignment(horizontal='center')
-            ws.cell(row=row_num, column=1).font = Font(italic=True, color="FF0000")
-
-        # Auto-adjust column widths
-        column_widths = {
-            'A': 8,   # S.No
-            'B': 15,  # Invoice No
-            'C': 12,  # Date
-            'D': 25,  # Supplier
-            'E': 35,  # Product
-            'F': 15,  # Batch No
-            'G': 10,  # Expiry
-            'H': 8,   # Qty
-            'I': 15,  # Purchase Rate
-            'J': 15   # Total Amount
-        }
-        
-        for col, width in column_widths.items():
-            ws.column_dimensions[col].width = width
-
-        # Freeze header row
-        ws.freeze_panes = ws['A7']
+            report.banner("No purchase data found for the selected period.", 'empty')
 
-        # Create response
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
         filename = f"purchase_report_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # Save workbook to response
-        wb.save(response)
-        return response
+        return report.response(filename)
 
     except Exception as e:
         import traceback
@@ -8301,17 +8066,15 @@ def export_financial_excel(request):
     """
     Export comprehensive financial data to Excel with all specified metrics
     """
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from django.http import HttpResponse
+    from openpyxl.styles import Font, Alignment
     from datetime import datetime, date, timedelta
-    from django.db.models import Sum, Count, Avg, F, Q
+    from django.db.models import Sum, F, Value
+    from django.db.models.functions import Coalesce
+    from .excel_report import ExcelReport, THIN_BORDER, CURRENCY_FORMAT, solid_fill
     from .models import (
-        SalesInvoiceMaster, InvoiceMaster, SalesMaster, PurchaseMaster,
-        CustomerMaster, SupplierMaster, ReturnSalesInvoiceMaster, ReturnInvoiceMaster,
+        SalesInvoiceMaster, InvoiceMaster, SalesMaster,
         ReturnSalesMaster, ReturnPurchaseMaster
     )
-    import io
 
     def parse_date(date_str):
         """Parse date from various formats including DDMM"""
@@ -8364,64 +8127,56 @@ def export_financial_excel(request):
         if not end_date:
             end_date = today
 
-        # Create workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Financial Report"
-
-        # Define styles
-        header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
+        # Write-only workbook with one named style per section colour
+        report = ExcelReport("Financial Report", [35, 20, 15, 15, 15, 15])
         normal_font = Font(name='Arial', size=10)
-        title_font = Font(name='Arial', size=14, bold=True)
-        highlight_font = Font(name='Arial', size=11, bold=True, color='2E8B57')
-        loss_font = Font(name='Arial', size=11, bold=True, color='FF0000')
-        currency_format = '#,##0.00'
-        
-        # Color schemes
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        sales_fill = PatternFill(start_color="E6F2FF", end_color="E6F2FF", fill_type="solid")
-        purchase_fill = PatternFill(start_color="FFE6E6", end_color="FFE6E6", fill_type="solid")
-        profit_fill = PatternFill(start_color="E6FFE6", end_color="E6FFE6", fill_type="solid")
-        receivables_fill = PatternFill(start_color="FFF0E6", end_color="FFF0E6", fill_type="solid")
-        payables_fill = PatternFill(start_color="F0E6FF", end_color="F0E6FF", fill_type="solid")
-        
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+        section_header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
+        center = Alignment(horizontal='center')
+        sections = {
+            'sales': "E6F2FF",
+            'purchase': "FFE6E6",
+            'profit': "E6FFE6",
+            'receivables': "FFF0E6",
+            'payables': "F0E6FF",
+            'ratios': "808080",
+        }
+        for name, color in sections.items():
+            report.add_style(f'{name}_header', font=section_header_font, fill=solid_fill(color),
+                             alignment=center, border=THIN_BORDER)
+            report.add_style(f'{name}_text', font=normal_font, fill=solid_fill(color), border=THIN_BORDER)
+            report.add_style(f'{name}_currency', font=normal_font, fill=solid_fill(color), border=THIN_BORDER,
+                             number_format=CURRENCY_FORMAT)
+        report.add_style('section_title', font=section_header_font, fill=solid_fill("366092"), alignment=center)
+        report.add_style('receivables_title', font=section_header_font, fill=solid_fill(sections['receivables']),
+                         alignment=center)
+        report.add_style('payables_title', font=section_header_font, fill=solid_fill(sections['payables']),
+                         alignment=center)
+        for name, color in (('profit_gain', '2E8B57'), ('profit_loss', 'FF0000')):
+            report.add_style(name, font=Font(name='Arial', size=11, bold=True, color=color),
+                             fill=solid_fill(sections['profit']), border=THIN_BORDER, number_format=CURRENCY_FORMAT)
+        report.add_style('highlight', font=Font(name='Arial', size=11, bold=True, color='2E8B57'),
+                         alignment=Alignment(horizontal='right'))
+        report.add_style('italic_note', font=Font(italic=True), alignment=center)
+        report.add_style('bordered', border=THIN_BORDER)
+        report.add_style('bordered_center', border=THIN_BORDER, alignment=center)
 
         # Title Section
-        ws.merge_cells('A1:F1')
-        ws['A1'] = "PHARMACY FINANCIAL REPORT"
-        ws['A1'].font = title_font
-        ws['A1'].alignment = Alignment(horizontal='center')
-        
-        ws.merge_cells('A2:F2')
-        ws['A2'] = f"Date Range: {start_date.strftime('%d-%m-%Y')} to {end_date.strftime('%d-%m-%Y')}"
-        ws['A2'].font = Font(bold=True)
-        ws['A2'].alignment = Alignment(horizontal='center')
-        
-        ws.merge_cells('A3:F3')
-        ws['A3'] = f"Generated: {datetime.now().strftime('%d-%m-%Y %H:%M')}"
-        ws['A3'].alignment = Alignment(horizontal='center')
+        report.banner("PHARMACY FINANCIAL REPORT", 'title')
+        report.banner(f"Date Range: {start_date.strftime('%d-%m-%Y')} to {end_date.strftime('%d-%m-%Y')}", 'subtitle')
+        report.banner(f"Generated: {datetime.now().strftime('%d-%m-%Y %H:%M')}", 'note')
+        report.blank()
 
         # SECTION 1: Calculate Financial Metrics
         
         # Gross Sales
-        sales_invoices = SalesInvoiceMaster.objects.filter(
-            sales_invoice_date__range=[start_date, end_date]
-        )
         gross_sales = SalesMaster.objects.filter(
-            sales_invoice_no__in=sales_invoices
+            sales_invoice_no__sales_invoice_date__range=[start_date, end_date]
         ).aggregate(total=Sum('sale_total_amount'))['total'] or 0
 
         # Gross Purchases
-        purchase_invoices = InvoiceMaster.objects.filter(
+        gross_purchases = InvoiceMaster.objects.filter(
             invoice_date__range=[start_date, end_date]
-        )
-        gross_purchases = purchase_invoices.aggregate(total=Sum('invoice_total'))['total'] or 0
+        ).aggregate(total=Sum('invoice_total'))['total'] or 0
 
         # Sales Returns
         sales_returns = ReturnSalesMaster.objects.filter(
@@ -8439,60 +8194,29 @@ def export_financial_excel(request):
         gross_profit = net_sales - net_purchases
 
         # SECTION 2: Financial Summary Table
-        current_row = 5
-        
-        # Table Headers
-        headers = ['FINANCIAL METRIC', 'AMOUNT (₹)']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=current_row, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.border = thin_border
-            cell.alignment = Alignment(horizontal='center')
-
-        current_row += 1
+        report.row(['FINANCIAL METRIC', 'AMOUNT (₹)'], 'header')
 
-        # Financial Data
         financial_data = [
-            ('Gross Sales', gross_sales, sales_fill),
-            ('Gross Purchases', gross_purchases, purchase_fill),
-            ('Sales Returns', sales_returns, sales_fill),
-            ('Purchase Returns', purchase_returns, purchase_fill),
-            ('Net Sales (After Returns)', net_sales, sales_fill),
-            ('Net Purchases (After Returns)', net_purchases, purchase_fill),
-            ('Gross Profit', gross_profit, profit_fill),
+            ('Gross Sales', gross_sales, 'sales'),
+            ('Gross Purchases', gross_purchases, 'purchase'),
+            ('Sales Returns', sales_returns, 'sales'),
+            ('Purchase Returns', purchase_returns, 'purchase'),
+            ('Net Sales (After Returns)', net_sales, 'sales'),
+            ('Net Purchases (After Returns)', net_purchases, 'purchase'),
         ]
+        for metric, amount, section in financial_data:
+            report.row([metric, float(amount)], [f'{section}_text', f'{section}_currency'])
+        # Highlight profit/loss
+        report.row(['Gross Profit', float(gross_profit)],
+                   ['profit_text', 'profit_gain' if gross_profit >= 0 else 'profit_loss'])
 
-        for metric, amount, fill_color in financial_data:
-            ws.cell(row=current_row, column=1, value=metric).font = normal_font
-            ws.cell(row=current_row, column=1).border = thin_border
-            ws.cell(row=current_row, column=1).fill = fill_color
-            
-            amount_cell = ws.cell(row=current_row, column=2, value=float(amount))
-            amount_cell.number_format = currency_format
-            amount_cell.border = thin_border
-            amount_cell.fill = fill_color
-            
-            # Highlight profit/loss
-            if metric == 'Gross Profit':
-                amount_cell.font = highlight_font if amount >= 0 else loss_font
-            else:
-                amount_cell.font = normal_font
-                
-            current_row += 1
-
-        current_row += 2  # Add spacing
+        report.blank()
+        report.blank()
 
         # SECTION 3: Monthly Sales Trend (Past 12 Months)
-        ws.merge_cells(f'A{current_row}:F{current_row}')
-        title_cell = ws.cell(row=current_row, column=1, value="Monthly Sales Trend (Past 12 Months)")
-        title_cell.font = header_font
-        title_cell.fill = header_fill
-        title_cell.alignment = Alignment(horizontal='center')
-        current_row += 1
-
-        # Calculate monthly sales for past 12 months
-        monthly_data = []
+        report.banner("Monthly Sales Trend (Past 12 Months)", 'section_title')
+        report.row(['Month', 'Sales Amount (₹)'], 'sales_header')
+
         for i in range(11, -1, -1):
             month_date = today.replace(day=1) - timedelta(days=30*i)
             month_start = month_date.replace(day=1)
@@ -8505,168 +8229,62 @@ def export_financial_excel(request):
                 sales_invoice_no__sales_invoice_date__range=[month_start, month_end]
             ).aggregate(total=Sum('sale_total_amount'))['total'] or 0
             
-            monthly_data.append({
-                'month': month_start.strftime('%b %Y'),
-                'sales': month_sales
-            })
-
-        # Monthly Sales Headers
-        monthly_headers = ['Month', 'Sales Amount (₹)']
-        for col, header in enumerate(monthly_headers, 1):
-            cell = ws.cell(row=current_row, column=col, value=header)
-            cell.font = header_font
-            cell.fill = sales_fill
-            cell.border = thin_border
-            cell.alignment = Alignment(horizontal='center')
-        current_row += 1
+            report.row([month_start.strftime('%b %Y'), float(month_sales)], ['sales_text', 'sales_currency'])
 
-        # Monthly Sales Data
-        for data in monthly_data:
-            ws.cell(row=current_row, column=1, value=data['month']).border = thin_border
-            ws.cell(row=current_row, column=1).fill = sales_fill
-            
-            sales_cell = ws.cell(row=current_row, column=2, value=float(data['sales']))
-            sales_cell.number_format = currency_format
-            sales_cell.border = thin_border
-            sales_cell.fill = sales_fill
-            
-            current_row += 1
-
-        current_row += 2  # Add spacing
+        report.blank()
+        report.blank()
 
         # SECTION 4: Outstanding Receivables (Top Customers)
-        ws.merge_cells(f'A{current_row}:F{current_row}')
-        title_cell = ws.cell(row=current_row, column=1, value="Outstanding Receivables (Top Customers)")
-        title_cell.font = header_font
-        title_cell.fill = receivables_fill
-        title_cell.alignment = Alignment(horizontal='center')
-        current_row += 1
-
-        # Calculate outstanding receivables
-        receivables_data = []
-        total_receivables = 0
-        
-        for invoice in SalesInvoiceMaster.objects.all():
-            # Get actual invoice total from sales items
-            invoice_total = SalesMaster.objects.filter(
-                sales_invoice_no=invoice.sales_invoice_no
-            ).aggregate(Sum('sale_total_amount'))['sale_total_amount__sum'] or 0
-            
-            balance = invoice_total - invoice.sales_invoice_paid
-            if balance > 0:
-                receivables_data.append({
-                    'customer': invoice.customerid.customer_name,
-                    'amount': balance
-                })
-                total_receivables += balance
-
-        # Sort by amount descending and take top 10
-        receivables_data.sort(key=lambda x: x['amount'], reverse=True)
-        top_receivables = receivables_data[:10]
-
-        # Receivables Headers
-        receivables_headers = ['Customer', 'Outstanding Amount (₹)']
-        for col, header in enumerate(receivables_headers, 1):
-            cell = ws.cell(row=current_row, column=col, value=header)
-            cell.font = header_font
-            cell.fill = receivables_fill
-            cell.border = thin_border
-            cell.alignment = Alignment(horizontal='center')
-        current_row += 1
-
-        # Receivables Data
+        report.banner("Outstanding Receivables (Top Customers)", 'receivables_title')
+
+        # Balance per invoice worked out in SQL: total of its sales lines less what was paid
+        receivables = SalesInvoiceMaster.objects.annotate(
+            invoice_total=Coalesce(Sum('salesmaster__sale_total_amount'), Value(0.0))
+        ).annotate(
+            balance=F('invoice_total') - F('sales_invoice_paid')
+        ).filter(balance__gt=0)
+        top_receivables = list(
+            receivables.order_by('-balance').values_list('customerid__customer_name', 'balance')[:10]
+        )
+        total_receivables = sum(receivables.values_list('balance', flat=True).iterator(chunk_size=2000))
+
+        report.row(['Customer', 'Outstanding Amount (₹)'], 'receivables_header')
         if top_receivables:
-            for data in top_receivables:
-                ws.cell(row=current_row, column=1, value=data['customer']).border = thin_border
-                ws.cell(row=current_row, column=1).fill = receivables_fill
-                
-                amount_cell = ws.cell(row=current_row, column=2, value=float(data['amount']))
-                amount_cell.number_format = currency_format
-                amount_cell.border = thin_border
-                amount_cell.fill = receivables_fill
-                
-                current_row += 1
+            for customer_name, balance in top_receivables:
+                report.row([customer_name, float(balance)], ['receivables_text', 'receivables_currency'])
         else:
-            ws.merge_cells(f'A{current_row}:B{current_row}')
-            ws.cell(row=current_row, column=1, value="No outstanding receivables").alignment = Alignment(horizontal='center')
-            ws.cell(row=current_row, column=1).font = Font(italic=True)
-            current_row += 1
+            report.banner("No outstanding receivables", 'italic_note', 2)
 
         # Total Receivables
-        ws.merge_cells(f'A{current_row}:B{current_row}')
-        total_cell = ws.cell(row=current_row, column=1, value=f"Total Receivables: ₹{total_receivables:,.2f}")
-        total_cell.font = highlight_font
-        total_cell.alignment = Alignment(horizontal='right')
-        current_row += 2
+        report.banner(f"Total Receivables: ₹{total_receivables:,.2f}", 'highlight', 2)
+        report.blank()
 
         # SECTION 5: Outstanding Payables (Top Suppliers)
-        ws.merge_cells(f'A{current_row}:F{current_row}')
-        title_cell = ws.cell(row=current_row, column=1, value="Outstanding Payables (Top Suppliers)")
-        title_cell.font = header_font
-        title_cell.fill = payables_fill
-        title_cell.alignment = Alignment(horizontal='center')
-        current_row += 1
-
-        # Calculate outstanding payables
-        payables_data = []
-        total_payables = 0
-        
-        for invoice in InvoiceMaster.objects.all():
-            balance = invoice.invoice_total - invoice.invoice_paid
-            if balance > 0:
-                payables_data.append({
-                    'supplier': invoice.supplierid.supplier_name,
-                    'amount': balance
-                })
-                total_payables += balance
-
-        # Sort by amount descending and take top 10
-        payables_data.sort(key=lambda x: x['amount'], reverse=True)
-        top_payables = payables_data[:10]
-
-        # Payables Headers
-        payables_headers = ['Supplier', 'Outstanding Amount (₹)']
-        for col, header in enumerate(payables_headers, 1):
-            cell = ws.cell(row=current_row, column=col, value=header)
-            cell.font = header_font
-            cell.fill = payables_fill
-            cell.border = thin_border
-            cell.alignment = Alignment(horizontal='center')
-        current_row += 1
-
-        # Payables Data
+        report.banner("Outstanding Payables (Top Suppliers)", 'payables_title')
+
+        payables = InvoiceMaster.objects.annotate(
+            balance=F('invoice_total') - F('invoice_paid')
+        ).filter(balance__gt=0)
+        top_payables = list(
+            payables.order_by('-balance').values_list('supplierid__supplier_name', 'balance')[:10]
+        )
+        total_payables = payables.aggregate(total=Sum('balance'))['total'] or 0
+
+        report.row(['Supplier', 'Outstanding Amount (₹)'], 'payables_header')
         if top_payables:
-            for data in top_payables:
-                ws.cell(row=current_row, column=1, value=data['supplier']).border = thin_border
-                ws.cell(row=current_row, column=1).fill = payables_fill
-                
-                amount_cell = ws.cell(row=current_row, column=2, value=float(data['amount']))
-                amount_cell.number_format = currency_format
-                amount_cell.border = thin_border
-                amount_cell.fill = payables_fill
-                
-                current_row += 1
+            for supplier_name, balance in top_payables:
+                report.row([supplier_name, float(balance)], ['payables_text', 'payables_currency'])
         else:
-            ws.merge_cells(f'A{current_row}:B{current_row}')
-            ws.cell(row=current_row, column=1, value="No outstanding payables").alignment = Alignment(horizontal='center')
-            ws.cell(row=current_row, column=1).font = Font(italic=True)
-            current_row += 1
+            report.banner("No outstanding payables", 'italic_note', 2)
 
         # Total Payables
-        ws.merge_cells(f'A{current_row}:B{current_row}')
-        total_cell = ws.cell(row=current_row, column=1, value=f"Total Payables: ₹{total_payables:,.2f}")
-        total_cell.font = highlight_font
-        total_cell.alignment = Alignment(horizontal='right')
+        report.banner(f"Total Payables: ₹{total_payables:,.2f}", 'highlight', 2)
 
         # SECTION 6: Additional Financial Ratios (Bonus Section)
-        current_row += 3
-        
-        ws.merge_cells(f'A{current_row}:F{current_row}')
-        title_cell = ws.cell(row=current_row, column=1, value="Financial Ratios & Analysis")
-        title_cell.font = header_font
-        title_cell.fill = header_fill
-        title_cell.alignment = Alignment(horizontal='center')
-        current_row += 1
+        report.blank()
+        report.blank()
+        report.blank()
+        report.banner("Financial Ratios & Analysis", 'section_title')
 
         # Calculate ratios
         profit_margin = (gross_profit / net_sales * 100) if net_sales > 0 else 0
@@ -8680,44 +8298,12 @@ def export_financial_excel(request):
             ('Net Cash Position', f'₹{(total_receivables - total_payables):,.2f}'),
         ]
 
-        ratio_headers = ['Ratio', 'Value']
-        for col, header in enumerate(ratio_headers, 1):
-            cell = ws.cell(row=current_row, column=col, value=header)
-            cell.font = header_font
-            cell.fill = PatternFill(start_color="808080", end_color="808080", fill_type="solid")
-            cell.border = thin_border
-            cell.alignment = Alignment(horizontal='center')
-        current_row += 1
-
+        report.row(['Ratio', 'Value'], 'ratios_header')
         for ratio, value in ratios_data:
-            ws.cell(row=current_row, column=1, value=ratio).border = thin_border
-            ws.cell(row=current_row, column=2, value=value).border = thin_border
-            ws.cell(row=current_row, column=2).alignment = Alignment(horizontal='center')
-            current_row += 1
-
-        # FIXED: Safe column width adjustment
-        # Manually set column widths instead of auto-adjusting
-        column_widths = {
-            'A': 35,  # Metric names
-            'B': 20,  # Amounts
-            'C': 15,  # Extra columns for merged cells
-            'D': 15,
-            'E': 15,
-            'F': 15
-        }
-        
-        for col_letter, width in column_widths.items():
-            ws.column_dimensions[col_letter].width = width
+            report.row([ratio, value], ['bordered', 'bordered_center'])
 
-        # Create response
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
         filename = f"financial_report_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        wb.save(response)
-        return response
+        return report.response(filename)
 
     except Exception as e:
         import traceback
@@ -8734,11 +8320,19 @@ def export_financial_excel(request):
 # Finance payment function
 @login_required
 def payment_list(request):
-    payments = PaymentMaster.objects.all().order_by('-payment_date')
+    payments = KeysetPaginator(PaymentMaster.objects.all(), 20, 'payment_date').get_page(
+        request.GET.get('cursor'), request.GET
+    )
     
-    paginator = Paginator(payments, 20)
-    page_number = request.GET.get('page')
-    payments = paginator.get_page(page_number)
+    if request.GET.get('format') == 'json':
+        return JsonResponse(keyset_json(payments, lambda payment: {
+            'id': payment.payment_id,
+            'payment_date': payment.payment_date.strftime('%Y-%m-%d'),
+            'payment_amount': float(payment.payment_amount),
+            'payment_method': payment.get_payment_method_display(),
+            'payment_reference': payment.payment_reference or '',
+            'payment_description': payment.payment_description or '',
+        }))
     
     context = {
         'payments': payments,
@@ -8815,42 +8409,38 @@ def payment_confirm_delete(request):
     return render(request, 'finance/payment_confirm_delete.html', context)
 
 
+@login_required
 def export_payments_excel(request):
-    import openpyxl
+    from .excel_report import ExcelReport
     from .models import PaymentMaster
-    # Create workbook and worksheet
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Payments"
+    # Write-only workbook: rows are streamed to disk as they are appended
+    report = ExcelReport("Payments", [12, 12, 14, 16, 35, 20, 25, 15])
 
     # Add header row
-    ws.append([
+    report.row([
         "Payment ID", "Date", "Amount", "Method", "Description", "Reference", "Supplier", "Invoice No"
-    ])
+    ], 'header')
 
     # Fetch all payments
-    payments = PaymentMaster.objects.all()
-
-    for payment in payments:
-        ws.append([
-            payment.payment_id,
-            payment.payment_date.strftime("%d-%m-%Y"),
-            float(payment.payment_amount),
-            payment.payment_method,
-            payment.payment_description or "",
-            payment.payment_reference or "",
-            payment.supplier.pharmacyname if payment.supplier else "",
-            payment.invoice.invoice_no if payment.invoice else ""
-        ])
-
-    # Prepare response
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    payments = PaymentMaster.objects.order_by('payment_date', 'payment_id').values_list(
+        'payment_id', 'payment_date', 'payment_amount', 'payment_method', 'payment_description',
+        'payment_reference', 'supplier__supplier_name', 'invoice__invoice_no'
     )
-    response['Content-Disposition'] = 'attachment; filename=payments.xlsx'
 
-    wb.save(response)
-    return response
+    row_styles = ['center', 'text', 'currency', 'text', 'text', 'text', 'text', 'text']
+    for payment_id, payment_date, amount, method, description, reference, supplier, invoice_no in payments.iterator(chunk_size=2000):
+        report.row([
+            payment_id,
+            payment_date.strftime("%d-%m-%Y"),
+            float(amount),
+            method,
+            description or "",
+            reference or "",
+            supplier or "",
+            invoice_no or ""
+        ], row_styles)
+
+    return report.response('payments.xlsx')
 
 
 @login_required
@@ -8907,11 +8497,19 @@ def export_payments_pdf(request):
 #finance recipte function
 @login_required
 def receipt_list(request):
-    receipts = ReceiptMaster.objects.all().order_by('-receipt_date')
+    receipts = KeysetPaginator(ReceiptMaster.objects.all(), 20, 'receipt_date').get_page(
+        request.GET.get('cursor'), request.GET
+    )
     
-    paginator = Paginator(receipts, 20)
-    page_number = request.GET.get('page')
-    receipts = paginator.get_page(page_number)
+    if request.GET.get('format') == 'json':
+        return JsonResponse(keyset_json(receipts, lambda receipt: {
+            'id': receipt.receipt_id,
+            'receipt_date': receipt.receipt_date.strftime('%Y-%m-%d'),
+            'receipt_amount': float(receipt.receipt_amount),
+            'receipt_method': receipt.get_receipt_method_display(),
+            'receipt_reference': receipt.receipt_reference or '',
+            'receipt_description': receipt.receipt_description or '',
+        }))
     
     context = {
         'receipts': receipts,
@@ -8962,13 +8560,9 @@ def export_sales_excel(request):
     """
     Export sales data to Excel using OpenPyXL - Handles DDMM date format
     """
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from django.http import HttpResponse
     from datetime import datetime, date
-    from .models import SalesMaster, SalesInvoiceMaster, CustomerMaster
-    from django.db.models import Sum, Count, Avg
-    import io
+    from .excel_report import ExcelReport
+    from .models import SalesMaster, CustomerMaster
 
     def parse_date(date_str):
         """Parse date from various formats including DDMM"""
@@ -9037,175 +8631,62 @@ def export_sales_excel(request):
         # Get sales data
         sales_data = SalesMaster.objects.filter(
             sales_invoice_no__sales_invoice_date__range=[start_date, end_date]
-        ).select_related(
-            'sales_invoice_no', 
-            'sales_invoice_no__customerid',
-            'productid'
         )
 
         if customer_id:
             sales_data = sales_data.filter(sales_invoice_no__customerid=customer_id)
 
-        # Create workbook and worksheet
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Sales Report"
-
-        # Define styles
-        header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
-        normal_font = Font(name='Arial', size=10)
-        title_font = Font(name='Arial', size=14, bold=True)
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        currency_format = '#,##0.00'
-        
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
+        sales_data = sales_data.order_by('sales_invoice_no__sales_invoice_date', 'id').values_list(
+            'sales_invoice_no_id', 'sales_invoice_no__sales_invoice_date',
+            'sales_invoice_no__customerid__customer_name', 'product_name', 'product_batch_no',
+            'sale_quantity', 'sale_rate', 'sale_total_amount'
         )
 
+        # Write-only workbook: rows are streamed to disk as they are appended
+        report = ExcelReport("Sales Report", [8, 15, 12, 25, 35, 15, 10, 12, 15], freeze='A7')
+
         # Title and headers
-        ws.merge_cells('A1:I1')
-        ws['A1'] = "PHARMACY SALES REPORT"
-        ws['A1'].font = title_font
-        ws['A1'].alignment = Alignment(horizontal='center')
-        
-        ws.merge_cells('A2:I2')
-        ws['A2'] = f"Report Period: {start_date.strftime('%d-%m-%Y')} to {end_date.strftime('%d-%m-%Y')}"
-        ws['A2'].font = Font(bold=True)
-        ws['A2'].alignment = Alignment(horizontal='center')
+        report.banner("PHARMACY SALES REPORT", 'title')
+        report.banner(f"Report Period: {start_date.strftime('%d-%m-%Y')} to {end_date.strftime('%d-%m-%Y')}", 'subtitle')
+        report.banner(f"Generated on: {datetime.now().strftime('%d-%m-%Y %H:%M')}", 'note')
         
-        ws.merge_cells('A3:I3')
-        ws['A3'] = f"Generated on: {datetime.now().strftime('%d-%m-%Y %H:%M')}"
-        ws['A3'].alignment = Alignment(horizontal='center')
-        
-        if customer_id:
-            customer = CustomerMaster.objects.filter(customerid=customer_id).first()
-            if customer:
-                ws.merge_cells('A4:I4')
-                ws['A4'] = f"Customer: {customer.customer_name}"
-                ws['A4'].alignment = Alignment(horizontal='center')
+        customer = CustomerMaster.objects.filter(customerid=customer_id).first() if customer_id else None
+        if customer:
+            report.banner(f"Customer: {customer.customer_name}", 'note')
+        else:
+            report.blank()
+        report.blank()
 
         # Column headers
-        headers = [
+        report.row([
             'S.No', 'Invoice No', 'Date', 'Customer', 'Product', 
             'Batch No', 'Quantity', 'Rate (₹)', 'Amount (₹)'
-        ]
-        
-        header_row = 6
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=header_row, column=col)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = thin_border
+        ], 'header')
 
         # Data rows
-        row_num = header_row + 1
+        row_styles = ['center', 'text', 'text', 'text', 'text', 'text', 'center', 'currency', 'currency']
         total_amount = 0
-        serial_number = 1
+        serial_number = 0
         
-        for sale in sales_data:
-            # Serial number
-            ws.cell(row=row_num, column=1, value=serial_number)
-            ws.cell(row=row_num, column=1).alignment = Alignment(horizontal='center')
-            
-            # Invoice details
-            ws.cell(row=row_num, column=2, value=sale.sales_invoice_no.sales_invoice_no)
-            ws.cell(row=row_num, column=3, value=sale.sales_invoice_no.sales_invoice_date.strftime('%d-%m-%Y'))
-            
-            # Customer
-            ws.cell(row=row_num, column=4, value=sale.sales_invoice_no.customerid.customer_name)
-            
-            # Product details
-            ws.cell(row=row_num, column=5, value=sale.product_name)
-            ws.cell(row=row_num, column=6, value=sale.product_batch_no)
-            
-            # Numeric values
-            ws.cell(row=row_num, column=7, value=float(sale.sale_quantity))
-            ws.cell(row=row_num, column=7).alignment = Alignment(horizontal='center')
-            
-            ws.cell(row=row_num, column=8, value=float(sale.sale_rate))
-            ws.cell(row=row_num, column=8).number_format = currency_format
-            
-            ws.cell(row=row_num, column=9, value=float(sale.sale_total_amount))
-            ws.cell(row=row_num, column=9).number_format = currency_format
-            
-            # Add borders to all cells
-            for col in range(1, len(headers) + 1):
-                ws.cell(row=row_num, column=col).border = thin_border
-                if col not in [1, 7]:  # Center align serial number and quantity
-                    ws.cell(row=row_num, column=col).alignment = Alignment(horizontal='left', vertical='center')
-            
-            total_amount += float(sale.sale_total_amount)
-            serial_number += 1
-            row_num += 1
+        for serial_number, (invoice, invoice_date, customer_name, product_name, batch_no,
+                            quantity, rate, amount) in enumerate(sales_data.iterator(chunk_size=2000), 1):
+            report.row([
+                serial_number, invoice, invoice_date.strftime('%d-%m-%Y'), customer_name, product_name,
+                batch_no, float(quantity), float(rate), float(amount)
+            ], row_styles)
+            total_amount += float(amount)
 
         # Summary section
-        if row_num > header_row + 1:
-            # Empty row
-            row_num += 1
-            
-            # Total row
-            ws.merge_cells(f'A{row_num}:H{row_num}')
-            total_cell = ws.cell(row=row_num, column=1, value="TOTAL AMOUNT:")
-            total_cell.font = Font(bold=True, size=12)
-            total_cell.alignment = Alignment(horizontal='right')
-            
-            amount_cell = ws.cell(row=row_num, column=9, value=total_amount)
-            amount_cell.font = Font(bold=True, size=12)
-            amount_cell.number_format = currency_format
-            
-            # Add border to total row
-            for col in range(1, len(headers) + 1):
-                ws.cell(row=row_num, column=col).border = thin_border
-                ws.cell(row=row_num, column=col).fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-
-            # Statistics row
-            row_num += 1
-            ws.merge_cells(f'A{row_num}:H{row_num}')
-            stats_cell = ws.cell(row=row_num, column=1, value=f"Total Records: {serial_number - 1}")
-            stats_cell.font = Font(bold=True)
-            stats_cell.alignment = Alignment(horizontal='right')
-
+        if serial_number:
+            report.blank()
+            report.total("TOTAL AMOUNT:", total_amount)
+            report.banner(f"Total Records: {serial_number}", 'summary_label', report.columns - 1)
         else:
             # No data message
-            ws.merge_cells(f'A{row_num}:I{row_num}')
-            ws.cell(row=row_num, column=1, value="No sales data found for the selected period.")
-            ws.cell(row=row_num, column=1).alignment = Alignment(horizontal='center')
-            ws.cell(row=row_num, column=1).font = Font(italic=True, color="FF0000")
-
-        # Auto-adjust column widths
-        column_widths = {
-            'A': 8,   # S.No
-            'B': 15,  # Invoice No
-            'C': 12,  # Date
-            'D': 25,  # Customer
-            'E': 35,  # Product
-            'F': 15,  # Batch No
-            'G': 10,  # Quantity
-            'H': 12,  # Rate
-            'I': 15   # Amount
-        }
-        
-        for col, width in column_widths.items():
-            ws.column_dimensions[col].width = width
+            report.banner("No sales data found for the selected period.", 'empty')
 
-        # Freeze header row
-        ws.freeze_panes = ws['A7']
-
-        # Create response
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
         filename = f"sales_report_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # Save workbook to response
-        wb.save(response)
-        return response
+        return report.response(filename)
 
     except Exception as e:
         import traceback
@@ -9809,10 +9290,14 @@ def export_receipts_pdf(request):
     
     return response
 
+@login_required
 def export_receipts_excel(request):
     """
-    Export receipts data to Excel
+    Export sales invoice payments and other receipts to Excel, newest first
     """
+    import heapq
+    from .excel_report import ExcelReport
+
     # Get filter parameters from request
     receipt_type = request.GET.get('receipt_type', 'all')
     start_date_str = request.GET.get('start_date')
@@ -9830,174 +9315,87 @@ def export_receipts_excel(request):
     else:
         end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
     
-    # Collect data based on filters
-    all_data = []
-    total_amount = 0
+    # One date-ordered row stream per source, merged below without loading either
+    streams = []
     
     # Sales Invoice Payments
     if receipt_type in ['all', 'sales']:
         sales_payments = SalesInvoicePaid.objects.filter(
             sales_payment_date__range=[start_date, end_date]
-        ).select_related('sales_ip_invoice_no__customerid')
-        
+        )
         if customer_id:
             sales_payments = sales_payments.filter(sales_ip_invoice_no__customerid_id=customer_id)
-        
-        for payment in sales_payments:
-            all_data.append({
-                'Date': payment.sales_payment_date.date(),
-                'Type': 'Sales Receipt',
-                'Reference': f"SI#{payment.sales_ip_invoice_no.sales_invoice_no}",
-                'Customer': payment.sales_ip_invoice_no.customerid.customer_name,
-                'Amount': payment.sales_payment_amount,
-                'Payment Mode': payment.sales_payment_mode,
-                'Reference No': payment.sales_payment_ref_no,
-                'Status': 'Completed'
-            })
-            total_amount += payment.sales_payment_amount
+        sales_payments = sales_payments.order_by('-sales_payment_date', '-sales_payment_id').values_list(
+            'sales_payment_date', 'sales_ip_invoice_no__sales_invoice_no',
+            'sales_ip_invoice_no__customerid__customer_name', 'sales_payment_amount',
+            'sales_payment_mode', 'sales_payment_ref_no'
+        )
+        streams.append(
+            (payment_date, 'Sales Receipt', f"SI#{invoice_no}", customer_name, amount, mode, ref_no)
+            for payment_date, invoice_no, customer_name, amount, mode, ref_no
+            in sales_payments.iterator(chunk_size=2000)
+        )
     
     # Other Receipts
     if receipt_type in ['all', 'other']:
         other_receipts = ReceiptMaster.objects.filter(
             receipt_date__range=[start_date, end_date]
         )
-        
         if customer_id:
             other_receipts = other_receipts.filter(customer_id=customer_id)
-        
-        for receipt in other_receipts:
-            party_name = receipt.customer.customer_name if receipt.customer else 'General Receipt'
-            reference = f"RCPT#{receipt.receipt_id}"
-            if receipt.sales_invoice:
-                reference = f"SI#{receipt.sales_invoice.sales_invoice_no}"
-            
-            all_data.append({
-                'Date': receipt.receipt_date,
-                'Type': 'Other Receipt',
-                'Reference': reference,
-                'Customer': party_name,
-                'Amount': receipt.receipt_amount,
-                'Payment Mode': receipt.receipt_method,
-                'Reference No': receipt.receipt_reference or 'N/A',
-                'Status': 'Completed'
-            })
-            total_amount += receipt.receipt_amount
+        other_receipts = other_receipts.order_by('-receipt_date', '-receipt_id').values_list(
+            'receipt_date', 'receipt_id', 'sales_invoice__sales_invoice_no', 'customer__customer_name',
+            'receipt_amount', 'receipt_method', 'receipt_reference'
+        )
+        streams.append(
+            (receipt_date, 'Other Receipt', f"SI#{invoice_no}" if invoice_no else f"RCPT#{receipt_id}",
+             customer_name or 'General Receipt', amount, method, reference or 'N/A')
+            for receipt_date, receipt_id, invoice_no, customer_name, amount, method, reference
+            in other_receipts.iterator(chunk_size=2000)
+        )
     
-    # Sort data by date
-    all_data.sort(key=lambda x: x['Date'], reverse=True)
+    # Write-only workbook: rows are streamed to disk as they are appended
+    report = ExcelReport('Receipts', [12, 15, 18, 30, 15, 15, 20, 12], header_color='2E86AB', freeze='A7')
     
-    # Create DataFrame
-    if all_data:
-        df = pd.DataFrame(all_data)
-        
-        # Format date column
-        df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%d-%m-%Y')
-        
-        # Format amount column with Indian currency format
-        df['Amount'] = df['Amount'].apply(lambda x: f"₹{x:,.2f}")
-        
-        # Reorder columns for better presentation
-        column_order = ['Date', 'Type', 'Reference', 'Customer', 'Amount', 'Payment Mode', 'Reference No', 'Status']
-        df = df[column_order]
+    title = "PHARMACY MANAGEMENT SYSTEM - RECEIPTS REPORT"
+    if receipt_type != 'all':
+        title += f" - {receipt_type.upper()} RECEIPTS"
+    report.banner(title, 'title')
+    report.banner(f"Report Period: {start_date} to {end_date}", 'subtitle')
+    report.banner(f"Generated On: {timezone.now().strftime('%d-%m-%Y %H:%M')}", 'note')
+    customer = CustomerMaster.objects.filter(customerid=customer_id).first() if customer_id else None
+    if customer:
+        report.banner(f"Customer: {customer.customer_name}", 'note')
     else:
-        # Create empty DataFrame with columns if no data
-        df = pd.DataFrame(columns=['Date', 'Type', 'Reference', 'Customer', 'Amount', 'Payment Mode', 'Reference No', 'Status'])
+        report.blank()
+    report.blank()
     
-    # Create response object
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    filename = f"receipts_report_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    report.row(['Date', 'Type', 'Reference', 'Customer', 'Amount', 'Payment Mode', 'Reference No', 'Status'], 'header')
     
-    # Create Excel file using pandas
-    with pd.ExcelWriter(response, engine='openpyxl') as writer:
-        # Write main data
-        df.to_excel(writer, sheet_name='Receipts', index=False, startrow=5)
-        
-        # Get workbook and worksheet
-        workbook = writer.book
-        worksheet = writer.sheets['Receipts']
-        
-        # Add title and header information
-        title = "PHARMACY MANAGEMENT SYSTEM - RECEIPTS REPORT"
-        if receipt_type != 'all':
-            title += f" - {receipt_type.upper()} RECEIPTS"
-        
-        # Title
-        worksheet['A1'] = title
-        worksheet['A2'] = f"Report Period: {start_date} to {end_date}"
-        worksheet['A3'] = f"Generated On: {timezone.now().strftime('%d-%m-%Y %H:%M')}"
-        
-        if customer_id:
-            customer = CustomerMaster.objects.filter(customerid=customer_id).first()
-            if customer:
-                worksheet['A4'] = f"Customer: {customer.customer_name}"
-        
-        # Style the header
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        
-        # Title styling
-        title_cell = worksheet['A1']
-        title_cell.font = Font(size=16, bold=True, color='2E86AB')
-        title_cell.alignment = Alignment(horizontal='center')
-        
-        # Header information styling
-        for row in [2, 3, 4]:
-            cell = worksheet[f'A{row}']
-            cell.font = Font(size=11, bold=True)
-        
-        # Merge title across columns
-        worksheet.merge_cells('A1:H1')
-        
-        # Header styling
-        for col in range(1, len(column_order) + 1):
-            cell = worksheet.cell(row=6, column=col)
-            cell.font = Font(bold=True, color='FFFFFF')
-            cell.fill = PatternFill(start_color="2E86AB", end_color="2E86AB", fill_type="solid")
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-        
-        # Adjust column widths
-        column_widths = {
-            'A': 12,  # Date
-            'B': 15,  # Type
-            'C': 18,  # Reference
-            'D': 30,  # Customer
-            'E': 15,  # Amount
-            'F': 15,  # Payment Mode
-            'G': 20,  # Reference No
-            'H': 12   # Status
-        }
-        
-        for col_letter, width in column_widths.items():
-            worksheet.column_dimensions[col_letter].width = width
-        
-        # Add summary section
-        if all_data:
-            summary_row = len(all_data) + 8
-            worksheet[f'D{summary_row}'] = 'SUMMARY'
-            worksheet[f'D{summary_row}'].font = Font(bold=True, size=12)
-            
-            worksheet[f'D{summary_row + 1}'] = 'Total Receipts:'
-            worksheet[f'E{summary_row + 1}'] = len(all_data)
-            
-            worksheet[f'D{summary_row + 2}'] = 'Total Amount:'
-            worksheet[f'E{summary_row + 2}'] = f"₹{total_amount:,.2f}"
-            worksheet[f'E{summary_row + 2}'].font = Font(bold=True)
-            
-            worksheet[f'D{summary_row + 3}'] = 'Average per Receipt:'
-            worksheet[f'E{summary_row + 3}'] = f"₹{total_amount/len(all_data):,.2f}" if all_data else '₹0.00'
-            
-            # Style summary section
-            for row in range(summary_row, summary_row + 4):
-                worksheet[f'D{row}'].font = Font(bold=True)
-                worksheet[f'D{row}'].fill = PatternFill(start_color="F8F9FA", end_color="F8F9FA", fill_type="solid")
+    row_styles = ['center', 'text', 'text', 'text', 'currency', 'text', 'text', 'center']
+    receipt_count = 0
+    total_amount = 0
+    for receipt_date, kind, reference, customer_name, amount, mode, ref_no in heapq.merge(
+        *streams, key=lambda row: row[0], reverse=True
+    ):
+        report.row([
+            receipt_date.strftime('%d-%m-%Y'), kind, reference, customer_name, float(amount or 0),
+            mode, ref_no, 'Completed'
+        ], row_styles)
+        receipt_count += 1
+        total_amount += float(amount or 0)
     
-    return response
+    # Summary section
+    if receipt_count:
+        report.blank()
+        report.total("TOTAL AMOUNT:", total_amount)
+        report.banner(f"Total Receipts: {receipt_count}", 'summary_label', report.columns - 1)
+        report.banner(f"Average per Receipt: ₹{total_amount / receipt_count:,.2f}", 'summary_label', report.columns - 1)
+    else:
+        report.banner("No receipts found for the selected period.", 'empty')
+    
+    filename = f"receipts_report_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return report.response(filename)
 
 
     from django.http import HttpResponse
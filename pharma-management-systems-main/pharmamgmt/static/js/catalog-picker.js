@@ -0,0 +1,182 @@
+// Product catalog and remote pickers for invoice forms
+// ProductCatalog loads the compact catalog snapshot once (its URL carries the
+// catalog version, so the browser cache serves it until products change) and
+// fills every <select data-product-options>; ProductCatalog.search answers
+// quick-search keystrokes from the server's prefix index. RemotePicker loads the first page
+// of a paginated picker API into a <select data-picker-url> on first use and
+// queries it again from a search box as the user types; product selects that
+// carry data-catalog-url load the snapshot instead.
+(function() {
+    'use strict';
+
+    // base.html and some form pages both include this file
+    if (window.ProductCatalog) return;
+
+    let products = [];
+    let optionsHtml = '';
+    let resolveReady;
+    const ready = new Promise(resolve => { resolveReady = resolve; });
+
+    function escapeHtml(text) {
+        return String(text == null ? '' : text)
+            .replace(/&/g, '&amp;')
+            .replace(/</g, '&lt;')
+            .replace(/>/g, '&gt;')
+            .replace(/"/g, '&quot;');
+    }
+
+    // Selected values of a select (several for <select multiple>), and putting them back
+    function selectedValues(select) {
+        return Array.from(select.selectedOptions, option => option.value);
+    }
+
+    function restoreValues(select, values) {
+        Array.from(select.options).forEach(option => { option.selected = values.includes(option.value); });
+    }
+
+    // Replace a select's options with the catalog, keeping its placeholder and value
+    function fill(select) {
+        if (!optionsHtml || select.dataset.catalogFilled) return;
+        const values = selectedValues(select);
+        const placeholder = select.querySelector('option[value=""]');
+        select.innerHTML = (placeholder ? placeholder.outerHTML : '') + optionsHtml;
+        restoreValues(select, values);
+        select.dataset.catalogFilled = '1';
+    }
+
+    function fillAll(root) {
+        (root || document).querySelectorAll('select[data-product-options]').forEach(fill);
+    }
+
+    let loading = false;
+
+    function load(url) {
+        if (loading) return ready;
+        loading = true;
+        fetch(url, { credentials: 'same-origin' })
+            .then(response => response.json())
+            .then(data => {
+                products = data.rows.map(row => ({ id: row[0], name: row[1], company: row[2], packing: row[3] }));
+                optionsHtml = products.map(p =>
+                    `<option value="${p.id}">${escapeHtml(p.name)} - ${escapeHtml(p.company)}</option>`
+                ).join('');
+                fillAll();
+                resolveReady(products);
+            })
+            .catch(error => {
+                loading = false;
+                console.error('Could not load product catalog:', error);
+            });
+        return ready;
+    }
+
+    // Option tags for a row built in JS; empty until the catalog has loaded
+    // (such selects should carry data-product-options and are filled then)
+    function options(selectedId) {
+        if (!selectedId) return optionsHtml;
+        return optionsHtml.replace(`<option value="${selectedId}">`, `<option value="${selectedId}" selected>`);
+    }
+
+    // Keystroke product search, answered by the in-memory autocomplete index
+    const AUTOCOMPLETE_URL = '/api/product-autocomplete/';
+    const AUTOCOMPLETE_LIMIT = 20;
+
+    // Resolves to [{id, name, company, packing}] whose name/company/barcode start with `query`
+    function search(query, limit) {
+        const params = new URLSearchParams({ q: query, limit: limit || AUTOCOMPLETE_LIMIT });
+        return fetch(`${AUTOCOMPLETE_URL}?${params}`, { credentials: 'same-origin' })
+            .then(response => response.json())
+            .then(data => data.products || [])
+            .catch(error => {
+                console.error('Product search failed:', error);
+                return [];
+            });
+    }
+
+    window.ProductCatalog = {
+        load: load,
+        search: search,
+        ready: ready,
+        fill: fill,
+        fillAll: fillAll,
+        options: options,
+        all: () => products
+    };
+
+    // Options fetched per request; more are reached by searching
+    const PICKER_PAGE_SIZE = 50;
+    const SEARCH_DELAY = 250;
+
+    // Fill the select with the first page of picker results for `query`,
+    // keeping its placeholder and the currently selected options
+    function loadPicker(select, query) {
+        query = (query || '').trim();
+        if (select.dataset.pickerQuery === query) return Promise.resolve();
+        select.dataset.pickerQuery = query;
+        const url = select.dataset.pickerUrl;
+        const separator = url.includes('?') ? '&' : '?';
+        const params = new URLSearchParams({ q: query, page: 1, page_size: PICKER_PAGE_SIZE });
+
+        return fetch(`${url}${separator}${params}`, { credentials: 'same-origin' })
+            .then(response => response.json())
+            .then(data => {
+                // A newer search has been started meanwhile
+                if (select.dataset.pickerQuery !== query) return;
+                const values = selectedValues(select);
+                const placeholder = select.querySelector('option[value=""]:not([data-more])');
+                const kept = Array.from(select.selectedOptions).filter(option => option.value);
+                const keptValues = kept.map(option => option.value);
+                select.innerHTML = (placeholder ? placeholder.outerHTML : '')
+                    + kept.map(option => option.outerHTML).join('')
+                    + data.results
+                        .filter(item => !keptValues.includes(String(item.id)))
+                        .map(item => `<option value="${item.id}">${escapeHtml(item.name)}</option>`)
+                        .join('')
+                    + (data.has_more ? '<option value="" disabled data-more>Type in the search box to find more…</option>' : '');
+                restoreValues(select, values);
+            })
+            .catch(error => {
+                delete select.dataset.pickerQuery;
+                console.error('Could not load picker options:', error);
+            });
+    }
+
+    // Search box above a picker select; typing queries the API
+    function addSearchBox(select) {
+        const input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control form-control-sm mb-1';
+        input.placeholder = 'Search...';
+        input.autocomplete = 'off';
+        let timer = null;
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => loadPicker(select, input.value), SEARCH_DELAY);
+        });
+        select.parentNode.insertBefore(input, select);
+    }
+
+    function attachPickers(root) {
+        (root || document).querySelectorAll('select[data-picker-url]').forEach(select => {
+            if (select.dataset.pickerAttached) return;
+            select.dataset.pickerAttached = '1';
+            const catalogUrl = select.dataset.catalogUrl;
+            if (!catalogUrl) addSearchBox(select);
+            const loadOptions = catalogUrl ? () => load(catalogUrl) : () => loadPicker(select, '');
+            ['focus', 'mousedown'].forEach(eventName =>
+                select.addEventListener(eventName, loadOptions, { once: true })
+            );
+        });
+    }
+
+    window.RemotePicker = {
+        load: loadPicker,
+        attach: attachPickers
+    };
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', () => attachPickers());
+    } else {
+        attachPickers();
+    }
+})();